@@ -0,0 +1,325 @@
+"""
+Offline end-to-end benchmark of the processing pipeline
+Synthesizes a realistic social.db (twitter, instagram, facebook_posts,
+facebook_comments) at any scale, runs process_social_data.run_processing against
+it and reports per-stage throughput, latency percentiles and memory as JSON
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from social_fetch import twitter_fetch, instagram_fetch, facebook_fetch, process_social_data
+
+# Share of generated rows per table
+TABLE_MIX = {"twitter": 0.5, "instagram": 0.2, "facebook_posts": 0.1, "facebook_comments": 0.2}
+INSERT_BATCH = 20000
+# Latency samples kept per stage (reservoir); enough for a stable p99
+RESERVOIR_SIZE = 100000
+DUPLICATE_RATIO = 0.05
+
+_OPENERS = ["Honestly", "Ugh", "Wow", "So", "Just switched and", "Day 3 and", "PSA:", "Not gonna lie,", ""]
+_TOPICS = {
+    "Coverage": ["no service at my house", "signal drops to one bar downtown", "dead zone on my commute",
+                 "great reception even in the basement", "coverage on the highway is spotty"],
+    "Price": ["my bill went up again", "the new plan is actually affordable", "too expensive for what you get",
+              "autopay discount disappeared from billing", "cheap compared to my old carrier"],
+    "Customer Service": ["the support agent fixed it in ten minutes", "waited an hour for customer service",
+                         "store rep was super helpful", "chat support keeps transferring me"],
+    "Network Speed": ["5G home internet speed is insane", "streaming keeps buffering tonight",
+                      "download speeds are painfully slow", "upload is fast enough for calls"],
+    "Reliability": ["another outage this morning", "network down for the third time",
+                    "phone has been working perfectly", "constant issue with dropped calls"],
+    "Other": ["anyone else get the new phone yet", "switching carriers this weekend", "thoughts on the magenta plan"],
+}
+_FEELINGS = ["love it", "so frustrating", "pretty happy", "terrible experience", "amazing", "disappointed",
+             "not bad", "worst week ever", "best decision", "meh", ""]
+_PLACES = ["Ohio", "Texas", "California", "New York", "Florida", "Georgia", "Michigan", "Arizona",
+           "Austin, TX", "Seattle, WA", "Columbus, OH", "Miami, FL", "Denver, CO", "Boston, MA", "Phoenix, AZ"]
+_FILLER = ("today tonight again still really literally finally maybe kinda seriously totally week month "
+           "home work car train airport stadium campus downtown suburbs apartment office").split()
+_NAMES = ["alex", "sam", "jordan", "taylor", "casey", "riley", "morgan", "jamie", "drew", "quinn"]
+
+def _text(rng: random.Random, seq: int) -> str:
+    """One plausible post: topic phrase, optional place/feeling, filler, tags"""
+    parts = [rng.choice(_OPENERS), rng.choice(_TOPICS[rng.choice(list(_TOPICS))])]
+    if rng.random() < 0.6:
+        parts.append("in " + rng.choice(_PLACES))
+    parts.append(rng.choice(_FEELINGS))
+    parts.extend(rng.choice(_FILLER) for _ in range(rng.randint(2, 12)))
+    if rng.random() < 0.4:
+        parts.append(f"#tmobile #{rng.choice(_FILLER)}{seq % 97}")
+    if rng.random() < 0.2:
+        parts.append(f"https://t.co/{seq:x}{rng.randint(0, 9999)}")
+    return " ".join(p for p in parts if p)
+
+def _rows(table: str, count: int, rng: random.Random, start: datetime):
+    """Yield insert tuples for `table` matching the fetchers' schemas"""
+    recent = []
+    for i in range(count):
+        if recent and rng.random() < DUPLICATE_RATIO:
+            # Copy-paste / bot wave: same text with a different link
+            text = rng.choice(recent) + f" https://bit.ly/{rng.randint(0, 10 ** 6)}"
+        else:
+            text = _text(rng, i)
+            if len(recent) < 1000:
+                recent.append(text)
+            else:
+                recent[rng.randrange(1000)] = text
+        name = f"{rng.choice(_NAMES)}{rng.randint(1, 99999)}"
+        created = (start + timedelta(seconds=i * 7 % 2592000)).strftime("%Y-%m-%dT%H:%M:%S")
+        if table == "twitter":
+            yield (f"{1800000000000000000 + i}", text, str(rng.randint(1, 10 ** 9)), name, created + ".000Z",
+                   None, None, "brand")
+        elif table == "instagram":
+            yield (f"{17800000000000000 + i}", text, name, created + "+0000", f"{17900000000 + i // 20}", None, None)
+        elif table == "facebook_posts":
+            yield (f"1000_{i}", text, created + "+0000", name.title(), str(i), rng.randint(0, 50),
+                   rng.randint(0, 500), None)
+        else:
+            yield (f"1000_{i // 10}_{i}", f"1000_{i // 10}", text, name.title(), str(i), created + "+0000",
+                   rng.randint(0, 50), None)
+
+_INSERTS = {
+    "twitter": """INSERT OR IGNORE INTO twitter (id, text, author_id, author_username, created_at,
+        public_metrics, raw, query) VALUES (?,?,?,?,?,?,?,?)""",
+    "instagram": """INSERT OR IGNORE INTO instagram (id, text, username, created_at, media_id, media_url, raw)
+        VALUES (?,?,?,?,?,?,?)""",
+    "facebook_posts": """INSERT OR IGNORE INTO facebook_posts (id, message, created_time, from_name, from_id,
+        comments_count, likes_count, raw) VALUES (?,?,?,?,?,?,?,?)""",
+    "facebook_comments": """INSERT OR IGNORE INTO facebook_comments (id, post_id, message, from_name, from_id,
+        created_time, like_count, raw) VALUES (?,?,?,?,?,?,?,?)""",
+}
+
+@contextmanager
+def _pointed_at(db_path: str, output_path: Optional[str] = None):
+    """Temporarily point the fetchers and the processor at another database/output"""
+    modules = (twitter_fetch, instagram_fetch, facebook_fetch, process_social_data)
+    saved = [m.DB_PATH for m in modules], process_social_data.OUTPUT_PATH
+    for m in modules:
+        m.DB_PATH = db_path
+    if output_path:
+        process_social_data.OUTPUT_PATH = output_path
+    try:
+        yield
+    finally:
+        for m, path in zip(modules, saved[0]):
+            m.DB_PATH = path
+        process_social_data.OUTPUT_PATH = saved[1]
+
+def generate_db(path: str, rows: int, seed: int = 0) -> Dict[str, int]:
+    """Create (or extend) a synthetic social.db with `rows` unprocessed rows in total"""
+    rng = random.Random(seed)
+    with _pointed_at(path):
+        twitter_fetch.init_db()
+        instagram_fetch.init_db()
+        facebook_fetch.init_db()
+
+    start = datetime.now(timezone.utc) - timedelta(days=30)
+    counts = {table: int(rows * share) for table, share in TABLE_MIX.items()}
+    counts["twitter"] += rows - sum(counts.values())
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    for table, count in counts.items():
+        batch = []
+        for row in _rows(table, count, rng, start):
+            batch.append(row)
+            if len(batch) >= INSERT_BATCH:
+                conn.executemany(_INSERTS[table], batch)
+                conn.commit()
+                batch = []
+        if batch:
+            conn.executemany(_INSERTS[table], batch)
+            conn.commit()
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.close()
+    return counts
+
+def copy_db(source: str, target: str) -> str:
+    """Consistent copy of a database (WAL contents included) via the backup API"""
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+    return target
+
+def _rss_mb() -> Optional[float]:
+    """Current resident set size (Linux), else None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+class StageRecorder:
+    """STAGE_OBSERVERS callback accumulating totals, latency samples and RSS per stage"""
+
+    def __init__(self, reservoir_size: int = RESERVOIR_SIZE, seed: int = 0):
+        self.reservoir_size = reservoir_size
+        self.rng = random.Random(seed)
+        self.stages = {}
+
+    def __call__(self, stage: str, seconds: float, rows: int):
+        s = self.stages.get(stage)
+        if s is None:
+            s = self.stages[stage] = {"calls": 0, "rows": 0, "seconds": 0.0, "samples": [], "rss_mb": 0.0}
+        s["calls"] += 1
+        s["rows"] += rows
+        s["seconds"] += seconds
+        # Reservoir sampling keeps memory flat at 10M-row scale
+        if len(s["samples"]) < self.reservoir_size:
+            s["samples"].append(seconds)
+        else:
+            j = self.rng.randrange(s["calls"])
+            if j < self.reservoir_size:
+                s["samples"][j] = seconds
+        # Per-row stages sample RSS every 1000 calls; chunk stages every call
+        if rows > 1 or s["calls"] % 1000 == 1:
+            rss = _rss_mb()
+            if rss and rss > s["rss_mb"]:
+                s["rss_mb"] = rss
+
+    @staticmethod
+    def _percentile(ordered, q):
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def report(self) -> Dict:
+        out = {}
+        for stage, s in self.stages.items():
+            ordered = sorted(s["samples"])
+            out[stage] = {
+                "calls": s["calls"],
+                "rows": s["rows"],
+                "seconds": round(s["seconds"], 4),
+                "rows_per_s": round(s["rows"] / s["seconds"], 1) if s["seconds"] else None,
+                "p50_ms": round(self._percentile(ordered, 0.50) * 1000, 4) if ordered else None,
+                "p99_ms": round(self._percentile(ordered, 0.99) * 1000, 4) if ordered else None,
+                "max_rss_mb": round(s["rss_mb"], 1) or None,
+            }
+        return out
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run_benchmark(db_path: str, output_path: str, seed: int = 0, quiet: bool = True) -> Dict:
+    """Run the full pipeline against `db_path` and return the JSON report"""
+    random.seed(seed)  # locate() falls back to a random state
+    recorder = StageRecorder(seed=seed)
+    process_social_data.STAGE_OBSERVERS.append(recorder)
+    conn = sqlite3.connect(db_path)
+    input_rows = sum(conn.execute(f"SELECT COUNT(*) FROM {t} WHERE processed = 0").fetchone()[0] for t in TABLE_MIX)
+    conn.close()
+
+    start = time.perf_counter()
+    try:
+        with _pointed_at(db_path, output_path):
+            if quiet:
+                with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                    process_social_data.run_processing()
+            else:
+                process_social_data.run_processing()
+    finally:
+        process_social_data.STAGE_OBSERVERS.remove(recorder)
+    wall = time.perf_counter() - start
+
+    return {
+        "revision": _git_revision(),
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "sentiment": "vader" if process_social_data.SENTIMENT_AVAILABLE else "keywords",
+        "input_rows": input_rows,
+        "wall_seconds": round(wall, 3),
+        "rows_per_s": round(input_rows / wall, 1) if wall else None,
+        "peak_rss_mb": round(_peak_rss_mb(), 1) if resource else None,
+        "stages": recorder.report(),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline processing pipeline benchmark")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gen = sub.add_parser("generate", help="Write a synthetic social.db")
+    gen.add_argument("db")
+    gen.add_argument("--rows", type=int, default=10000)
+    gen.add_argument("--seed", type=int, default=0)
+    run = sub.add_parser("run", help="Benchmark processing of an existing (synthetic) social.db")
+    run.add_argument("db")
+    run.add_argument("--output", help="Write the JSON report here instead of stdout")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--verbose", action="store_true", help="Show the pipeline's own output")
+    run.add_argument("--in-place", action="store_true",
+                     help="Process the database itself (marks its rows processed) instead of a temp copy")
+    bench = sub.add_parser("bench", help="Generate a fresh database in a temp directory and benchmark it")
+    bench.add_argument("--rows", type=int, default=10000)
+    bench.add_argument("--seed", type=int, default=0)
+    bench.add_argument("--output")
+    bench.add_argument("--keep", action="store_true", help="Keep the temp directory")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        counts = generate_db(args.db, args.rows, args.seed)
+        print(json.dumps(counts))
+        return
+
+    if args.command == "run":
+        workdir = tempfile.mkdtemp(prefix="social-bench-")
+        db_path = args.db if args.in_place else copy_db(args.db, os.path.join(workdir, "social.db"))
+        report = run_benchmark(db_path, os.path.join(workdir, "api", "entries-all.json"), args.seed,
+                               quiet=not args.verbose)
+    else:
+        workdir = tempfile.mkdtemp(prefix="social-bench-")
+        db_path = os.path.join(workdir, "social.db")
+        generate_start = time.perf_counter()
+        generate_db(db_path, args.rows, args.seed)
+        generate_seconds = time.perf_counter() - generate_start
+        report = run_benchmark(db_path, os.path.join(workdir, "api", "entries-all.json"), args.seed)
+        report["generate_seconds"] = round(generate_seconds, 3)
+        if args.keep:
+            report["workdir"] = workdir
+    if args.command == "run" or not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+if __name__ == "__main__":
+    main()
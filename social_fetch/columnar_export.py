@@ -0,0 +1,253 @@
+"""
+Columnar snapshot of processed feedback for analytics
+Numeric columns are raw NumPy arrays, categorical columns are dictionary-encoded
+and text is stored as one UTF-8 blob plus an offsets array. Each processing run
+appends its new entries, and load_snapshot() memory-maps the files without parsing
+"""
+import argparse
+import json
+import mmap
+import os
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    print("Warning: numpy not installed. Columnar snapshot export is disabled.")
+    NUMPY_AVAILABLE = False
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(__file__), "..", "api", "columnar")
+OUTPUT_PATH = os.path.join(os.path.dirname(__file__), "..", "api", "entries-all.json")
+FORMAT_VERSION = 1
+
+# Fixed-width columns: name -> (entry key, dtype)
+NUMERIC_COLUMNS = {
+    "rating": ("rating", "<f4"),
+    "score": ("score", "<i2"),
+    "date": ("date", "<i8"),  # days since 1970-01-01, view as datetime64[D]
+    "verified": ("verified", "|b1"),
+    "duplicate_count": ("duplicateCount", "<u4"),
+}
+# Dictionary-encoded columns: codes index into meta["dictionaries"][name]
+CATEGORICAL_COLUMNS = {
+    "state": "state",
+    "category": "category",
+    "source": "source",
+}
+CODE_DTYPE = "<u2"
+# Variable-length text: <name>.bin holds the bytes, <name>.offsets the row boundaries
+TEXT_COLUMNS = {
+    "id": "id",
+    "review": "review",
+}
+OFFSET_DTYPE = "<u8"
+NAT = np.iinfo(np.int64).min if NUMPY_AVAILABLE else None
+
+def _meta_path(directory):
+    return os.path.join(directory, "meta.json")
+
+def _read_meta(directory):
+    if not os.path.exists(_meta_path(directory)):
+        return {
+            "version": FORMAT_VERSION,
+            "rows": 0,
+            "numeric": {name: dtype for name, (_, dtype) in NUMERIC_COLUMNS.items()},
+            "dictionaries": {name: [] for name in CATEGORICAL_COLUMNS},
+            "text": list(TEXT_COLUMNS),
+            "text_bytes": {name: 0 for name in TEXT_COLUMNS},
+        }
+    with open(_meta_path(directory)) as f:
+        return json.load(f)
+
+def _write_meta(directory, meta):
+    """Publish meta.json atomically; it is the commit point for appended rows"""
+    tmp = _meta_path(directory) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, _meta_path(directory))
+
+def _append(path, data: bytes, committed_size: int):
+    """Append after dropping any bytes past the committed size (left by an interrupted run)"""
+    mode = "r+b" if os.path.exists(path) else "w+b"
+    with open(path, mode) as f:
+        f.truncate(committed_size)
+        f.seek(committed_size)
+        f.write(data)
+
+def _date_days(value) -> int:
+    try:
+        return int(np.datetime64(str(value)[:10], "D").astype(np.int64))
+    except (ValueError, TypeError):
+        return NAT
+
+def append_entries(entries: List[Dict], directory: Optional[str] = None) -> int:
+    """Append feedback entries to the snapshot; returns the new row count"""
+    if not NUMPY_AVAILABLE:
+        return 0
+    directory = directory or SNAPSHOT_DIR
+    os.makedirs(directory, exist_ok=True)
+    meta = _read_meta(directory)
+    rows = meta["rows"]
+    if not entries:
+        return rows
+
+    for name, (key, dtype) in NUMERIC_COLUMNS.items():
+        if name == "date":
+            values = [_date_days(e.get(key)) for e in entries]
+        elif name == "duplicate_count":
+            values = [e.get(key, 1) for e in entries]
+        else:
+            values = [e.get(key, 0) for e in entries]
+        array = np.asarray(values, dtype=dtype)
+        _append(os.path.join(directory, f"{name}.bin"), array.tobytes(), rows * array.itemsize)
+
+    for name, key in CATEGORICAL_COLUMNS.items():
+        dictionary = meta["dictionaries"][name]
+        lookup = {value: code for code, value in enumerate(dictionary)}
+        codes = np.empty(len(entries), dtype=CODE_DTYPE)
+        for i, e in enumerate(entries):
+            value = e.get(key) or ""
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(dictionary)
+                dictionary.append(value)
+            codes[i] = code
+        _append(os.path.join(directory, f"{name}.codes"), codes.tobytes(), rows * codes.itemsize)
+
+    for name, key in TEXT_COLUMNS.items():
+        encoded = [(e.get(key) or "").encode("utf-8") for e in entries]
+        start = meta["text_bytes"][name]
+        offsets = np.cumsum([0] + [len(b) for b in encoded], dtype=np.uint64) + np.uint64(start)
+        if rows == 0:
+            new_offsets = offsets
+        else:
+            new_offsets = offsets[1:]
+        offsets_size = (rows + 1) * 8 if rows else 0
+        _append(os.path.join(directory, f"{name}.offsets"), new_offsets.astype(OFFSET_DTYPE).tobytes(), offsets_size)
+        _append(os.path.join(directory, f"{name}.bin"), b"".join(encoded), start)
+        meta["text_bytes"][name] = int(offsets[-1])
+
+    meta["rows"] = rows + len(entries)
+    _write_meta(directory, meta)
+    return meta["rows"]
+
+def update_duplicate_counts(counts: Dict[str, int], directory: Optional[str] = None) -> int:
+    """Overwrite duplicate_count for rows already in the snapshot; returns the rows updated.
+
+    Rows are found by scanning the id blob, so this is meant for the handful of
+    clusters that grew in a run, not for bulk updates.
+    """
+    if not NUMPY_AVAILABLE or not counts:
+        return 0
+    directory = directory or SNAPSHOT_DIR
+    meta = _read_meta(directory)
+    rows = meta["rows"]
+    if not rows:
+        return 0
+    offsets = np.memmap(os.path.join(directory, "id.offsets"), dtype=OFFSET_DTYPE, mode="r", shape=(rows + 1,))
+    if not offsets[-1]:
+        return 0
+    updated = 0
+    with open(os.path.join(directory, "id.bin"), "rb") as f, \
+            mmap.mmap(f.fileno(), int(offsets[-1]), access=mmap.ACCESS_READ) as blob:
+        dtype = meta["numeric"]["duplicate_count"]
+        column = np.memmap(os.path.join(directory, "duplicate_count.bin"), dtype=dtype, mode="r+", shape=(rows,))
+        for feedback_id, count in counts.items():
+            needle = feedback_id.encode("utf-8")
+            pos = blob.find(needle)
+            while pos != -1:
+                # Only a match that spans exactly one row's bytes is that row's ID
+                row = int(np.searchsorted(offsets, pos))
+                if row < rows and offsets[row] == pos and offsets[row + 1] == pos + len(needle):
+                    column[row] = count
+                    updated += 1
+                    break
+                pos = blob.find(needle, pos + 1)
+        column.flush()
+        del column
+    return updated
+
+def build_from_json(path: Optional[str] = None, directory: Optional[str] = None) -> int:
+    """Recreate the snapshot from a published entries file"""
+    directory = directory or SNAPSHOT_DIR
+    if os.path.exists(_meta_path(directory)):
+        os.remove(_meta_path(directory))
+    with open(path or OUTPUT_PATH) as f:
+        data = json.load(f)
+    entries = data["entries"] if isinstance(data, dict) else data
+    return append_entries(entries, directory)
+
+class ColumnarSnapshot:
+    """Memory-mapped, read-only view of a snapshot directory"""
+
+    def __init__(self, directory: Optional[str] = None):
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("numpy is required to load the columnar snapshot")
+        self.directory = directory or SNAPSHOT_DIR
+        self.meta = _read_meta(self.directory)
+        self.rows = self.meta["rows"]
+        self.dictionaries = self.meta["dictionaries"]
+
+    def __len__(self):
+        return self.rows
+
+    def _map(self, filename, dtype, count):
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(self.directory, filename), dtype=dtype, mode="r", shape=(count,))
+
+    def column(self, name: str):
+        """Zero-copy array for a numeric column; dates come back as datetime64[D]"""
+        array = self._map(f"{name}.bin", self.meta["numeric"][name], self.rows)
+        return array.view("datetime64[D]") if name == "date" else array
+
+    def codes(self, name: str):
+        """Zero-copy dictionary codes for a categorical column"""
+        return self._map(f"{name}.codes", CODE_DTYPE, self.rows)
+
+    def decoded(self, name: str):
+        """Categorical column as an array of strings (materialized)"""
+        return np.asarray(self.dictionaries[name], dtype=object)[self.codes(name)]
+
+    def text(self, name: str, index: int) -> str:
+        offsets = self._map(f"{name}.offsets", OFFSET_DTYPE, self.rows + 1)
+        blob = self._map(f"{name}.bin", np.uint8, int(offsets[-1]))
+        return bytes(blob[int(offsets[index]):int(offsets[index + 1])]).decode("utf-8")
+
+    def texts(self, name: str):
+        """Iterate a text column without loading the blob into memory"""
+        offsets = self._map(f"{name}.offsets", OFFSET_DTYPE, self.rows + 1)
+        blob = self._map(f"{name}.bin", np.uint8, int(offsets[-1])) if self.rows else b""
+        for i in range(self.rows):
+            yield bytes(blob[int(offsets[i]):int(offsets[i + 1])]).decode("utf-8")
+
+    def to_pandas(self, text: bool = False):
+        """DataFrame with categorical columns built from the codes (requires pandas)"""
+        import pandas as pd
+        frame = {name: self.column(name) for name in self.meta["numeric"]}
+        for name in CATEGORICAL_COLUMNS:
+            frame[name] = pd.Categorical.from_codes(self.codes(name).astype(np.int32),
+                                                    categories=self.dictionaries[name])
+        if text:
+            for name in self.meta["text"]:
+                frame[name] = list(self.texts(name))
+        return pd.DataFrame(frame)
+
+def load_snapshot(directory: Optional[str] = None) -> ColumnarSnapshot:
+    return ColumnarSnapshot(directory)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Columnar feedback snapshot")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild from api/entries-all.json")
+    args = parser.parse_args(argv)
+    if args.rebuild:
+        print(f"Snapshot has {build_from_json()} rows")
+    else:
+        snapshot = load_snapshot()
+        print(f"{len(snapshot)} rows in {snapshot.directory}")
+        for name, values in snapshot.dictionaries.items():
+            print(f"  {name}: {len(values)} distinct values")
+
+if __name__ == "__main__":
+    main()
@@ -5,14 +5,21 @@ Requires: Page access token with pages_read_engagement, pages_read_user_content
 import requests
 import sqlite3
 import os
-import json
+import sys
+import argparse
 from dotenv import load_dotenv
 
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from social_fetch import graph, metrics, profiling, raw_store
+
 load_dotenv()
 
 FB_TOKEN = os.getenv("FB_PAGE_ACCESS_TOKEN")
 PAGE_ID = os.getenv("FB_PAGE_ID", "T-Mobile")  # Default or set in .env
-BASE = "https://graph.facebook.com/v18.0"
+# Overridable so the fetcher can run against social_fetch.mock_api
+BASE = os.getenv("GRAPH_API_BASE", "https://graph.facebook.com/v18.0").rstrip("/")
 DB_PATH = os.path.join(os.path.dirname(__file__), "..", "social.db")
 
 def init_db():
@@ -58,9 +65,7 @@ def get_page_feed(limit=25):
     }
     
     try:
-        r = requests.get(url, params=params, timeout=30)
-        r.raise_for_status()
-        return r.json()
+        return graph.get("feed", url, params)
     except requests.exceptions.RequestException as e:
         print(f"Error fetching Facebook feed: {e}")
         return None
@@ -75,9 +80,7 @@ def get_post_comments(post_id, limit=100):
     }
     
     try:
-        r = requests.get(url, params=params, timeout=30)
-        r.raise_for_status()
-        return r.json()
+        return graph.get("comments", url, params)
     except requests.exceptions.RequestException as e:
         print(f"Error fetching comments for post {post_id}: {e}")
         return None
@@ -92,31 +95,48 @@ def get_tagged_posts(limit=25):
     }
     
     try:
-        r = requests.get(url, params=params, timeout=30)
-        r.raise_for_status()
-        return r.json()
+        return graph.get("tagged", url, params)
     except requests.exceptions.RequestException as e:
         print(f"Error fetching tagged posts: {e}")
         return None
 
+def _post_row(p):
+    """Build the facebook_posts row for a Graph post object"""
+    from_info = p.get("from", {})
+    comments_summary = p.get("comments", {}).get("summary", {})
+    likes_summary = p.get("likes", {}).get("summary", {})
+    columns = {"id": p["id"], "message": p.get("message", ""), "created_time": p.get("created_time")}
+    return (p["id"], p.get("message", ""), p.get("created_time"),
+            from_info.get("name", ""), from_info.get("id", ""),
+            comments_summary.get("total_count", 0), likes_summary.get("total_count", 0),
+            raw_store.encode_raw("facebook_posts", p, columns, db_path=DB_PATH))
+
+def _comment_row(cdata, post_id):
+    """Build the facebook_comments row for a Graph comment object"""
+    from_info = cdata.get("from", {})
+    columns = {"id": cdata["id"], "message": cdata.get("message", ""),
+               "created_time": cdata.get("created_time"), "like_count": cdata.get("like_count", 0)}
+    return (cdata["id"], post_id, cdata.get("message", ""),
+            from_info.get("name", ""), from_info.get("id", ""),
+            cdata.get("created_time"), cdata.get("like_count", 0),
+            raw_store.encode_raw("facebook_comments", cdata, columns, db_path=DB_PATH))
+
+POST_INSERT = """INSERT OR IGNORE INTO facebook_posts 
+    (id, message, created_time, from_name, from_id, comments_count, likes_count, raw) 
+    VALUES (?,?,?,?,?,?,?,?)"""
+COMMENT_INSERT = """INSERT OR IGNORE INTO facebook_comments 
+    (id, post_id, message, from_name, from_id, created_time, like_count, raw) 
+    VALUES (?,?,?,?,?,?,?,?)"""
+
 def save_post(p):
     """Save Facebook post to database"""
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
     
     try:
-        from_info = p.get("from", {})
-        comments_summary = p.get("comments", {}).get("summary", {})
-        likes_summary = p.get("likes", {}).get("summary", {})
-        
-        c.execute("""INSERT OR IGNORE INTO facebook_posts 
-            (id, message, created_time, from_name, from_id, comments_count, likes_count, raw) 
-            VALUES (?,?,?,?,?,?,?,?)""",
-            (p["id"], p.get("message", ""), p.get("created_time"),
-             from_info.get("name", ""), from_info.get("id", ""),
-             comments_summary.get("total_count", 0), likes_summary.get("total_count", 0),
-             json.dumps(p)))
-        conn.commit()
+        c.execute(POST_INSERT, _post_row(p))
+        metrics.record_rows("facebook_posts", c.rowcount, 1)
+        metrics.commit(conn, "facebook_save")
         return True
     except Exception as e:
         print(f"DB save error: {e}")
@@ -130,15 +150,9 @@ def save_comment(cdata, post_id):
     c = conn.cursor()
     
     try:
-        from_info = cdata.get("from", {})
-        c.execute("""INSERT OR IGNORE INTO facebook_comments 
-            (id, post_id, message, from_name, from_id, created_time, like_count, raw) 
-            VALUES (?,?,?,?,?,?,?,?)""",
-            (cdata["id"], post_id, cdata.get("message", ""),
-             from_info.get("name", ""), from_info.get("id", ""),
-             cdata.get("created_time"), cdata.get("like_count", 0),
-             json.dumps(cdata)))
-        conn.commit()
+        c.execute(COMMENT_INSERT, _comment_row(cdata, post_id))
+        metrics.record_rows("facebook_comments", c.rowcount, 1)
+        metrics.commit(conn, "facebook_save")
         return True
     except Exception as e:
         print(f"DB save error: {e}")
@@ -146,6 +160,28 @@ def save_comment(cdata, post_id):
     finally:
         conn.close()
 
+def save_batch(posts=(), comments=()):
+    """Save posts and (comment, post_id) pairs in a single transaction.
+
+    Returns the number of rows actually inserted (duplicates are ignored). A failed
+    write rolls the whole batch back and raises sqlite3.Error, so callers that
+    cannot fetch the rows again (webhooks) can keep them.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    
+    try:
+        before = conn.total_changes
+        conn.executemany(POST_INSERT, [_post_row(p) for p in posts])
+        posts_inserted = conn.total_changes - before
+        conn.executemany(COMMENT_INSERT, [_comment_row(cm, pid) for cm, pid in comments])
+        # Closing without a commit after an error rolls the whole batch back
+        metrics.commit(conn, "facebook_batch")
+        metrics.record_rows("facebook_posts", posts_inserted, len(posts))
+        metrics.record_rows("facebook_comments", conn.total_changes - before - posts_inserted, len(comments))
+        return conn.total_changes - before
+    finally:
+        conn.close()
+
 def get_unprocessed_posts(limit=1000):
     """Get Facebook posts that haven't been processed yet"""
     conn = sqlite3.connect(DB_PATH)
@@ -208,5 +244,8 @@ def run_once():
     print("Facebook fetch complete")
 
 if __name__ == "__main__":
-    run_once()
+    parser = argparse.ArgumentParser(description="Fetch Facebook data once")
+    parser.add_argument("--profile", action="store_true", help="Write cProfile/tracemalloc reports")
+    with profiling.cycle("facebook", force=parser.parse_args().profile), profiling.stage("fetch_facebook"):
+        run_once()
 
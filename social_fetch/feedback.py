@@ -0,0 +1,110 @@
+"""
+Compact record type for feedback entries in the processing pipeline
+Entries stay as slotted objects with interned categorical fields and are only
+turned into the published JSON dict shape at the output boundary
+"""
+import sys
+from typing import Dict
+
+# Published JSON key -> attribute, for the keys stored on the record
+_ATTRIBUTES = {
+    "id": "id",
+    "state": "state",
+    "county": "county",
+    "city": "city",
+    "rating": "rating",
+    "score": "score",
+    "review": "review",
+    "date": "date",
+    "category": "category",
+    "source": "source",
+    "duplicateCount": "duplicate_count",
+}
+
+_interned = {}
+
+def intern(value):
+    """Share one string object per distinct state/city/county/category/source"""
+    if value is None:
+        return None
+    return _interned.setdefault(value, sys.intern(value))
+
+class Feedback:
+    """One processed social post, in roughly a third of the memory of its dict form"""
+
+    __slots__ = ("id", "author", "state", "county", "city", "rating", "score",
+                 "review", "date", "category", "source", "duplicate_count")
+
+    def __init__(self, id, author, state, county, city, rating, score, review, date,
+                 category, source, duplicate_count=1):
+        self.id = id
+        self.author = author
+        self.state = intern(state)
+        self.county = intern(county)
+        self.city = intern(city)
+        self.rating = rating
+        self.score = score
+        self.review = review
+        self.date = date
+        self.category = intern(category)
+        self.source = intern(source)
+        self.duplicate_count = duplicate_count
+
+    @property
+    def customer_name(self) -> str:
+        return f"{self.author or 'User'}."
+
+    @property
+    def location(self) -> str:
+        return f"{self.city}, {self.state[:2].upper()}"
+
+    def to_dict(self) -> Dict:
+        """Published entry format (api/entries-all.json)"""
+        return {
+            "id": self.id,
+            "customerName": self.customer_name,
+            "location": self.location,
+            "state": self.state,
+            "county": self.county,
+            "city": self.city,
+            "rating": self.rating,
+            "score": self.score,
+            "review": self.review,
+            "date": self.date,
+            "category": self.category,
+            "verified": False,  # Social media posts are not verified purchases
+            "source": self.source,
+            "duplicateCount": self.duplicate_count,
+        }
+
+    # Read/write by published key, so code written for entry dicts keeps working
+    def __getitem__(self, key):
+        if key in _ATTRIBUTES:
+            return getattr(self, _ATTRIBUTES[key])
+        if key == "customerName":
+            return self.customer_name
+        if key == "location":
+            return self.location
+        if key == "verified":
+            return False
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in _ATTRIBUTES:
+            raise KeyError(key)
+        setattr(self, _ATTRIBUTES[key], value)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        return f"Feedback({self.id!r}, {self.source!r}, rating={self.rating})"
+
+def to_json(obj):
+    """`default=` hook for json.dump: serialize Feedback records as entry dicts"""
+    if isinstance(obj, Feedback):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,42 @@
+"""
+Graph API requests shared by the Facebook and Instagram fetchers
+Every call draws on ratelimit.GRAPH_LIMITER (both fetchers use the same page
+token and quota), and a 429 pauses that budget before a bounded retry
+"""
+import os
+import sys
+
+import requests
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from social_fetch import metrics, ratelimit
+
+# Retries of a request after 429 responses before it is given up
+MAX_RETRIES = int(os.getenv("GRAPH_MAX_RETRIES", "3"))
+
+class RateLimited(requests.exceptions.RequestException):
+    """Still answered with 429 after MAX_RETRIES retries"""
+
+def get(endpoint, url, params):
+    """GET a Graph endpoint and return its JSON.
+
+    Raises RateLimited when the budget stays exhausted, and other
+    requests.exceptions.RequestException errors as requests does.
+    """
+    # Looked up per call, so a load test can swap in its own budget
+    limiter = ratelimit.GRAPH_LIMITER
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        r = metrics.http_get("graph", endpoint, url, params=params, timeout=30)
+        if r.status_code != 429:
+            r.raise_for_status()
+            return r.json()
+        if attempt == MAX_RETRIES:
+            break
+        # Rate limit - pause everything sharing the Graph budget, then retry
+        wait = ratelimit.retry_after(r)
+        print(f"Graph rate limited, pausing {wait:.0f}s")
+        limiter.pause(wait)
+    raise RateLimited(f"{endpoint} still rate limited after {MAX_RETRIES} retries")
@@ -5,17 +5,34 @@ Requires: Facebook Developer app, Instagram Business/Creator account,
 """
 import requests
 import os
-import time
 import sqlite3
-import json
+import sys
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from social_fetch import graph, metrics, profiling, raw_store
+
 load_dotenv()
 
 FB_TOKEN = os.getenv("FB_PAGE_ACCESS_TOKEN")
 IG_USER_ID = os.getenv("IG_USER_ID")  # numeric ID
 DB_PATH = os.path.join(os.path.dirname(__file__), "..", "social.db")
-BASE = "https://graph.facebook.com/v18.0"  # Update API version as needed
+# Update API version as needed; overridable so the fetcher can run against social_fetch.mock_api
+BASE = os.getenv("GRAPH_API_BASE", "https://graph.facebook.com/v18.0").rstrip("/")
+
+# Hashtags to ingest (comma-separated in .env)
+HASHTAGS = [h.strip().lstrip("#").lower() for h in os.getenv("INSTAGRAM_HASHTAGS", "tmobile").split(",") if h.strip()]
+# ig_hashtag_search allows 30 unique hashtags per 7 days, so IDs are cached in social.db
+HASHTAG_LOOKUP_LIMIT = 30
+# Hours before a hashtag that was not found (or whose lookup failed) is searched again
+HASHTAG_RETRY_HOURS = float(os.getenv("INSTAGRAM_HASHTAG_RETRY_HOURS", "24"))
+# Serializes the weekly-budget check and the lookup across run_hashtags workers
+_lookup_lock = threading.Lock()
 
 def init_db():
     """Initialize SQLite database for Instagram data"""
@@ -32,6 +49,18 @@ def init_db():
         processed INTEGER DEFAULT 0,
         created_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
     )""")
+    # Hashtag name -> ID cache; IDs never change, so each name is looked up once.
+    # Misses and failed lookups are kept too (status 'missing'/'error'), since they
+    # also use up the weekly budget, and retried after HASHTAG_RETRY_HOURS
+    c.execute("""CREATE TABLE IF NOT EXISTS instagram_hashtags (
+        name TEXT PRIMARY KEY,
+        hashtag_id TEXT,
+        status TEXT DEFAULT 'found',
+        looked_up_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )""")
+    columns = [row[1] for row in c.execute("PRAGMA table_info(instagram_hashtags)")]
+    if "status" not in columns:
+        c.execute("ALTER TABLE instagram_hashtags ADD COLUMN status TEXT DEFAULT 'found'")
     conn.commit()
     conn.close()
 
@@ -45,9 +74,7 @@ def get_user_media(limit=25):
     }
     
     try:
-        r = requests.get(url, params=params, timeout=30)
-        r.raise_for_status()
-        return r.json()
+        return graph.get("media", url, params)
     except requests.exceptions.RequestException as e:
         print(f"Error fetching Instagram media: {e}")
         return None
@@ -61,15 +88,17 @@ def get_media_comments(media_id):
     }
     
     try:
-        r = requests.get(url, params=params, timeout=30)
-        r.raise_for_status()
-        return r.json()
+        return graph.get("comments", url, params)
     except requests.exceptions.RequestException as e:
         print(f"Error fetching comments for media {media_id}: {e}")
         return None
 
 def search_hashtag(hashtag="tmobile"):
-    """Search for hashtag ID (requires instagram_graph permission)"""
+    """Search for hashtag ID (requires instagram_graph permission).
+
+    Returns None for a permanent error, and raises RequestException (including
+    graph.RateLimited) for errors worth retrying later.
+    """
     url = f"{BASE}/ig_hashtag_search"
     params = {
         "user_id": IG_USER_ID,
@@ -78,43 +107,59 @@ def search_hashtag(hashtag="tmobile"):
     }
     
     try:
-        r = requests.get(url, params=params, timeout=30)
-        r.raise_for_status()
-        return r.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Error searching hashtag: {e}")
-        return None
+        return graph.get("ig_hashtag_search", url, params)
+    except requests.exceptions.HTTPError as e:
+        # A 4xx client error (e.g. a tag Graph rejects) will not change on retry
+        if e.response is not None and 400 <= e.response.status_code < 500:
+            print(f"Error searching hashtag: {e}")
+            return None
+        raise
 
 def get_hashtag_media(hashtag_id, limit=25):
     """Get recent media for a hashtag"""
     url = f"{BASE}/{hashtag_id}/recent_media"
     params = {
         "user_id": IG_USER_ID,
-        "fields": "id,caption,timestamp,media_type,permalink,media_url",
+        "fields": "id,caption,timestamp,media_type,permalink,media_url,comments_count",
         "limit": limit,
         "access_token": FB_TOKEN
     }
     
     try:
-        r = requests.get(url, params=params, timeout=30)
-        r.raise_for_status()
-        return r.json()
+        return graph.get("recent_media", url, params)
     except requests.exceptions.RequestException as e:
         print(f"Error fetching hashtag media: {e}")
         return None
 
+def _comment_row(cdata, media_id, media_url=None):
+    """Build the instagram row for a comment object"""
+    columns = {"text": cdata.get("text", ""), "username": cdata.get("username", "unknown"),
+               "created_at": cdata.get("timestamp"), "media_url": media_url}
+    return (cdata["id"], cdata.get("text", ""), cdata.get("username", "unknown"),
+            cdata.get("timestamp"), media_id, media_url,
+            raw_store.encode_raw("instagram", cdata, columns, db_path=DB_PATH))
+
+def _caption_row(media_data):
+    """Build the instagram row for a media caption (media ID as comment ID, caption as text)"""
+    columns = {"text": media_data.get("caption", ""), "created_at": media_data.get("timestamp"),
+               "media_url": media_data.get("media_url")}
+    return (f"media_{media_data['id']}", media_data.get("caption", ""),
+            "media_owner", media_data.get("timestamp"), media_data["id"],
+            media_data.get("media_url"), raw_store.encode_raw("instagram", media_data, columns, db_path=DB_PATH))
+
+INSERT_SQL = """INSERT OR IGNORE INTO instagram 
+    (id, text, username, created_at, media_id, media_url, raw) 
+    VALUES (?,?,?,?,?,?,?)"""
+
 def save_comment(cdata, media_id, media_url=None):
     """Save Instagram comment to database"""
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
     
     try:
-        c.execute("""INSERT OR IGNORE INTO instagram 
-            (id, text, username, created_at, media_id, media_url, raw) 
-            VALUES (?,?,?,?,?,?,?)""",
-            (cdata["id"], cdata.get("text", ""), cdata.get("username", "unknown"),
-             cdata.get("timestamp"), media_id, media_url, json.dumps(cdata)))
-        conn.commit()
+        c.execute(INSERT_SQL, _comment_row(cdata, media_id, media_url))
+        metrics.record_rows("instagram", c.rowcount, 1)
+        metrics.commit(conn, "instagram_save")
         return True
     except Exception as e:
         print(f"DB save error: {e}")
@@ -128,14 +173,9 @@ def save_media_caption(media_data):
     c = conn.cursor()
     
     try:
-        # Use media ID as comment ID, caption as text
-        c.execute("""INSERT OR IGNORE INTO instagram 
-            (id, text, username, created_at, media_id, media_url, raw) 
-            VALUES (?,?,?,?,?,?,?)""",
-            (f"media_{media_data['id']}", media_data.get("caption", ""), 
-             "media_owner", media_data.get("timestamp"), media_data["id"],
-             media_data.get("media_url"), json.dumps(media_data)))
-        conn.commit()
+        c.execute(INSERT_SQL, _caption_row(media_data))
+        metrics.record_rows("instagram", c.rowcount, 1)
+        metrics.commit(conn, "instagram_save")
         return True
     except Exception as e:
         print(f"DB save error: {e}")
@@ -143,6 +183,26 @@ def save_media_caption(media_data):
     finally:
         conn.close()
 
+def save_batch(comments=(), captions=()):
+    """Save (comment, media_id, media_url) tuples and media captions in one transaction.
+
+    Returns the number of rows actually inserted (duplicates are ignored). A failed
+    write rolls the whole batch back and raises sqlite3.Error, so callers that
+    cannot fetch the rows again (webhooks) can keep them.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    
+    try:
+        before = conn.total_changes
+        conn.executemany(INSERT_SQL, [_caption_row(m) for m in captions])
+        conn.executemany(INSERT_SQL, [_comment_row(cm, mid, url) for cm, mid, url in comments])
+        # Closing without a commit after an error rolls the whole batch back
+        metrics.commit(conn, "instagram_batch")
+        metrics.record_rows("instagram", conn.total_changes - before, len(captions) + len(comments))
+        return conn.total_changes - before
+    finally:
+        conn.close()
+
 def get_unprocessed_instagram(limit=1000):
     """Get Instagram data that hasn't been processed yet"""
     conn = sqlite3.connect(DB_PATH)
@@ -160,6 +220,95 @@ def mark_processed(item_id):
     conn.commit()
     conn.close()
 
+def _cached_hashtag(conn, name):
+    """(hashtag_id, retry) for a cached lookup: retry is True once a miss has expired"""
+    row = conn.execute("""SELECT hashtag_id, looked_up_at < datetime('now', ?) FROM instagram_hashtags
+        WHERE name = ?""", (f"-{HASHTAG_RETRY_HOURS} hours", name)).fetchone()
+    if row is None:
+        return None, True
+    return row[0], not row[0] and bool(row[1])
+
+def get_hashtag_id(name):
+    """Return the hashtag ID for `name`, calling ig_hashtag_search only on a cache miss"""
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    
+    try:
+        hashtag_id, retry = _cached_hashtag(conn, name)
+        if hashtag_id or not retry:
+            return hashtag_id
+        
+        with _lookup_lock:
+            # Another worker may have looked it up while we waited
+            hashtag_id, retry = _cached_hashtag(conn, name)
+            if hashtag_id or not retry:
+                return hashtag_id
+            
+            recent = conn.execute("""SELECT COUNT(*) FROM instagram_hashtags
+                WHERE looked_up_at >= datetime('now', '-7 days')""").fetchone()[0]
+            if recent >= HASHTAG_LOOKUP_LIMIT:
+                print(f"Skipping #{name}: {HASHTAG_LOOKUP_LIMIT} hashtag lookups already used this week")
+                return None
+            
+            try:
+                result = search_hashtag(name)
+            except requests.exceptions.RequestException as e:
+                # Throttled or transient: not recorded, so it neither counts toward
+                # the weekly budget nor blocks the tag
+                print(f"Hashtag lookup for #{name} failed, retrying next run: {e}")
+                return None
+            if result is None:
+                status = "error"
+            elif result.get("data"):
+                hashtag_id, status = result["data"][0]["id"], "found"
+            else:
+                status = "missing"
+                print(f"Hashtag #{name} not found; retrying in {HASHTAG_RETRY_HOURS:g}h")
+            conn.execute("""INSERT OR REPLACE INTO instagram_hashtags (name, hashtag_id, status, looked_up_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)""", (name, hashtag_id, status))
+            conn.commit()
+            return hashtag_id
+    finally:
+        conn.close()
+
+def fetch_hashtag(name, limit=25):
+    """Fetch recent media for a hashtag and their comments, then save them in one batch"""
+    hashtag_id = get_hashtag_id(name)
+    if not hashtag_id:
+        return 0
+    
+    print(f"Fetching #{name} media...")
+    media = get_hashtag_media(hashtag_id, limit=limit)
+    if not media or "data" not in media:
+        return 0
+    
+    captions = []
+    comments = []
+    for m in media.get("data", []):
+        if m.get("caption"):
+            captions.append(m)
+        if m.get("comments_count"):
+            media_comments = get_media_comments(m["id"])
+            if media_comments and "data" in media_comments:
+                comments.extend((cm, m["id"], m.get("media_url")) for cm in media_comments["data"])
+    
+    try:
+        saved = save_batch(comments=comments, captions=captions)
+    except sqlite3.Error as e:
+        # Polled media is fetched again on the next run
+        print(f"DB batch save error for #{name}: {e}")
+        return 0
+    print(f"Saved {saved} new items from #{name}")
+    return saved
+
+def run_hashtags(hashtags=None, workers=4):
+    """Fetch all configured hashtags concurrently"""
+    hashtags = hashtags or HASHTAGS
+    if not hashtags:
+        return 0
+    
+    with ThreadPoolExecutor(max_workers=min(workers, len(hashtags))) as pool:
+        return sum(pool.map(profiling.threaded(fetch_hashtag), hashtags))
+
 def run_once():
     """Fetch Instagram data once"""
     if not FB_TOKEN or not IG_USER_ID:
@@ -188,12 +337,18 @@ def run_once():
             if comments and "data" in comments:
                 for cm in comments.get("data", []):
                     save_comment(cm, mid, media_url)
-                    time.sleep(0.5)  # Rate limit protection
+                    metrics.sleep("instagram_pacing", 0.5)  # Rate limit protection
             
-            time.sleep(1)  # Rate limit protection
+            metrics.sleep("instagram_pacing", 1)  # Rate limit protection
+    
+    # Fetch hashtag media and comments
+    run_hashtags()
     
     print("Instagram fetch complete")
 
 if __name__ == "__main__":
-    run_once()
+    parser = argparse.ArgumentParser(description="Fetch Instagram data once")
+    parser.add_argument("--profile", action="store_true", help="Write cProfile/tracemalloc reports")
+    with profiling.cycle("instagram", force=parser.parse_args().profile), profiling.stage("fetch_instagram"):
+        run_once()
 
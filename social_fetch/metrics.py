@@ -0,0 +1,327 @@
+"""
+Lightweight metrics for fetch and processing runs
+Thread-safe counters and histograms with labels, timers, Prometheus text
+export (to a file or a local /metrics endpoint) and per-run summaries stored
+in social.db's run_summaries table
+"""
+import bisect
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+import requests
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "social.db")
+# Prometheus textfile-collector path and/or port for a /metrics endpoint
+METRICS_FILE = os.getenv("SOCIAL_METRICS_FILE")
+METRICS_PORT = int(os.getenv("SOCIAL_METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("SOCIAL_METRICS_HOST", "127.0.0.1")
+
+# Seconds; wide enough for sub-ms SQLite commits and multi-second API calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _label_key(labels: Dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(key: tuple, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    """Monotonic value per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, lock):
+        self.name = name
+        self.help = help_text
+        self.lock = lock
+        self.values = {}
+
+    def inc(self, value=1.0, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + value
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.values)
+
+    def render(self):
+        lines = []
+        for key, value in sorted(self.snapshot().items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value:g}")
+        return lines
+
+class Histogram:
+    """Bucketed observations (count, sum, cumulative buckets) per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, lock, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.lock = lock
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [0, 0.0, [0] * len(self.buckets)]
+            entry[0] += 1
+            entry[1] += value
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                entry[2][i] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {key: (count, total) for key, (count, total, _) in self.values.items()}
+
+    def render(self):
+        with self.lock:
+            items = sorted((key, count, total, list(buckets)) for key, (count, total, buckets) in self.values.items())
+        lines = []
+        for key, count, total, buckets in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, buckets):
+                cumulative += n
+                le = _format_labels(key, 'le="%g"' % bound)
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _format_labels(key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total:g}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+class Registry:
+    """Named metrics; get-or-create, so modules can declare the same metric"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _get(self, cls, name, help_text, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help_text, threading.Lock(), **kwargs)
+            return metric
+
+    def counter(self, name, help_text="") -> Counter:
+        return self._get(Counter, name, help_text)
+
+    def histogram(self, name, help_text="", buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return {m.name: m.snapshot() for m in metrics}
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)"""
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda m: m.name)
+        lines = []
+        for m in metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+HTTP_SECONDS = REGISTRY.histogram("social_http_request_seconds", "API request latency by endpoint and status")
+SLEEP_SECONDS = REGISTRY.counter("social_sleep_seconds_total", "Time spent sleeping for rate limits and pacing")
+ROWS = REGISTRY.counter("social_rows_total", "Rows written to social.db, by table and result (inserted/ignored)")
+COMMIT_SECONDS = REGISTRY.histogram("social_db_commit_seconds", "SQLite commit time by operation")
+STAGE_SECONDS = REGISTRY.histogram("social_stage_seconds", "Processing stage time (per row or per chunk)")
+STAGE_ROWS = REGISTRY.counter("social_stage_rows_total", "Rows handled by each processing stage")
+STEP_SECONDS = REGISTRY.histogram("social_step_seconds", "Scheduler step duration")
+RUNS = REGISTRY.counter("social_runs_total", "Scheduler runs by job and status")
+
+def http_get(api: str, endpoint: str, url: str, **kwargs):
+    """requests.get, timed as social_http_request_seconds{api,endpoint,status}"""
+    start = time.perf_counter()
+    status = "error"
+    try:
+        response = requests.get(url, **kwargs)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_SECONDS.observe(time.perf_counter() - start, api=api, endpoint=endpoint, status=status)
+
+def record_sleep(reason: str, seconds: float):
+    if seconds > 0:
+        SLEEP_SECONDS.inc(seconds, reason=reason)
+
+def sleep(reason: str, seconds: float):
+    """time.sleep, counted in social_sleep_seconds_total{reason}"""
+    time.sleep(seconds)
+    record_sleep(reason, seconds)
+
+def record_rows(table: str, inserted: int, attempted: int):
+    """Count INSERT OR IGNORE results for a batch"""
+    if inserted:
+        ROWS.inc(inserted, table=table, result="inserted")
+    if attempted > inserted:
+        ROWS.inc(attempted - inserted, table=table, result="ignored")
+
+def commit(conn, operation: str):
+    """conn.commit(), timed as social_db_commit_seconds{operation}"""
+    start = time.perf_counter()
+    conn.commit()
+    COMMIT_SECONDS.observe(time.perf_counter() - start, operation=operation)
+
+@contextmanager
+def timer(histogram: Histogram, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+def stage_observer(stage: str, seconds: float, rows: int):
+    """process_social_data.STAGE_OBSERVERS callback"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    STAGE_ROWS.inc(rows, stage=stage)
+
+# Export
+
+def write_prometheus(path: Optional[str] = None, registry: Registry = REGISTRY) -> Optional[str]:
+    """Write the text format atomically (for node_exporter's textfile collector)"""
+    path = path or METRICS_FILE
+    if not path:
+        return None
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(registry.render())
+    os.replace(tmp, path)
+    return path
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(port: Optional[int] = None, host: str = METRICS_HOST, registry: Registry = REGISTRY):
+    """Serve /metrics on a daemon thread; returns the server (None if no port configured)"""
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    handler = type("BoundMetricsHandler", (MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Metrics available at http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+# Per-run summaries
+
+def init_db(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS run_summaries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job TEXT,
+        started_at TEXT,
+        finished_at TEXT,
+        duration_s REAL,
+        status TEXT,
+        error TEXT,
+        summary JSON
+    )""")
+    conn.commit()
+
+def _label_str(key: tuple) -> str:
+    return ",".join(f"{k}={v}" for k, v in key) or "all"
+
+def diff_snapshots(before: Dict, after: Dict) -> Dict:
+    """What changed between two REGISTRY snapshots, as {metric: {labels: value}}"""
+    changes = {}
+    for name, values in after.items():
+        old = before.get(name, {})
+        out = {}
+        for key, value in values.items():
+            if isinstance(value, tuple):
+                count, total = value
+                prev_count, prev_total = old.get(key, (0, 0.0))
+                if count != prev_count:
+                    out[_label_str(key)] = {"count": count - prev_count, "sum": round(total - prev_total, 6)}
+            else:
+                delta = value - old.get(key, 0.0)
+                if delta:
+                    out[_label_str(key)] = round(delta, 6)
+        if out:
+            changes[name] = out
+    return changes
+
+@contextmanager
+def run(job: str, db_path: Optional[str] = None):
+    """Record a run: counts it, and stores the metric deltas it caused in run_summaries"""
+    before = REGISTRY.snapshot()
+    started = datetime.now()
+    start = time.perf_counter()
+    status, error = "ok", None
+    try:
+        yield
+    except Exception as e:
+        status, error = "error", f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        RUNS.inc(job=job, status=status)
+        summary = diff_snapshots(before, REGISTRY.snapshot())
+        try:
+            conn = sqlite3.connect(db_path or DB_PATH, timeout=30)
+            init_db(conn)
+            conn.execute("""INSERT INTO run_summaries (job, started_at, finished_at, duration_s, status, error, summary)
+                VALUES (?,?,?,?,?,?,?)""", (job, started.isoformat(), datetime.now().isoformat(),
+                                            round(duration, 3), status, error, json.dumps(summary)))
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Could not store run summary: {e}")
+        write_prometheus()
+
+def recent_runs(limit: int = 10, db_path: Optional[str] = None):
+    """Latest run summaries, newest first"""
+    conn = sqlite3.connect(db_path or DB_PATH)
+    init_db(conn)
+    rows = conn.execute("""SELECT id, job, started_at, duration_s, status, error, summary FROM run_summaries
+        ORDER BY id DESC LIMIT ?""", (limit,)).fetchall()
+    conn.close()
+    return [{"id": r[0], "job": r[1], "started_at": r[2], "duration_s": r[3], "status": r[4], "error": r[5],
+             "summary": json.loads(r[6] or "{}")} for r in rows]
+
+if __name__ == "__main__":
+    for r in recent_runs():
+        print(json.dumps(r, indent=2))
@@ -0,0 +1,430 @@
+"""
+Local stand-in for the Twitter v2 and Graph APIs, for offline load testing
+Serves tweets/search/recent and the Graph feed, tagged, comments, media,
+ig_hashtag_search and recent_media endpoints with synthetic data, configurable
+latency, page counts, rate-limit headers and injected 429 bursts.
+
+Point the fetchers at it with:
+    TWITTER_API_BASE=http://127.0.0.1:8789/twitter/2
+    GRAPH_API_BASE=http://127.0.0.1:8789/graph/v18.0
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode, urlparse, parse_qs
+
+HOST = os.getenv("MOCK_API_HOST", "127.0.0.1")
+PORT = int(os.getenv("MOCK_API_PORT", "8789"))
+TWITTER_PREFIX = "/twitter/2"
+GRAPH_PREFIX = "/graph/v18.0"
+BASE_TWEET_ID = 1800000000000000000
+
+_TOPICS = ["no signal at my place again", "5G home internet is blazing fast", "my bill went up for no reason",
+           "support agent fixed my issue quickly", "another outage this morning", "coverage on the highway is great",
+           "streaming keeps buffering", "the new plan is affordable", "dead zone right outside my office"]
+_PLACES = ["", "in Ohio", "in Austin, TX", "in Seattle, WA", "in Florida", "in Denver, CO", "in New York"]
+_FEELINGS = ["love it", "so frustrating", "pretty happy", "terrible", "amazing", "meh", ""]
+
+def parse_latency(spec: str):
+    """Latency sampler (seconds) from a spec in milliseconds.
+
+    "0" | "fixed:MS" | "uniform:MIN:MAX" | "normal:MEAN:SD" |
+    "lognormal:MEDIAN:SIGMA" | "exponential:MEAN"
+    """
+    parts = str(spec).split(":")
+    kind, args = parts[0], [float(a) for a in parts[1:]]
+    if kind.replace(".", "").isdigit():
+        kind, args = "fixed", [float(kind)]
+    samplers = {
+        "fixed": lambda rng: args[0],
+        "uniform": lambda rng: rng.uniform(args[0], args[1]),
+        "normal": lambda rng: rng.gauss(args[0], args[1]),
+        "lognormal": lambda rng: args[0] * rng.lognormvariate(0, args[1]),
+        "exponential": lambda rng: rng.expovariate(1 / args[0]),
+    }
+    if kind not in samplers:
+        raise ValueError(f"Unknown latency distribution: {spec}")
+    sampler = samplers[kind]
+    return lambda rng: max(0.0, sampler(rng)) / 1000
+
+class MockState:
+    """Configuration, fault injection and request counters shared by all handler threads"""
+
+    def __init__(self, latency="0", pages=3, page_size=None, comments=5, rate_limit=300, rate_window=900,
+                 burst_every=0, burst_length=3, burst_reset=2.0, seed=0):
+        self.latency = parse_latency(latency)
+        self.pages = pages
+        self.page_size = page_size
+        self.comments = comments
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.burst_reset = burst_reset
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window_start = time.time()
+        self.window_calls = {}
+        self.since_burst = 0
+        self.burst_left = 0
+        self.burst_until = 0.0
+        self.in_flight = 0
+        self.stats = {"requests": 0, "ok": 0, "throttled": 0, "max_in_flight": 0, "endpoints": {}}
+
+    def sample_latency(self):
+        with self.lock:
+            return self.latency(self.rng)
+
+    def admit(self, api: str, endpoint: str):
+        """Count a request; returns (status, limit, remaining, reset_epoch)"""
+        with self.lock:
+            now = time.time()
+            self.stats["requests"] += 1
+            self.stats["endpoints"][endpoint] = self.stats["endpoints"].get(endpoint, 0) + 1
+            if now - self.window_start >= self.rate_window:
+                self.window_start = now
+                self.window_calls = {}
+            reset = self.window_start + self.rate_window
+            used = self.window_calls.get(api, 0)
+
+            # Injected burst: the next burst_length requests are throttled
+            if self.burst_every and self.burst_left == 0 and self.since_burst >= self.burst_every:
+                self.burst_left = self.burst_length
+                self.burst_until = now + self.burst_reset
+                self.since_burst = 0
+            if self.burst_left:
+                self.burst_left -= 1
+                self.stats["throttled"] += 1
+                return 429, self.rate_limit, 0, self.burst_until
+            if used >= self.rate_limit:
+                self.stats["throttled"] += 1
+                return 429, self.rate_limit, 0, reset
+
+            self.window_calls[api] = used + 1
+            self.since_burst += 1
+            self.stats["ok"] += 1
+            return 200, self.rate_limit, self.rate_limit - used - 1, reset
+
+    def enter(self):
+        with self.lock:
+            self.in_flight += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.in_flight)
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+def _seed(*parts) -> int:
+    return zlib.crc32("|".join(str(p) for p in parts).encode())
+
+def _text(rng: random.Random, n: int) -> str:
+    return " ".join(p for p in (f"T-Mobile {rng.choice(_TOPICS)}", rng.choice(_PLACES),
+                                rng.choice(_FEELINGS), f"#{n % 50}") if p)
+
+def _graph_time(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%S+0000")
+
+def _page(params) -> int:
+    token = params.get("next_token") or params.get("after") or "0"
+    try:
+        return int(token.lstrip("p"))
+    except ValueError:
+        return 0
+
+def search_recent(state: MockState, params: dict) -> dict:
+    """tweets/search/recent: newest first, next_token until `pages` pages, honoring since_id"""
+    query = params.get("query", "")
+    page = _page(params)
+    size = state.page_size or min(int(params.get("max_results", 10)), 100)
+    end = params.get("end_time")
+    end_dt = datetime.fromisoformat(end.replace("Z", "+00:00")) if end else datetime.now(timezone.utc)
+    # Distinct ID ranges per query and time window
+    top = BASE_TWEET_ID + (_seed(query, params.get("start_time"), end) % 10 ** 6) * 10 ** 6
+    since_id = int(params.get("since_id") or 0)
+    rng = random.Random(_seed(query, end, page))
+
+    tweets, users = [], {}
+    for i in range(size):
+        n = page * size + i
+        tweet_id = top - n
+        if tweet_id <= since_id:
+            break
+        author = str(rng.randint(1, 5000))
+        users[author] = {"id": author, "username": f"user{author}", "name": f"User {author}"}
+        tweets.append({
+            "id": str(tweet_id), "text": _text(rng, n), "author_id": author, "lang": "en",
+            "created_at": (end_dt - timedelta(seconds=n * 3)).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "public_metrics": {"retweet_count": rng.randint(0, 20), "reply_count": rng.randint(0, 20),
+                               "like_count": rng.randint(0, 200), "quote_count": 0},
+        })
+    meta = {"result_count": len(tweets)}
+    if tweets:
+        meta.update(newest_id=tweets[0]["id"], oldest_id=tweets[-1]["id"])
+        if page + 1 < state.pages and len(tweets) == size:
+            meta["next_token"] = f"p{page + 1}"
+    body = {"meta": meta}
+    if tweets:
+        body["data"] = tweets
+        body["includes"] = {"users": list(users.values())}
+    return body
+
+def _graph_list(state: MockState, params: dict, make_item, total: int, url: str) -> dict:
+    """Cursor-paginated Graph list ({"data", "paging"}) of `total` items across pages"""
+    page = _page(params)
+    size = state.page_size or int(params.get("limit", 25))
+    start = page * size
+    items = [make_item(n) for n in range(start, min(start + size, total))]
+    body = {"data": items}
+    if items:
+        body["paging"] = {"cursors": {"before": f"p{page}", "after": f"p{page + 1}"}}
+        if start + size < total:
+            body["paging"]["next"] = f"{url}?{urlencode(dict(params, after=f'p{page + 1}'))}"
+    return body
+
+def graph(state: MockState, path: str, params: dict, url: str):
+    """Route a Graph API path; returns a JSON body or None for unknown endpoints"""
+    parts = path.strip("/").split("/")
+    now = datetime.now(timezone.utc)
+    fields = params.get("fields", "")
+
+    if parts == ["ig_hashtag_search"]:
+        return {"data": [{"id": str(17841000000000000 + _seed(params.get("q", "")) % 10 ** 9)}]}
+    if len(parts) != 2:
+        return None
+    node, edge = parts
+
+    if edge in ("feed", "tagged"):
+        def post(n):
+            r = random.Random(_seed(node, edge, n))
+            return {
+                "id": f"{_seed(node, edge) % 10 ** 6}_{n}", "message": _text(r, n),
+                "created_time": _graph_time(now - timedelta(minutes=n * 7)),
+                "from": {"name": f"Fan {r.randint(1, 5000)}", "id": str(r.randint(10 ** 9, 10 ** 10))},
+                "comments": {"data": [], "summary": {"total_count": state.comments}},
+                "likes": {"data": [], "summary": {"total_count": r.randint(0, 500)}},
+            }
+        return _graph_list(state, params, post, state.pages * int(params.get("limit", 25)), url)
+
+    if edge in ("media", "recent_media"):
+        def media(n):
+            r = random.Random(_seed(node, edge, n))
+            media_id = str(17900000000000000 + _seed(node, edge) % 10 ** 6 * 1000 + n)
+            return {
+                "id": media_id, "caption": _text(r, n), "timestamp": _graph_time(now - timedelta(minutes=n * 11)),
+                "media_type": "IMAGE", "permalink": f"https://www.instagram.com/p/mock{media_id}/",
+                "media_url": f"https://scontent.example/mock/{media_id}.jpg", "comments_count": state.comments,
+            }
+        return _graph_list(state, params, media, state.pages * int(params.get("limit", 25)), url)
+
+    if edge == "comments":
+        instagram = "text" in fields.split(",") or "username" in fields.split(",")
+
+        def comment(n):
+            r = random.Random(_seed(node, n))
+            created = _graph_time(now - timedelta(minutes=n * 3))
+            if instagram:
+                return {"id": f"{node}{n:04d}", "text": _text(r, n), "username": f"ig_user{r.randint(1, 5000)}",
+                        "timestamp": created, "like_count": r.randint(0, 50)}
+            return {"id": f"{node}_{n}", "message": _text(r, n), "created_time": created,
+                    "from": {"name": f"Fan {r.randint(1, 5000)}", "id": str(r.randint(10 ** 9, 10 ** 10))},
+                    "like_count": r.randint(0, 50)}
+        return _graph_list(state, params, comment, state.comments, url)
+    return None
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Dispatches /twitter/2/... and /graph/v18.0/... requests to the mock endpoints"""
+
+    state = None
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        if parsed.path == "/_stats":
+            self._json(200, self.state.stats)
+            return
+        if parsed.path.startswith(TWITTER_PREFIX):
+            api, path = "twitter", parsed.path[len(TWITTER_PREFIX):]
+        elif parsed.path.startswith(GRAPH_PREFIX):
+            api, path = "graph", parsed.path[len(GRAPH_PREFIX):]
+        else:
+            self._json(404, {"error": "unknown API prefix"})
+            return
+
+        self.state.enter()
+        try:
+            time.sleep(self.state.sample_latency())
+            endpoint = f"{api}:{path.rstrip('/').split('/')[-1]}"
+            status, limit, remaining, reset = self.state.admit(api, endpoint)
+            if api == "twitter":
+                headers = {"x-rate-limit-limit": limit, "x-rate-limit-remaining": remaining,
+                           "x-rate-limit-reset": int(reset + 0.999)}
+            else:
+                usage = min(100, int(100 * (limit - remaining) / max(limit, 1)))
+                headers = {"X-App-Usage": json.dumps({"call_count": usage, "total_cputime": usage // 2,
+                                                      "total_time": usage // 2})}
+            if status == 429:
+                headers["Retry-After"] = max(1, int(reset - time.time() + 0.999))
+                if api == "twitter":
+                    body = {"title": "Too Many Requests", "detail": "Too Many Requests", "type": "about:blank",
+                            "status": 429}
+                else:
+                    body = {"error": {"message": "(#4) Application request limit reached", "type": "OAuthException",
+                                      "is_transient": True, "code": 4}}
+                self._json(429, body, headers)
+                return
+
+            url = f"http://{self.headers.get('Host', f'{HOST}:{PORT}')}{parsed.path}"
+            if api == "twitter" and path.rstrip("/") == "/tweets/search/recent":
+                body = search_recent(self.state, params)
+            elif api == "graph":
+                body = graph(self.state, path, params, url)
+            else:
+                body = None
+            if body is None:
+                self._json(404, {"error": f"unknown endpoint {parsed.path}"}, headers)
+            else:
+                self._json(200, body, headers)
+        finally:
+            self.state.leave()
+
+    def _json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def make_server(host=HOST, port=PORT, **options):
+    """Create the mock server (not yet serving); MockState options are passed through"""
+    state = MockState(**options)
+    handler = type("BoundMockHandler", (MockHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    return server
+
+def start_background(host=HOST, port=0, **options):
+    """Serve on a daemon thread (port 0 picks a free port); returns (server, base_url)"""
+    server = make_server(host, port, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def load_test(db_path: str, backfill_hours: int = 24, workers: int = 8, **options) -> dict:
+    """Run the fetchers against a background mock server and a scratch database.
+
+    Covers Twitter query sets and a concurrent backfill, the Facebook feed/tagged
+    pass and concurrent Instagram hashtags; returns timings and server stats.
+    """
+    import sqlite3
+    from social_fetch import twitter_fetch, facebook_fetch, instagram_fetch, ratelimit
+    from social_fetch.ratelimit import RateLimiter
+
+    server, base = start_background(**options)
+    modules = (twitter_fetch, facebook_fetch, instagram_fetch)
+    saved = {m: dict(vars(m)) for m in modules}
+    graph_limiter = ratelimit.GRAPH_LIMITER
+    report = {"timings_s": {}}
+    try:
+        for m in modules:
+            m.DB_PATH = db_path
+        twitter_fetch.BEARER = "mock"
+        twitter_fetch.SEARCH_URL = f"{base}{TWITTER_PREFIX}/tweets/search/recent"
+        facebook_fetch.BASE = instagram_fetch.BASE = f"{base}{GRAPH_PREFIX}"
+        facebook_fetch.FB_TOKEN = instagram_fetch.FB_TOKEN = "mock"
+        facebook_fetch.PAGE_ID = "mock-page"
+        instagram_fetch.IG_USER_ID = "mock-ig-user"
+        # Client budgets match the limits the mock advertises; Facebook and
+        # Instagram share one Graph budget, as they do against the real API
+        rate_limit, rate_window = options.get("rate_limit", 300), options.get("rate_window", 900)
+        twitter_fetch.LIMITER = RateLimiter(rate_limit, rate_window, name="twitter")
+        ratelimit.GRAPH_LIMITER = RateLimiter(rate_limit, rate_window, name="graph")
+        facebook_fetch.init_db()
+        instagram_fetch.init_db()
+
+        end = datetime.now(timezone.utc) - timedelta(minutes=1)
+        steps = [
+            ("twitter_run_once", lambda: twitter_fetch.run_once()),
+            ("twitter_backfill", lambda: twitter_fetch.backfill(
+                (end - timedelta(hours=backfill_hours)).isoformat(), end.isoformat(), 60, workers)),
+            ("facebook_run_once", lambda: facebook_fetch.run_once()),
+            ("instagram_hashtags", lambda: instagram_fetch.run_hashtags(
+                [f"mocktag{i}" for i in range(4)], workers)),
+        ]
+        for name, step in steps:
+            start = time.perf_counter()
+            step()
+            report["timings_s"][name] = round(time.perf_counter() - start, 3)
+    finally:
+        for m in modules:
+            for key in ("DB_PATH", "BEARER", "SEARCH_URL", "BASE", "FB_TOKEN", "PAGE_ID", "IG_USER_ID", "LIMITER"):
+                if key in saved[m]:
+                    setattr(m, key, saved[m][key])
+        ratelimit.GRAPH_LIMITER = graph_limiter
+        server.shutdown()
+        server.server_close()
+
+    conn = sqlite3.connect(db_path)
+    report["rows"] = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                      for t in ("twitter", "facebook_posts", "facebook_comments", "instagram")}
+    conn.close()
+    report["server"] = server.state.stats
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock Twitter/Graph API server")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--latency", default="0",
+                        help="ms: 50 | uniform:20:80 | normal:50:10 | lognormal:40:0.6 | exponential:50")
+    parser.add_argument("--pages", type=int, default=3, help="Pages per list/search before the cursor ends")
+    parser.add_argument("--page-size", type=int, help="Override the requested limit/max_results")
+    parser.add_argument("--comments", type=int, default=5, help="Comments per post/media")
+    parser.add_argument("--rate-limit", type=int, default=300, help="Requests per window per API")
+    parser.add_argument("--rate-window", type=float, default=900, help="Window length in seconds")
+    parser.add_argument("--burst-every", type=int, default=0, help="Inject a 429 burst after every N accepted requests")
+    parser.add_argument("--burst-length", type=int, default=3, help="Requests throttled per burst")
+    parser.add_argument("--burst-reset", type=float, default=2.0, help="Seconds until a burst clears")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--load-test", metavar="DB", help="Run the fetchers against a private mock server "
+                        "and scratch database DB, then print timings and server stats")
+    args = parser.parse_args(argv)
+
+    if args.load_test:
+        report = load_test(args.load_test, latency=args.latency, pages=args.pages, page_size=args.page_size,
+                           comments=args.comments, rate_limit=args.rate_limit, rate_window=args.rate_window,
+                           burst_every=args.burst_every, burst_length=args.burst_length,
+                           burst_reset=args.burst_reset, seed=args.seed)
+        print(json.dumps(report, indent=2))
+        return
+
+    server = make_server(args.host, args.port, latency=args.latency, pages=args.pages, page_size=args.page_size,
+                         comments=args.comments, rate_limit=args.rate_limit, rate_window=args.rate_window,
+                         burst_every=args.burst_every, burst_length=args.burst_length,
+                         burst_reset=args.burst_reset, seed=args.seed)
+    base = f"http://{args.host}:{server.server_address[1]}"
+    print(f"Mock API listening on {base}")
+    print(f"  TWITTER_API_BASE={base}{TWITTER_PREFIX}")
+    print(f"  GRAPH_API_BASE={base}{GRAPH_PREFIX}")
+    print(f"  stats: {base}/_stats")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.state.stats, indent=2))
+
+if __name__ == "__main__":
+    main()
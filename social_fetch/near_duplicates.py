@@ -0,0 +1,135 @@
+"""
+Near-duplicate detection for social posts using 64-bit SimHash
+Bot waves and copy-paste posts are collapsed to one representative entry
+that carries a duplicate count, before sentiment scoring
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+from typing import Dict, Optional
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from social_fetch import metrics
+
+# Signatures within this many differing bits are treated as the same post
+MAX_DISTANCE = 3
+# 4 bands of 16 bits: two signatures within 3 bits must agree on at least one band
+BANDS = 4
+BAND_BITS = 64 // BANDS
+# Only posts from the last N days are considered when looking for a match
+WINDOW_DAYS = 30
+
+_URL_RE = re.compile(r"https?://\S+|www\.\S+")
+_MENTION_RE = re.compile(r"[@#]\w+")
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+def init_db(conn):
+    """Create the signature index table"""
+    conn.execute("""CREATE TABLE IF NOT EXISTS simhash_index (
+        feedback_id TEXT PRIMARY KEY,
+        simhash INTEGER,
+        band0 INTEGER,
+        band1 INTEGER,
+        band2 INTEGER,
+        band3 INTEGER,
+        duplicate_count INTEGER DEFAULT 1,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )""")
+    for band in range(BANDS):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_simhash_band{band} ON simhash_index (band{band})")
+    # Posts already counted into a cluster, so reprocessing them does not count them twice
+    conn.execute("""CREATE TABLE IF NOT EXISTS simhash_duplicates (
+        feedback_id TEXT PRIMARY KEY,
+        representative_id TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )""")
+    conn.commit()
+
+def _tokens(text: str):
+    text = _URL_RE.sub(" ", text.lower())
+    text = _MENTION_RE.sub(" ", text)
+    return _WORD_RE.findall(text)
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of a text's word 3-gram shingles (URLs and @/# tags ignored)"""
+    tokens = _tokens(text)
+    if len(tokens) >= 3:
+        shingles = [" ".join(tokens[i:i + 3]) for i in range(len(tokens) - 2)]
+    else:
+        shingles = tokens or [text.lower()]
+
+    bits = [format(int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big"), "064b")
+            for s in shingles]
+    half = len(bits) / 2
+    # Bit i of the fingerprint is set when most shingle hashes have it set
+    return int("".join("1" if column.count("1") > half else "0" for column in zip(*bits)), 2)
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+def _signed(value: int) -> int:
+    """SQLite integers are signed 64-bit"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def _bands(value: int):
+    mask = (1 << BAND_BITS) - 1
+    return [(value >> (band * BAND_BITS)) & mask for band in range(BANDS)]
+
+class NearDuplicateIndex:
+    """Persistent SimHash index in social.db.
+
+    check() returns the representative feedback ID when a text is a near
+    duplicate of one already seen (and bumps that cluster's count), otherwise
+    it registers the text as a new representative and returns None. Writes are
+    left uncommitted until commit(), which callers make once per chunk.
+    """
+
+    def __init__(self, db_path: str, max_distance: int = MAX_DISTANCE,
+                 window_days: int = WINDOW_DAYS):
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.max_distance = max_distance
+        self.window_days = window_days
+        self.duplicate_counts: Dict[str, int] = {}
+        self.suppressed = 0
+        init_db(self.conn)
+
+    def check(self, feedback_id: str, text: str) -> Optional[str]:
+        seen = self.conn.execute("SELECT representative_id FROM simhash_duplicates WHERE feedback_id = ?",
+                                 (feedback_id,)).fetchone()
+        if seen:
+            return seen[0]
+
+        signature = simhash(text)
+        bands = _bands(signature)
+        candidates = self.conn.execute(f"""SELECT feedback_id, simhash, duplicate_count FROM simhash_index
+            WHERE (band0 = ? OR band1 = ? OR band2 = ? OR band3 = ?)
+            AND created_at >= datetime('now', '-{int(self.window_days)} days')""", bands).fetchall()
+
+        for candidate_id, candidate_hash, count in candidates:
+            if candidate_id == feedback_id:
+                return None
+            if hamming(signature, candidate_hash & ((1 << 64) - 1)) <= self.max_distance:
+                self.conn.execute("INSERT INTO simhash_duplicates (feedback_id, representative_id) VALUES (?, ?)",
+                                  (feedback_id, candidate_id))
+                self.conn.execute("UPDATE simhash_index SET duplicate_count = duplicate_count + 1 WHERE feedback_id = ?",
+                                  (candidate_id,))
+                self.duplicate_counts[candidate_id] = count + 1
+                self.suppressed += 1
+                return candidate_id
+
+        self.conn.execute("""INSERT OR IGNORE INTO simhash_index
+            (feedback_id, simhash, band0, band1, band2, band3) VALUES (?,?,?,?,?,?)""",
+            [feedback_id, _signed(signature)] + bands)
+        return None
+
+    def commit(self):
+        """Commit the signatures and counts recorded since the last commit"""
+        metrics.commit(self.conn, "simhash_index")
+
+    def close(self):
+        self.commit()
+        self.conn.close()
@@ -3,11 +3,22 @@ Process social media data and convert to feedback/review format
 Includes sentiment analysis and rating calculation
 """
 import sqlite3
-import json
 import os
 import re
+import sys
+import random
+import argparse
 from datetime import datetime
-from typing import List, Dict, Optional
+from time import perf_counter
+from typing import Callable, List, Dict, Optional, Tuple
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from social_fetch import twitter_fetch, search_index, columnar_export, serializers, metrics, profiling
+from social_fetch.near_duplicates import NearDuplicateIndex
+from social_fetch.published_index import PublishedIndex
+from social_fetch.feedback import Feedback, intern
 
 # Try to import VADER sentiment analyzer
 try:
@@ -95,297 +106,226 @@ def categorize_text(text: str) -> str:
         return max(category_scores, key=category_scores.get)
     return "Other"
 
-def extract_location(text: str, username: str = "") -> Dict[str, str]:
-    """Extract or infer location from text/username"""
+# Common city patterns
+CITY_PATTERN = re.compile(r"\b([A-Z][a-z]+),?\s+(CA|NY|TX|FL|IL|PA|OH|GA|NC|MI|NJ|VA|WA|AZ|MA|TN|IN|MO|MD|WI|CO|MN|SC|AL|LA|KY|OR|OK|CT|IA|UT|AR|NV|MS|KS|NM|NE|WV|ID|HI|NH|ME|RI|MT|DE|SD|ND|AK|VT|WY)\b")
+STATE_ABBREVIATIONS = {
+    "CA": "California", "NY": "New York", "TX": "Texas", "FL": "Florida",
+    "IL": "Illinois", "PA": "Pennsylvania", "OH": "Ohio", "GA": "Georgia",
+    "NC": "North Carolina", "MI": "Michigan", "NJ": "New Jersey",
+    "VA": "Virginia", "WA": "Washington", "AZ": "Arizona", "MA": "Massachusetts"
+}
+STATES_LOWER = [(state.lower(), state) for state in US_STATES]
+
+# Rows are fetched, processed and marked in chunks of this size
+BATCH_SIZE = 1000
+
+# Stage timing observers, called as observer(stage, seconds, rows) (see benchmark.py)
+STAGE_OBSERVERS: List[Callable] = []
+
+def _record_stage(stage: str, start: float, rows: int = 1):
+    """Report the time since `start` for a pipeline stage to any observers"""
+    if STAGE_OBSERVERS:
+        elapsed = perf_counter() - start
+        for observer in STAGE_OBSERVERS:
+            observer(stage, elapsed, rows)
+
+_locations = {}
+
+def _location(state: str, city: str) -> Tuple[str, str, str]:
+    """Shared (state, city, county) tuple, so repeated locations are built once"""
+    key = (state, city)
+    if key not in _locations:
+        _locations[key] = (intern(state), intern(city), intern(f"{city} County"))
+    return _locations[key]
+
+def locate(text: str) -> Tuple[str, str, str]:
+    """(state, city, county) mentioned in the text, or a random state"""
     # Try to extract state mentions
-    for state in US_STATES:
-        if state.lower() in text.lower():
-            return {"state": state, "city": state, "county": f"{state} County"}
-    
-    # Common city patterns
-    city_patterns = [
-        r"\b([A-Z][a-z]+),?\s+(CA|NY|TX|FL|IL|PA|OH|GA|NC|MI|NJ|VA|WA|AZ|MA|TN|IN|MO|MD|WI|CO|MN|SC|AL|LA|KY|OR|OK|CT|IA|UT|AR|NV|MS|KS|NM|NE|WV|ID|HI|NH|ME|RI|MT|DE|SD|ND|AK|VT|WY)\b"
-    ]
+    text_lower = text.lower()
+    for state_lower, state in STATES_LOWER:
+        if state_lower in text_lower:
+            return _location(state, state)
     
-    for pattern in city_patterns:
-        match = re.search(pattern, text)
-        if match:
-            city = match.group(1)
-            state_abbr = match.group(2)
-            # Convert abbreviation to full state name
-            state_map = {
-                "CA": "California", "NY": "New York", "TX": "Texas", "FL": "Florida",
-                "IL": "Illinois", "PA": "Pennsylvania", "OH": "Ohio", "GA": "Georgia",
-                "NC": "North Carolina", "MI": "Michigan", "NJ": "New Jersey",
-                "VA": "Virginia", "WA": "Washington", "AZ": "Arizona", "MA": "Massachusetts"
-            }
-            state = state_map.get(state_abbr, "Unknown")
-            return {"state": state, "city": city, "county": f"{city} County"}
+    match = CITY_PATTERN.search(text)
+    if match:
+        # Convert abbreviation to full state name
+        return _location(STATE_ABBREVIATIONS.get(match.group(2), "Unknown"), match.group(1))
     
     # Default to random state (or could use geolocation if available)
-    import random
     state = random.choice(US_STATES)
-    return {"state": state, "city": state, "county": f"{state} County"}
+    return _location(state, state)
 
-def process_twitter_data() -> List[Dict]:
-    """Process Twitter data and convert to feedback format"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT * FROM twitter WHERE processed = 0")
-    rows = c.fetchall()
-    
-    # Get column names
-    columns = [description[0] for description in c.description]
-    feedbacks = []
-    
-    for row in rows:
-        row_dict = dict(zip(columns, row))
-        tweet_id = row_dict["id"]
-        text = row_dict.get("text", "")
-        
-        if not text or len(text) < 10:  # Skip very short tweets
-            mark_processed_twitter(tweet_id)
-            continue
-        
-        # Analyze sentiment
-        sentiment = analyze_sentiment(text)
-        rating = sentiment_to_rating(sentiment["compound"])
-        score = round(rating * 20)
-        
-        # Extract location
-        location_info = extract_location(text, row_dict.get("author_username", ""))
-        
-        # Categorize
-        category = categorize_text(text)
-        
-        # Create feedback entry
-        feedback = {
-            "id": f"twitter-{tweet_id}",
-            "customerName": f"{row_dict.get('author_username', 'User')}.",
-            "location": f"{location_info['city']}, {location_info['state'][:2].upper()}",
-            "state": location_info["state"],
-            "county": location_info["county"],
-            "city": location_info["city"],
-            "rating": rating,
-            "score": score,
-            "review": text[:500],  # Truncate if too long
-            "date": row_dict.get("created_at", datetime.now().isoformat()).split("T")[0],
-            "category": category,
-            "verified": False,  # Social media posts are not verified purchases
-            "source": "Twitter"
-        }
-        
-        feedbacks.append(feedback)
-        mark_processed_twitter(tweet_id)
-    
-    conn.close()
-    return feedbacks
+def extract_location(text: str, username: str = "") -> Dict[str, str]:
+    """Extract or infer location from text/username"""
+    state, city, county = locate(text)
+    return {"state": state, "city": city, "county": county}
 
-def process_instagram_data() -> List[Dict]:
-    """Process Instagram data and convert to feedback format"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT * FROM instagram WHERE processed = 0")
-    rows = c.fetchall()
-    
-    columns = [description[0] for description in c.description]
-    feedbacks = []
-    
-    for row in rows:
-        row_dict = dict(zip(columns, row))
-        item_id = row_dict["id"]
-        text = row_dict.get("text", "")
-        
-        if not text or len(text) < 10:
-            mark_processed_instagram(item_id)
-            continue
-        
-        sentiment = analyze_sentiment(text)
-        rating = sentiment_to_rating(sentiment["compound"])
-        score = round(rating * 20)
-        
-        location_info = extract_location(text, row_dict.get("username", ""))
-        category = categorize_text(text)
-        
-        feedback = {
-            "id": f"instagram-{item_id}",
-            "customerName": f"{row_dict.get('username', 'User')}.",
-            "location": f"{location_info['city']}, {location_info['state'][:2].upper()}",
-            "state": location_info["state"],
-            "county": location_info["county"],
-            "city": location_info["city"],
-            "rating": rating,
-            "score": score,
-            "review": text[:500],
-            "date": row_dict.get("created_at", datetime.now().isoformat()).split("T")[0],
-            "category": category,
-            "verified": False,
-            "source": "Instagram"
-        }
-        
-        feedbacks.append(feedback)
-        mark_processed_instagram(item_id)
-    
-    conn.close()
-    return feedbacks
+def _mark_processed(conn: sqlite3.Connection, table: str, ids: List[str]):
+    """Mark a chunk of rows as processed in one transaction"""
+    conn.executemany(f"UPDATE {table} SET processed = 1 WHERE id = ?", [(i,) for i in ids])
+    metrics.commit(conn, "mark_processed")
 
-def process_facebook_data() -> List[Dict]:
-    """Process Facebook data and convert to feedback format"""
+def _process_table(table: str, text_column: str, name_column: str, date_column: str,
+                   id_prefix: str, source: str, dedupe: Optional[NearDuplicateIndex] = None,
+                   category_for: Optional[Callable] = None) -> List[Feedback]:
+    """Convert a table's unprocessed rows to Feedback records, chunk by chunk"""
     conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # Process posts
-    c.execute("SELECT * FROM facebook_posts WHERE processed = 0")
-    post_rows = c.fetchall()
-    post_columns = [description[0] for description in c.description]
-    
-    # Process comments
-    c.execute("SELECT * FROM facebook_comments WHERE processed = 0")
-    comment_rows = c.fetchall()
-    comment_columns = [description[0] for description in c.description]
-    
+    conn.row_factory = sqlite3.Row
     feedbacks = []
-    
-    # Process posts
-    for row in post_rows:
-        row_dict = dict(zip(post_columns, row))
-        post_id = row_dict["id"]
-        text = row_dict.get("message", "")
+    last_rowid = 0
+    
+    while True:
+        start = perf_counter()
+        rows = conn.execute(f"""SELECT rowid, * FROM {table} WHERE processed = 0 AND rowid > ?
+            ORDER BY rowid LIMIT ?""", (last_rowid, BATCH_SIZE)).fetchall()
+        _record_stage("select", start, len(rows))
+        if not rows:
+            break
+        last_rowid = rows[-1]["rowid"]
         
-        if not text or len(text) < 10:
-            mark_processed_facebook(post_id, "facebook_posts")
-            continue
+        for row in rows:
+            text = row[text_column]
+            
+            if not text or len(text) < 10:  # Skip very short posts
+                continue
+            
+            feedback_id = f"{id_prefix}{row['id']}"
+            
+            # Collapse near-duplicates (bots, copy-paste) onto the first copy seen
+            if dedupe:
+                start = perf_counter()
+                duplicate = dedupe.check(feedback_id, text)
+                _record_stage("dedupe", start)
+                if duplicate:
+                    continue
+            
+            # Analyze sentiment
+            start = perf_counter()
+            sentiment = analyze_sentiment(text)
+            rating = sentiment_to_rating(sentiment["compound"])
+            _record_stage("sentiment", start)
+            
+            start = perf_counter()
+            state, city, county = locate(text)
+            _record_stage("locate", start)
+            
+            start = perf_counter()
+            category = (category_for and category_for(row)) or categorize_text(text)
+            _record_stage("categorize", start)
+            date = (row[date_column] or datetime.now().isoformat()).split("T")[0]
+            
+            feedbacks.append(Feedback(feedback_id, row[name_column], state, county, city,
+                                      rating, round(rating * 20), text[:500], date, category, source))
         
-        sentiment = analyze_sentiment(text)
-        rating = sentiment_to_rating(sentiment["compound"])
-        score = round(rating * 20)
-        
-        location_info = extract_location(text, row_dict.get("from_name", ""))
-        category = categorize_text(text)
-        
-        feedback = {
-            "id": f"facebook-post-{post_id}",
-            "customerName": f"{row_dict.get('from_name', 'User')}.",
-            "location": f"{location_info['city']}, {location_info['state'][:2].upper()}",
-            "state": location_info["state"],
-            "county": location_info["county"],
-            "city": location_info["city"],
-            "rating": rating,
-            "score": score,
-            "review": text[:500],
-            "date": row_dict.get("created_time", datetime.now().isoformat()).split("T")[0],
-            "category": category,
-            "verified": False,
-            "source": "Facebook"
-        }
-        
-        feedbacks.append(feedback)
-        mark_processed_facebook(post_id, "facebook_posts")
-    
-    # Process comments
-    for row in comment_rows:
-        row_dict = dict(zip(comment_columns, row))
-        comment_id = row_dict["id"]
-        text = row_dict.get("message", "")
-        
-        if not text or len(text) < 10:
-            mark_processed_facebook(comment_id, "facebook_comments")
-            continue
-        
-        sentiment = analyze_sentiment(text)
-        rating = sentiment_to_rating(sentiment["compound"])
-        score = round(rating * 20)
-        
-        location_info = extract_location(text, row_dict.get("from_name", ""))
-        category = categorize_text(text)
-        
-        feedback = {
-            "id": f"facebook-comment-{comment_id}",
-            "customerName": f"{row_dict.get('from_name', 'User')}.",
-            "location": f"{location_info['city']}, {location_info['state'][:2].upper()}",
-            "state": location_info["state"],
-            "county": location_info["county"],
-            "city": location_info["city"],
-            "rating": rating,
-            "score": score,
-            "review": text[:500],
-            "date": row_dict.get("created_time", datetime.now().isoformat()).split("T")[0],
-            "category": category,
-            "verified": False,
-            "source": "Facebook"
-        }
-        
-        feedbacks.append(feedback)
-        mark_processed_facebook(comment_id, "facebook_comments")
+        start = perf_counter()
+        # Signatures first: a crash in between only re-checks the chunk, which is idempotent
+        if dedupe:
+            dedupe.commit()
+        _mark_processed(conn, table, [row["id"] for row in rows])
+        _record_stage("mark", start, len(rows))
     
     conn.close()
     return feedbacks
 
-def mark_processed_twitter(tweet_id: str):
-    """Mark Twitter tweet as processed"""
+def process_twitter_data(dedupe: Optional[NearDuplicateIndex] = None) -> List[Feedback]:
+    """Process Twitter data and convert to feedback format"""
+    # Query sets can route their tweets to a fixed category
+    query_categories = {q["name"]: q.get("category") for q in twitter_fetch.load_query_sets()}
     conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("UPDATE twitter SET processed = 1 WHERE id = ?", (tweet_id,))
-    conn.commit()
+    has_query = "query" in [r[1] for r in conn.execute("PRAGMA table_info(twitter)")]
     conn.close()
+    category_for = (lambda row: query_categories.get(row["query"])) if has_query else None
+    return _process_table("twitter", "text", "author_username", "created_at", "twitter-", "Twitter",
+                          dedupe, category_for)
 
-def mark_processed_instagram(item_id: str):
-    """Mark Instagram item as processed"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("UPDATE instagram SET processed = 1 WHERE id = ?", (item_id,))
-    conn.commit()
-    conn.close()
+def process_instagram_data(dedupe: Optional[NearDuplicateIndex] = None) -> List[Feedback]:
+    """Process Instagram data and convert to feedback format"""
+    return _process_table("instagram", "text", "username", "created_at", "instagram-", "Instagram", dedupe)
 
-def mark_processed_facebook(item_id: str, table: str):
-    """Mark Facebook item as processed"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute(f"UPDATE {table} SET processed = 1 WHERE id = ?", (item_id,))
-    conn.commit()
-    conn.close()
+def process_facebook_data(dedupe: Optional[NearDuplicateIndex] = None) -> List[Feedback]:
+    """Process Facebook data and convert to feedback format"""
+    feedbacks = _process_table("facebook_posts", "message", "from_name", "created_time",
+                               "facebook-post-", "Facebook", dedupe)
+    feedbacks.extend(_process_table("facebook_comments", "message", "from_name", "created_time",
+                                    "facebook-comment-", "Facebook", dedupe))
+    return feedbacks
 
-def merge_with_existing_data(new_feedbacks: List[Dict]) -> List[Dict]:
-    """Merge new feedbacks with existing data"""
-    existing_feedbacks = []
-    
-    # Load existing data if it exists
-    if os.path.exists(OUTPUT_PATH):
-        try:
-            with open(OUTPUT_PATH, 'r') as f:
-                data = json.load(f)
-                if isinstance(data, dict) and "entries" in data:
-                    existing_feedbacks = data["entries"]
-                elif isinstance(data, list):
-                    existing_feedbacks = data
-        except Exception as e:
-            print(f"Error loading existing data: {e}")
+def select_new_entries(new_feedbacks: List[Feedback],
+                       duplicate_counts: Optional[Dict[str, int]] = None,
+                       published: Optional[PublishedIndex] = None) -> List[Feedback]:
+    """New feedbacks that are not published yet, with refreshed near-duplicate counts.
+
+    IDs are checked against the published-ID index, so the cost depends on the
+    size of the batch rather than on everything published so far. The index is
+    first re-read from the output file if something else wrote it since.
+    """
+    index = published or PublishedIndex(DB_PATH, OUTPUT_PATH)
+    if not index.in_sync():
+        print(f"Rebuilt published-ID index: {index.rebuild()} entries")
+    already = index.published([fb["id"] for fb in new_feedbacks])
+    if published is None:
+        index.close()
     
-    # Merge and deduplicate by ID
-    all_feedbacks = existing_feedbacks + new_feedbacks
     seen_ids = set()
     unique_feedbacks = []
     
-    for fb in all_feedbacks:
-        if fb["id"] not in seen_ids:
+    for fb in new_feedbacks:
+        if fb["id"] not in already and fb["id"] not in seen_ids:
             seen_ids.add(fb["id"])
+            if duplicate_counts and fb["id"] in duplicate_counts:
+                fb["duplicateCount"] = duplicate_counts[fb["id"]]
             unique_feedbacks.append(fb)
     
     return unique_feedbacks
 
-def save_feedbacks(feedbacks: List[Dict]):
-    """Save feedbacks to JSON file in API format"""
-    os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
+def publish_feedbacks(new_entries: List[Feedback], published: PublishedIndex,
+                      duplicate_counts: Optional[Dict[str, int]] = None) -> int:
+    """Add merged entries to the output file; returns the published total.
+
+    New entries are appended to the existing file, and updated duplicateCounts of
+    entries from earlier runs are spliced in while it is copied, so nothing already
+    published is parsed or re-encoded. The file is only written from scratch when
+    it does not exist yet or does not have the expected layout.
+    """
+    new_ids = [fb["id"] for fb in new_entries]
+    patches = {}
+    if duplicate_counts:
+        batch_ids = set(new_ids)
+        earlier = published.published([i for i in duplicate_counts if i not in batch_ids])
+        patches = {i: duplicate_counts[i] for i in earlier}
     
-    output_data = {
-        "success": True,
-        "entries": feedbacks,
-        "total": len(feedbacks),
-        "lastUpdated": datetime.now().isoformat()
-    }
+    if os.path.exists(OUTPUT_PATH):
+        try:
+            total = serializers.append_entries(OUTPUT_PATH, new_entries, duplicate_counts=patches)
+            published.add(new_ids)
+            published.record_output()
+            print(f"Appended {len(new_entries)} feedback entries to {OUTPUT_PATH} "
+                  f"({len(patches)} duplicate counts updated)")
+            return total
+        except ValueError as e:
+            print(f"Could not append to existing data, rewriting it: {e}")
     
-    with open(OUTPUT_PATH, 'w') as f:
-        json.dump(output_data, f, indent=2)
+    existing_feedbacks = []
+    if os.path.exists(OUTPUT_PATH):
+        try:
+            existing_feedbacks = serializers.load_entries(OUTPUT_PATH)
+        except Exception as e:
+            print(f"Error loading existing data: {e}")
+    for fb in existing_feedbacks:
+        if fb["id"] in patches:
+            fb["duplicateCount"] = patches[fb["id"]]
+    existing_ids = {fb["id"] for fb in existing_feedbacks}
+    all_feedbacks = existing_feedbacks + [fb for fb in new_entries if fb["id"] not in existing_ids]
+    
+    save_feedbacks(all_feedbacks)
+    published.reset([fb["id"] for fb in all_feedbacks])
+    published.record_output()
+    return len(all_feedbacks)
+
+def save_feedbacks(feedbacks: List, pretty: Optional[bool] = None):
+    """Save feedbacks (entry dicts or Feedback records) to JSON file in API format"""
+    # Streamed to a temp file and swapped in atomically; compact unless pretty
+    serializers.write_entries(OUTPUT_PATH, feedbacks, pretty)
     
     print(f"Saved {len(feedbacks)} feedback entries to {OUTPUT_PATH}")
 
@@ -395,32 +335,70 @@ def run_processing():
     
     # Process each platform
     all_feedbacks = []
+    dedupe = NearDuplicateIndex(DB_PATH)
     
     print("Processing Twitter data...")
-    twitter_feedbacks = process_twitter_data()
+    with profiling.stage("process_twitter"):
+        twitter_feedbacks = process_twitter_data(dedupe)
     all_feedbacks.extend(twitter_feedbacks)
     print(f"  Processed {len(twitter_feedbacks)} Twitter entries")
     
     print("Processing Instagram data...")
-    instagram_feedbacks = process_instagram_data()
+    with profiling.stage("process_instagram"):
+        instagram_feedbacks = process_instagram_data(dedupe)
     all_feedbacks.extend(instagram_feedbacks)
     print(f"  Processed {len(instagram_feedbacks)} Instagram entries")
     
     print("Processing Facebook data...")
-    facebook_feedbacks = process_facebook_data()
+    with profiling.stage("process_facebook"):
+        facebook_feedbacks = process_facebook_data(dedupe)
     all_feedbacks.extend(facebook_feedbacks)
     print(f"  Processed {len(facebook_feedbacks)} Facebook entries")
     
+    dedupe.close()
+    print(f"Suppressed {dedupe.suppressed} near-duplicate posts")
+    
     # Merge with existing data
     print("Merging with existing data...")
-    merged_feedbacks = merge_with_existing_data(all_feedbacks)
+    published = PublishedIndex(DB_PATH, OUTPUT_PATH)
+    start = perf_counter()
+    with profiling.stage("merge"):
+        new_entries = select_new_entries(all_feedbacks, dedupe.duplicate_counts, published)
+    _record_stage("merge", start, len(all_feedbacks))
     
     # Save
-    save_feedbacks(merged_feedbacks)
-    
-    print(f"Total feedback entries: {len(merged_feedbacks)}")
+    start = perf_counter()
+    with profiling.stage("save"):
+        total = publish_feedbacks(new_entries, published, dedupe.duplicate_counts)
+    _record_stage("save", start, len(new_entries))
+    published.close()
+    
+    # Keep the full-text index in step with the published entries
+    start = perf_counter()
+    with profiling.stage("index"):
+        indexed = search_index.index_feedbacks(new_entries, DB_PATH)
+    _record_stage("index", start, len(new_entries))
+    print(f"Indexed {indexed} entries for search")
+    
+    # Append the new entries to the columnar analytics snapshot, and refresh the
+    # duplicate counts of clusters that grew from entries appended earlier
+    start = perf_counter()
+    with profiling.stage("snapshot"):
+        snapshot_dir = os.path.join(os.path.dirname(OUTPUT_PATH), "columnar")
+        snapshot_rows = columnar_export.append_entries(new_entries, snapshot_dir)
+        new_ids = {fb["id"] for fb in new_entries}
+        columnar_export.update_duplicate_counts(
+            {i: n for i, n in dedupe.duplicate_counts.items() if i not in new_ids}, snapshot_dir)
+    _record_stage("snapshot", start, len(new_entries))
+    print(f"Columnar snapshot: {snapshot_rows} rows")
+    
+    print(f"Total feedback entries: {total}")
     print("Processing complete!")
 
 if __name__ == "__main__":
-    run_processing()
+    parser = argparse.ArgumentParser(description="Convert fetched posts to feedback entries")
+    parser.add_argument("--profile", action="store_true", help="Write cProfile/tracemalloc reports per stage")
+    args = parser.parse_args()
+    with profiling.cycle("processing", force=args.profile):
+        run_processing()
 
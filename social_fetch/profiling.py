@@ -0,0 +1,213 @@
+"""
+On-demand profiling of fetch and processing stages
+A sampled cycle wraps each stage in cProfile and tracemalloc, and writes a
+.pstats file and a top-allocations report per stage into a timestamped
+directory. Cycles that are not sampled only pay for a counter check
+"""
+import argparse
+import cProfile
+import functools
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+PROFILE_DIR = os.getenv("SOCIAL_PROFILE_DIR", os.path.join(os.path.dirname(__file__), "..", "profiles"))
+# Profile one cycle in every N (0 = only when asked for with --profile)
+PROFILE_EVERY = int(os.getenv("SOCIAL_PROFILE_EVERY", "0"))
+# Allocation sites listed per stage, and traceback depth kept by tracemalloc
+PROFILE_TOP = int(os.getenv("SOCIAL_PROFILE_TOP", "25"))
+PROFILE_FRAMES = int(os.getenv("SOCIAL_PROFILE_FRAMES", "1"))
+# Set to 0 to skip tracemalloc (it slows allocation-heavy stages noticeably)
+PROFILE_MEMORY = os.getenv("SOCIAL_PROFILE_MEMORY", "1").lower() not in ("0", "false", "no")
+
+# Allocations made by the import machinery and the profilers themselves are noise here
+_TRACE_FILTERS = [
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, cProfile.__file__),
+]
+
+class Session:
+    """One profiled cycle: a directory of per-stage profiles and a summary"""
+
+    def __init__(self, label: str, directory: Optional[str] = None, memory: bool = PROFILE_MEMORY,
+                 top: int = PROFILE_TOP, frames: int = PROFILE_FRAMES):
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.directory = os.path.abspath(os.path.join(directory or PROFILE_DIR, f"{stamp}-{label}"))
+        self.label = label
+        self.memory = memory
+        self.top = top
+        self.frames = frames
+        self.stages: List[Dict] = []
+        self._active = None
+        self._workers: List[cProfile.Profile] = []
+        self._workers_lock = threading.Lock()
+        self._started_tracing = False
+        self._start = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+        self._start = time.perf_counter()
+
+    def stop(self) -> str:
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        summary = {"label": self.label, "seconds": round(time.perf_counter() - self._start, 3),
+                   "memory": self.memory, "stages": self.stages}
+        with open(os.path.join(self.directory, "summary.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+        return self.directory
+
+    @contextmanager
+    def stage(self, name: str):
+        # cProfile only traces the calling thread: stages are entered from the main
+        # thread, and pool workers wrapped in threaded() bring their own profilers
+        if self._active is not None or threading.current_thread() is not threading.main_thread():
+            yield
+            return
+        self._active = name
+        prefix = os.path.join(self.directory, f"{len(self.stages) + 1:02d}-{name}")
+        before = None
+        if self.memory and tracemalloc.is_tracing():
+            before = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+            tracemalloc.reset_peak()
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            self._active = None
+            with self._workers_lock:
+                workers, self._workers = self._workers, []
+            stats = pstats.Stats(profiler)
+            if workers:
+                stats.add(*workers)
+            stats.dump_stats(prefix + ".pstats")
+            record = {"stage": name, "seconds": round(elapsed, 4), "pstats": os.path.basename(prefix + ".pstats"),
+                      "worker_calls": len(workers)}
+            if before is not None:
+                record.update(self._write_allocations(name, prefix + ".alloc.txt", before, elapsed))
+            self.stages.append(record)
+
+    def _write_allocations(self, name: str, path: str, before, elapsed: float) -> Dict:
+        """Top allocation sites by growth during the stage"""
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+        diff = after.compare_to(before, "traceback" if self.frames > 1 else "lineno")
+        net = sum(stat.size_diff for stat in diff)
+        with open(path, "w") as f:
+            f.write(f"stage: {name}\nseconds: {elapsed:.4f}\n")
+            f.write(f"net allocated: {net / 1024:.1f} KiB\npeak traced: {peak / 1024:.1f} KiB\n\n")
+            for stat in diff[:self.top]:
+                f.write(f"{stat}\n")
+                if self.frames > 1:
+                    for line in stat.traceback.format():
+                        f.write(f"    {line}\n")
+        return {"net_kib": round(net / 1024, 1), "peak_kib": round(peak / 1024, 1),
+                "allocations": os.path.basename(path)}
+
+_session: Optional[Session] = None
+_cycles = 0
+
+def should_sample(every: Optional[int] = None) -> bool:
+    """Count a cycle; True for one cycle in every `every` (the first one included)"""
+    global _cycles
+    every = PROFILE_EVERY if every is None else every
+    sampled = every > 0 and _cycles % every == 0
+    _cycles += 1
+    return sampled
+
+@contextmanager
+def cycle(label: str, force: bool = False, every: Optional[int] = None, directory: Optional[str] = None):
+    """Profile the stages run inside this block when forced or when the cycle is sampled.
+
+    Yields the Session, or None when this cycle is not profiled.
+    """
+    global _session
+    if _session is not None or not (should_sample(every) or force):
+        yield None
+        return
+    session = Session(label, directory)
+    session.start()
+    _session = session
+    try:
+        yield session
+    finally:
+        _session = None
+        print(f"Profile written to {session.stop()}")
+
+@contextmanager
+def stage(name: str):
+    """Profile a stage if a cycle is being profiled; a no-op otherwise"""
+    if _session is None:
+        yield
+        return
+    with _session.stage(name):
+        yield
+
+def threaded(func):
+    """Wrap a pool worker so its calls are merged into the stage profiled on the main thread"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        session = _session
+        if session is None or session._active is None or threading.current_thread() is threading.main_thread():
+            return func(*args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ allows one profiler at a time, and the stage's already sees every thread
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            with session._workers_lock:
+                session._workers.append(profiler)
+    return wrapper
+
+def report(directory: str, limit: int = 15):
+    """Print each stage's slowest functions (cumulative) and top allocations"""
+    with open(os.path.join(directory, "summary.json")) as f:
+        summary = json.load(f)
+    print(f"{summary['label']}: {summary['seconds']}s")
+    for record in summary["stages"]:
+        print(f"\n=== {record['stage']} ({record['seconds']}s"
+              + (f", net {record['net_kib']} KiB, peak {record['peak_kib']} KiB)" if "net_kib" in record else ")"))
+        pstats.Stats(os.path.join(directory, record["pstats"])).sort_stats("cumulative").print_stats(limit)
+        if "allocations" in record:
+            with open(os.path.join(directory, record["allocations"])) as f:
+                lines = f.read().splitlines()
+            print("\n".join(lines[5:5 + limit]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a profile directory")
+    parser.add_argument("directory", nargs="?", help="Profile directory (default: the latest in SOCIAL_PROFILE_DIR)")
+    parser.add_argument("--limit", type=int, default=15, help="Functions and allocation sites per stage")
+    args = parser.parse_args(argv)
+
+    directory = args.directory
+    if not directory:
+        runs = sorted(os.listdir(PROFILE_DIR)) if os.path.isdir(PROFILE_DIR) else []
+        if not runs:
+            print(f"No profiles in {PROFILE_DIR}")
+            return
+        directory = os.path.join(PROFILE_DIR, runs[-1])
+    report(directory, args.limit)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Index of feedback IDs already published to api/entries-all.json
+A WITHOUT ROWID table in social.db answers "is this ID published?" per new
+batch, so merging no longer loads and rescans the whole history. An optional
+in-memory Bloom filter in front of it skips the lookup for IDs never seen
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import sys
+from typing import Iterable, List, Optional, Set
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from social_fetch import metrics, serializers
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "social.db")
+OUTPUT_PATH = os.path.join(os.path.dirname(__file__), "..", "api", "entries-all.json")
+# Bloom filter in front of the table (built once per process from the table)
+BLOOM_ENABLED = os.getenv("SOCIAL_PUBLISHED_BLOOM", "").lower() in ("1", "true", "yes")
+BLOOM_ERROR_RATE = float(os.getenv("SOCIAL_PUBLISHED_BLOOM_ERROR", "0.01"))
+# SQLite's default limit on host parameters is 999 before 3.32
+LOOKUP_CHUNK = 900
+
+def init_db(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS published_ids (
+        id TEXT PRIMARY KEY
+    ) WITHOUT ROWID""")
+    # Size and mtime of the output file as last written, to detect outside edits
+    conn.execute("""CREATE TABLE IF NOT EXISTS published_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )""")
+    conn.commit()
+
+class BloomFilter:
+    """Fixed-size Bloom filter; k bit positions per key from one blake2b digest"""
+
+    def __init__(self, capacity: int, error_rate: float = BLOOM_ERROR_RATE):
+        self.capacity = max(capacity, 1)
+        self.bits = max(64, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / self.capacity * math.log(2)))
+        self.array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        # Double hashing (Kirsch-Mitzenmacher)
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.array[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+# Bloom filters kept across runs of a long-lived process, keyed by (db, output),
+# with the output stat they were built against so outside writes invalidate them
+_blooms = {}
+
+class PublishedIndex:
+    """Published feedback IDs for one output file"""
+
+    def __init__(self, db_path: Optional[str] = None, output_path: Optional[str] = None,
+                 bloom: bool = BLOOM_ENABLED):
+        self.db_path = os.path.abspath(db_path or DB_PATH)
+        self.conn = sqlite3.connect(self.db_path, timeout=30)
+        self.output_path = os.path.abspath(output_path or OUTPUT_PATH)
+        self.bloom_enabled = bloom
+        self.bloom: Optional[BloomFilter] = None
+        init_db(self.conn)
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM published_ids").fetchone()[0]
+
+    def _recorded(self) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM published_meta WHERE key = ?", (self.output_path,)).fetchone()
+        return row[0] if row else None
+
+    def _bloom(self) -> Optional[BloomFilter]:
+        """The filter, (re)built from the table when missing, stale or over capacity"""
+        if not self.bloom_enabled:
+            return None
+        if self.bloom is None:
+            recorded, bloom = _blooms.get((self.db_path, self.output_path), (None, None))
+            if bloom is not None and recorded == self._recorded():
+                self.bloom = bloom
+        if self.bloom is None or self.bloom.count > self.bloom.capacity:
+            self.bloom = BloomFilter(max(self.count() * 2, 100_000))
+            for (feedback_id,) in self.conn.execute("SELECT id FROM published_ids"):
+                self.bloom.add(feedback_id)
+        return self.bloom
+
+    def published(self, ids: Iterable[str]) -> Set[str]:
+        """The subset of `ids` that is already published"""
+        bloom = self._bloom()
+        candidates = [i for i in ids if i in bloom] if bloom is not None else list(ids)
+        found = set()
+        for i in range(0, len(candidates), LOOKUP_CHUNK):
+            chunk = candidates[i:i + LOOKUP_CHUNK]
+            rows = self.conn.execute(f"SELECT id FROM published_ids WHERE id IN ({','.join('?' * len(chunk))})",
+                                     chunk)
+            found.update(row[0] for row in rows)
+        return found
+
+    def add(self, ids: List[str]):
+        self.conn.executemany("INSERT OR IGNORE INTO published_ids (id) VALUES (?)", [(i,) for i in ids])
+        if self.bloom is not None:
+            for feedback_id in ids:
+                self.bloom.add(feedback_id)
+
+    def reset(self, ids: List[str]):
+        """Replace the index with exactly these IDs"""
+        self.conn.execute("DELETE FROM published_ids")
+        self.bloom = None
+        self.add(ids)
+
+    def _output_stat(self):
+        try:
+            st = os.stat(self.output_path)
+        except FileNotFoundError:
+            return None
+        return [st.st_size, st.st_mtime_ns]
+
+    def in_sync(self) -> bool:
+        """Whether the output file is the one this index last recorded"""
+        recorded = self._recorded()
+        stat = self._output_stat()
+        if recorded is None:
+            # Never recorded: in sync only if there is nothing published yet
+            return stat is None and self.count() == 0
+        return json.loads(recorded) == stat
+
+    def record_output(self):
+        """Remember the output file as just written, and commit"""
+        recorded = json.dumps(self._output_stat())
+        self.conn.execute("INSERT OR REPLACE INTO published_meta (key, value) VALUES (?, ?)",
+                          (self.output_path, recorded))
+        metrics.commit(self.conn, "published_ids")
+        if self.bloom is not None:
+            _blooms[(self.db_path, self.output_path)] = (recorded, self.bloom)
+
+    def rebuild(self) -> int:
+        """Re-read every published ID from the output file (first run, or after outside edits)"""
+        entries = serializers.load_entries(self.output_path) if os.path.exists(self.output_path) else []
+        self.reset([e["id"] for e in entries])
+        self.record_output()
+        return len(entries)
+
+    def close(self):
+        self.conn.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Published feedback ID index")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild from api/entries-all.json")
+    parser.add_argument("--check", nargs="+", metavar="ID", help="Report whether these IDs are published")
+    args = parser.parse_args(argv)
+
+    index = PublishedIndex()
+    if args.rebuild:
+        print(f"Indexed {index.rebuild()} published IDs")
+    if args.check:
+        found = index.published(args.check)
+        for feedback_id in args.check:
+            print(f"{feedback_id}: {'published' if feedback_id in found else 'new'}")
+    print(f"{index.count()} IDs, {'in sync' if index.in_sync() else 'stale'} with {index.output_path}")
+    index.close()
+
+if __name__ == "__main__":
+    main()
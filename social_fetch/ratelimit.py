@@ -0,0 +1,89 @@
+"""
+Thread-safe request budget shared by concurrent fetch workers
+"""
+import os
+import sys
+import threading
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from social_fetch import metrics
+
+class RateLimiter:
+    """Token bucket allowing `requests` calls per `period` seconds.
+
+    All threads draw from the same bucket, so concurrent windows/queries
+    together never exceed the platform quota. When tokens are scarce, callers
+    with a higher `priority` are served before lower ones. A 429 response can
+    pause the whole bucket until the reported reset time. Time spent waiting is
+    counted in social_sleep_seconds_total{reason="<name>_rate_limit"}.
+    """
+
+    def __init__(self, requests, period, name="default"):
+        self.name = name
+        self.capacity = float(requests)
+        self.rate = requests / float(period)
+        self.tokens = float(requests)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.waiting = {}
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, priority=0):
+        """Block until a request may be made; returns the seconds spent waiting"""
+        waited = 0.0
+        with self.lock:
+            self.waiting[priority] = self.waiting.get(priority, 0) + 1
+        try:
+            while True:
+                with self.lock:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if now < self.paused_until:
+                        delay = self.paused_until - now
+                    elif self.tokens >= 1 and priority >= max(self.waiting):
+                        self.tokens -= 1
+                        return waited
+                    elif self.tokens >= 1:
+                        # A higher-priority caller is waiting for this token
+                        delay = 0.05
+                    else:
+                        delay = (1 - self.tokens) / self.rate
+                time.sleep(delay)
+                waited += delay
+        finally:
+            with self.lock:
+                self.waiting[priority] -= 1
+                if not self.waiting[priority]:
+                    del self.waiting[priority]
+            metrics.record_sleep(f"{self.name}_rate_limit", waited)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for `seconds` (e.g. after a 429)"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+def retry_after(response, default=60):
+    """Seconds to wait after a 429, from Retry-After or x-rate-limit-reset headers"""
+    if response.headers.get("Retry-After"):
+        try:
+            return max(1.0, float(response.headers["Retry-After"]))
+        except ValueError:
+            pass
+    reset = response.headers.get("x-rate-limit-reset")
+    if reset:
+        try:
+            return max(1.0, float(reset) - time.time())
+        except ValueError:
+            pass
+    return default
+
+# Facebook and Instagram use the same page token, so they share one Graph budget (200 calls / hour)
+GRAPH_LIMITER = RateLimiter(int(os.getenv("GRAPH_RATE_LIMIT", "200")), 60 * 60, name="graph")
@@ -0,0 +1,308 @@
+"""
+Compact storage for the raw API payloads kept in each table's `raw` column
+Payload fields that already have their own column are stripped, and the rest
+is zlib-compressed (optionally with a preset dictionary trained on our payloads)
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import struct
+import time
+import zlib
+from collections import Counter
+from typing import Callable, Dict, Optional
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "social.db")
+
+# "json" keeps the original json.dumps text, "compressed" writes compact blobs
+STORAGE_MODE = os.getenv("SOCIAL_RAW_STORAGE", "json")
+COMPRESSION_LEVEL = 6
+DICTIONARY_SIZE = 16 * 1024
+# Seconds before a writer checks again for a newer (rotated) dictionary
+DICTIONARY_RECHECK = 60
+
+# Payload field -> column holding the same value, per table
+FIELD_COLUMNS = {
+    "twitter": {"id": "id", "text": "text", "author_id": "author_id", "created_at": "created_at"},
+    "instagram": {"text": "text", "caption": "text", "username": "username",
+                  "timestamp": "created_at", "media_url": "media_url"},
+    "facebook_posts": {"id": "id", "message": "message", "created_time": "created_time"},
+    "facebook_comments": {"id": "id", "message": "message", "created_time": "created_time",
+                          "like_count": "like_count"},
+}
+TABLES = list(FIELD_COLUMNS)
+
+# Blob headers: plain zlib, or zlib with preset dictionary (followed by its ID)
+ZLIB = b"\x01"
+ZLIB_DICT = b"\x02"
+STRIPPED_KEY = "~"
+
+# Dictionaries never change once written, so found ones are cached by ID;
+# the newest per table is looked up again every DICTIONARY_RECHECK seconds
+_dictionaries = {}
+_newest = {}
+
+def init_db(conn):
+    """Create the dictionary table"""
+    conn.execute("""CREATE TABLE IF NOT EXISTS raw_dictionaries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tbl TEXT,
+        data BLOB,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )""")
+    conn.commit()
+
+def _query_dictionary(db_path, table, dict_id=None):
+    # Read-only: archives are opened with mode=ro, and a read must never create the table
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    except sqlite3.OperationalError:
+        return None
+    try:
+        if dict_id is None:
+            row = conn.execute("SELECT id, data FROM raw_dictionaries WHERE tbl = ? ORDER BY id DESC LIMIT 1",
+                               (table,)).fetchone()
+        else:
+            row = conn.execute("SELECT id, data FROM raw_dictionaries WHERE id = ?", (dict_id,)).fetchone()
+    except sqlite3.OperationalError as e:
+        if "no such table" not in str(e):
+            raise
+        row = None
+    finally:
+        conn.close()
+    return (row[0], bytes(row[1])) if row else None
+
+def _load_dictionary(db_path, table, dict_id=None):
+    """Return (id, data) of a table's dictionary: the given ID or the newest one"""
+    db_path = os.path.abspath(db_path)
+    if dict_id is None:
+        checked, dictionary = _newest.get((db_path, table), (None, None))
+        if checked is None or time.monotonic() - checked > DICTIONARY_RECHECK:
+            dictionary = _query_dictionary(db_path, table)
+            _newest[(db_path, table)] = (time.monotonic(), dictionary)
+        return dictionary
+    key = (db_path, dict_id)
+    if key not in _dictionaries:
+        dictionary = _query_dictionary(db_path, table, dict_id)
+        if dictionary is None:
+            return None
+        _dictionaries[key] = dictionary
+    return _dictionaries[key]
+
+def _dictionary_for(db_path, table, dict_id):
+    """A blob's dictionary, from `db_path` or else the hot database it was written in"""
+    dictionary = _load_dictionary(db_path, table, dict_id)
+    if dictionary is None and os.path.abspath(db_path) != os.path.abspath(DB_PATH):
+        dictionary = _load_dictionary(DB_PATH, table, dict_id)
+    if dictionary is None:
+        raise ValueError(f"Dictionary {dict_id} for {table} not found in {db_path}")
+    return dictionary
+
+def _strip(table, obj, columns):
+    """Drop payload fields whose value is stored verbatim in a column"""
+    mapping = FIELD_COLUMNS.get(table, {})
+    stripped = [field for field, column in mapping.items()
+                if field in obj and column in columns and obj[field] == columns[column]]
+    if not stripped:
+        return obj
+    compact = {k: v for k, v in obj.items() if k not in stripped}
+    compact[STRIPPED_KEY] = stripped
+    return compact
+
+def _restore(table, obj, row):
+    stripped = obj.pop(STRIPPED_KEY, None)
+    if stripped:
+        mapping = FIELD_COLUMNS.get(table, {})
+        for field in stripped:
+            obj[field] = row[mapping[field]]
+    return obj
+
+def encode_raw(table: str, obj: Dict, columns: Dict, mode: Optional[str] = None, db_path: Optional[str] = None):
+    """Value to store in `raw` for a payload; `columns` are the row's other column values"""
+    mode = mode or STORAGE_MODE
+    if mode != "compressed":
+        return json.dumps(obj)
+
+    data = json.dumps(_strip(table, obj, columns), separators=(",", ":")).encode()
+    dictionary = _load_dictionary(db_path or DB_PATH, table)
+    if dictionary:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=dictionary[1])
+        return ZLIB_DICT + struct.pack(">I", dictionary[0]) + compressor.compress(data) + compressor.flush()
+    return ZLIB + zlib.compress(data, COMPRESSION_LEVEL)
+
+def decode_raw(table: str, value, row, db_path: Optional[str] = None) -> Optional[Dict]:
+    """Original payload from a stored `raw` value, whichever format it is in.
+
+    `row` maps column names to values (sqlite3.Row or dict) and is used to
+    restore stripped fields. Dictionaries missing from `db_path` (e.g. an
+    archive) are looked up in the hot database.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return json.loads(value)
+
+    data = decompress(bytes(value), lambda dict_id: _dictionary_for(db_path or DB_PATH, table, dict_id)[1])
+    return _restore(table, json.loads(data), row)
+
+def decompress(value: bytes, dictionary_for: Callable[[int], bytes]) -> bytes:
+    """Stored JSON of a compressed blob; `dictionary_for` maps a dictionary ID to its data"""
+    if value[:1] == ZLIB:
+        return zlib.decompress(value[1:])
+    if value[:1] == ZLIB_DICT:
+        (dict_id,) = struct.unpack(">I", value[1:5])
+        decompressor = zlib.decompressobj(zdict=dictionary_for(dict_id))
+        return decompressor.decompress(value[5:]) + decompressor.flush()
+    raise ValueError("Unknown raw payload format")
+
+def load_raw(table: str, row, db_path: Optional[str] = None) -> Optional[Dict]:
+    """Payload for a row fetched with its `raw` column"""
+    return decode_raw(table, row["raw"], row, db_path)
+
+_TOKEN_RE = re.compile(rb'"(?:[^"\\]|\\.)*"\s*:?|[\[\]{},:]|-?\d+(?:\.\d+)?|true|false|null')
+
+def train_dictionary(table: str, db_path: Optional[str] = None, sample: int = 2000,
+                     size: int = DICTIONARY_SIZE) -> int:
+    """Build a preset dictionary from a sample of a table's payloads; returns its ID"""
+    conn = sqlite3.connect(db_path or DB_PATH)
+    conn.row_factory = sqlite3.Row
+    init_db(conn)
+    rows = conn.execute(f"SELECT * FROM {table} ORDER BY RANDOM() LIMIT ?", (sample,)).fetchall()
+
+    counts = Counter()
+    for row in rows:
+        obj = decode_raw(table, row["raw"], row, db_path)
+        if obj is None:
+            continue
+        columns = {k: row[k] for k in row.keys()}
+        data = json.dumps(_strip(table, obj, columns), separators=(",", ":")).encode()
+        counts.update(set(_TOKEN_RE.findall(data)))
+
+    # Score tokens by bytes saved across the sample; zlib reaches the end of the
+    # dictionary most cheaply, so the most valuable tokens go last
+    ranked = sorted(((n * len(token), token) for token, n in counts.items() if n > 1 and len(token) > 2),
+                    reverse=True)
+    chosen = []
+    total = 0
+    for _, token in ranked:
+        if total + len(token) > size:
+            break
+        chosen.append(token)
+        total += len(token)
+    data = b"".join(reversed(chosen))
+
+    cursor = conn.execute("INSERT INTO raw_dictionaries (tbl, data) VALUES (?, ?)", (table, data))
+    conn.commit()
+    conn.close()
+    _newest.clear()
+    return cursor.lastrowid
+
+def table_stats(conn, table):
+    """Number of rows and total bytes held in a table's raw column"""
+    return conn.execute(f"SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(raw AS BLOB))), 0) FROM {table}").fetchone()
+
+def migrate(db_path: Optional[str] = None, use_dictionary: bool = True, batch_size: int = 1000,
+            vacuum: bool = True) -> Dict:
+    """Convert every JSON-text raw value to the compressed format; returns size/latency report"""
+    db_path = db_path or DB_PATH
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    file_before = os.path.getsize(db_path)
+    report = {"tables": {}}
+
+    for table in TABLES:
+        if table not in existing:
+            continue
+        rows_total, bytes_before = table_stats(conn, table)
+        if use_dictionary and rows_total and not _load_dictionary(db_path, table):
+            train_dictionary(table, db_path)
+
+        while True:
+            rows = conn.execute(f"SELECT rowid AS _rowid, * FROM {table} WHERE typeof(raw) = 'text' LIMIT ?",
+                                (batch_size,)).fetchall()
+            if not rows:
+                break
+            updates = []
+            for row in rows:
+                columns = {k: row[k] for k in row.keys()}
+                updates.append((encode_raw(table, json.loads(row["raw"]), columns, "compressed", db_path),
+                                row["_rowid"]))
+            conn.executemany(f"UPDATE {table} SET raw = ? WHERE rowid = ?", updates)
+            conn.commit()
+
+        _, bytes_after = table_stats(conn, table)
+        report["tables"][table] = {
+            "rows": rows_total,
+            "raw_bytes_before": bytes_before,
+            "raw_bytes_after": bytes_after,
+            "reduction": round(1 - bytes_after / bytes_before, 3) if bytes_before else 0.0,
+        }
+
+    conn.close()
+    if vacuum:
+        conn = sqlite3.connect(db_path)
+        conn.execute("VACUUM")
+        conn.close()
+    report["file_bytes_before"] = file_before
+    report["file_bytes_after"] = os.path.getsize(db_path)
+    report["read_overhead"] = measure_read_overhead(db_path)
+    return report
+
+def measure_read_overhead(db_path: Optional[str] = None, sample: int = 2000) -> Dict:
+    """Average microseconds to decode one stored payload vs json.loads of the plain text"""
+    conn = sqlite3.connect(db_path or DB_PATH)
+    conn.row_factory = sqlite3.Row
+    existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    result = {}
+    for table in TABLES:
+        if table not in existing:
+            continue
+        rows = conn.execute(f"SELECT * FROM {table} LIMIT ?", (sample,)).fetchall()
+        if not rows:
+            continue
+        start = time.perf_counter()
+        payloads = [decode_raw(table, row["raw"], row, db_path) for row in rows]
+        decode_time = time.perf_counter() - start
+        texts = [json.dumps(p) for p in payloads]
+        start = time.perf_counter()
+        for text in texts:
+            json.loads(text)
+        plain_time = time.perf_counter() - start
+        result[table] = {
+            "decode_us": round(decode_time / len(rows) * 1e6, 2),
+            "json_loads_us": round(plain_time / len(rows) * 1e6, 2),
+        }
+    conn.close()
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage compressed raw payload storage in social.db")
+    parser.add_argument("command", choices=["train", "migrate", "stats"])
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--no-dictionary", action="store_true", help="Plain zlib without a preset dictionary")
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        for table in TABLES:
+            try:
+                print(f"{table}: dictionary {train_dictionary(table, args.db)}")
+            except sqlite3.OperationalError as e:
+                print(f"{table}: skipped ({e})")
+    elif args.command == "migrate":
+        print(json.dumps(migrate(args.db, use_dictionary=not args.no_dictionary), indent=2))
+    else:
+        conn = sqlite3.connect(args.db)
+        for table in TABLES:
+            try:
+                rows, size = table_stats(conn, table)
+                print(f"{table}: {rows} rows, {size} raw bytes")
+            except sqlite3.OperationalError:
+                pass
+        conn.close()
+        print(json.dumps(measure_read_overhead(args.db), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Retention for social.db - moves old processed rows into monthly archive files
+Archived IDs stay in a compact table so re-fetched items are not inserted again,
+and freed pages are returned with incremental vacuum once it has been enabled
+"""
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import sys
+import zlib
+from typing import Dict, List, Optional
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from social_fetch import near_duplicates, raw_store
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "social.db")
+ARCHIVE_DIR = os.getenv("SOCIAL_ARCHIVE_DIR", os.path.join(os.path.dirname(__file__), "..", "archive"))
+RETENTION_DAYS = int(os.getenv("SOCIAL_RETENTION_DAYS", "90"))
+
+TABLES = ["twitter", "instagram", "facebook_posts", "facebook_comments"]
+
+def archive_path(month: str) -> str:
+    """Archive database file for a YYYY-MM month"""
+    return os.path.join(ARCHIVE_DIR, f"social-{month}.db")
+
+def init_db(conn):
+    """Create the archived ID set and the triggers that consult it on insert"""
+    conn.execute("""CREATE TABLE IF NOT EXISTS archived_ids (
+        tbl TEXT,
+        id TEXT,
+        archived_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (tbl, id)
+    ) WITHOUT ROWID""")
+    if "archived_at" not in _columns(conn, "archived_ids"):
+        # ALTER cannot add a CURRENT_TIMESTAMP default; IDs archived so far count from now
+        conn.execute("ALTER TABLE archived_ids ADD COLUMN archived_at DATETIME")
+        conn.execute("UPDATE archived_ids SET archived_at = CURRENT_TIMESTAMP")
+    for table in _existing_tables(conn):
+        # INSERT OR IGNORE in the fetchers then skips rows that were archived
+        conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_skip_archived
+            BEFORE INSERT ON {table}
+            WHEN EXISTS (SELECT 1 FROM archived_ids WHERE tbl = '{table}' AND id = NEW.id)
+            BEGIN SELECT RAISE(IGNORE); END""")
+    conn.commit()
+
+def _existing_tables(conn, schema="main"):
+    rows = conn.execute(f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table'").fetchall()
+    names = {r[0] for r in rows}
+    return [t for t in TABLES if t in names]
+
+def _columns(conn, table, schema="main"):
+    return [r[1] for r in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+def _ensure_archive_table(conn, table):
+    """Create the table in the attached archive with the hot table's schema"""
+    sql = conn.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?",
+                       (table,)).fetchone()[0]
+    conn.execute(re.sub(r"^CREATE TABLE (IF NOT EXISTS )?", "CREATE TABLE IF NOT EXISTS archive.", sql, count=1))
+    # Columns added to the hot table after the archive was created
+    archived = set(_columns(conn, table, "archive"))
+    for column in _columns(conn, table):
+        if column not in archived:
+            conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {column}")
+
+def ensure_incremental_vacuum(conn):
+    """Switch the database to auto_vacuum=INCREMENTAL.
+
+    The first switch rewrites the whole file with a blocking VACUUM, so this is
+    a maintenance step (`--enable-incremental-vacuum`), never run by the scheduler.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+
+def _ship_dictionaries(conn, table):
+    """Copy raw_dictionaries into the attached archive and check its blobs decode with them"""
+    row = conn.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = 'raw_dictionaries'").fetchone()
+    if not row:
+        return
+    conn.execute(re.sub(r"^CREATE TABLE (IF NOT EXISTS )?", "CREATE TABLE IF NOT EXISTS archive.", row[0], count=1))
+    conn.execute("INSERT OR IGNORE INTO archive.raw_dictionaries SELECT * FROM main.raw_dictionaries")
+    shipped = {row[0]: bytes(row[1]) for row in conn.execute("SELECT id, data FROM archive.raw_dictionaries")}
+    # One blob per dictionary is enough to show the archive can be read on its own
+    samples = conn.execute(f"""SELECT raw FROM archive.{table}
+        WHERE typeof(raw) = 'blob' AND substr(raw, 1, 1) = ? GROUP BY substr(raw, 2, 4)""", (raw_store.ZLIB_DICT,))
+    for (value,) in samples:
+        try:
+            raw_store.decompress(bytes(value), shipped.__getitem__)
+        except (KeyError, zlib.error) as e:
+            raise ValueError(f"archived {table} payload does not decode with the shipped dictionaries ({e!r})")
+
+def archive_table(conn, table, days, dry_run=False) -> Dict[str, int]:
+    """Move processed rows older than `days` into their monthly archive; returns rows per month"""
+    age_filter = f"processed = 1 AND created_timestamp < datetime('now', '-{int(days)} days')"
+    months = [r[0] for r in conn.execute(f"""SELECT DISTINCT strftime('%Y-%m', created_timestamp)
+        FROM {table} WHERE {age_filter} ORDER BY 1""")]
+    moved = {}
+
+    for month in months:
+        month_filter = f"{age_filter} AND strftime('%Y-%m', created_timestamp) = '{month}'"
+        if dry_run:
+            moved[month] = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {month_filter}").fetchone()[0]
+            continue
+
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        conn.execute("ATTACH DATABASE ? AS archive", (archive_path(month),))
+        try:
+            _ensure_archive_table(conn, table)
+            columns = ", ".join(_columns(conn, table))
+            # Both databases commit together, so a row is never lost or duplicated
+            with conn:
+                conn.execute(f"""INSERT OR IGNORE INTO archive.{table} ({columns})
+                    SELECT {columns} FROM main.{table} WHERE {month_filter}""")
+                _ship_dictionaries(conn, table)
+                conn.execute(f"""INSERT OR IGNORE INTO archived_ids (tbl, id)
+                    SELECT '{table}', id FROM main.{table} WHERE {month_filter}""")
+                moved[month] = conn.execute(f"DELETE FROM main.{table} WHERE {month_filter}").rowcount
+        except ValueError as e:
+            print(f"Kept {table} rows from {month} in place: {e}")
+        finally:
+            conn.execute("DETACH DATABASE archive")
+    return moved
+
+def run_retention(days: int = RETENTION_DAYS, dry_run: bool = False, db_path: Optional[str] = None):
+    """Archive old processed rows from every table, prune stale indexes and vacuum"""
+    db_path = db_path or DB_PATH
+    if not os.path.exists(db_path):
+        print(f"No database at {db_path}")
+        return {}
+
+    conn = sqlite3.connect(db_path, timeout=60)
+    init_db(conn)
+    report = {}
+    for table in _existing_tables(conn):
+        moved = archive_table(conn, table, days, dry_run)
+        report[table] = moved
+        for month, count in moved.items():
+            print(f"{'Would archive' if dry_run else 'Archived'} {count} {table} rows from {month}")
+
+    if not dry_run:
+        # Signatures outside the near-duplicate window are never matched again
+        for table in ("simhash_index", "simhash_duplicates"):
+            try:
+                with conn:
+                    conn.execute(f"""DELETE FROM {table}
+                        WHERE created_at < datetime('now', '-{near_duplicates.WINDOW_DAYS} days')""")
+            except sqlite3.OperationalError:
+                pass
+        # archived_ids is never pruned: Graph feeds return the latest N items of any
+        # age, so an archived post or comment can be fetched again at any time
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            # The pragma frees one page per step and execute() steps a statement without
+            # result columns only once; executescript() runs it to completion
+            conn.executescript("PRAGMA incremental_vacuum")
+            left = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            print(f"Released {free - left} free pages ({free} -> {left})")
+        elif free:
+            print(f"{free} free pages not released: run with --enable-incremental-vacuum in a maintenance window")
+    conn.close()
+    return report
+
+def list_archives() -> List[str]:
+    """Archived months available on disk (YYYY-MM), oldest first"""
+    paths = glob.glob(os.path.join(ARCHIVE_DIR, "social-*.db"))
+    return sorted(os.path.basename(p)[len("social-"):-len(".db")] for p in paths)
+
+def connect_with_archives(months: Optional[List[str]] = None, db_path: Optional[str] = None):
+    """Connection to social.db with archive months attached read-only as archive_YYYY_MM.
+
+    SQLite attaches at most 10 databases per connection by default, so pass
+    the months you need when there are more archives than that.
+    """
+    db_path = os.path.abspath(db_path or DB_PATH)
+    conn = sqlite3.connect(f"file:{db_path}", uri=True)
+    for month in months if months is not None else list_archives():
+        alias = "archive_" + month.replace("-", "_")
+        conn.execute(f"ATTACH DATABASE ? AS {alias}", (f"file:{os.path.abspath(archive_path(month))}?mode=ro",))
+    return conn
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive old processed rows out of social.db")
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS, help="Keep processed rows newer than this")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be archived")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="Switch social.db to auto_vacuum=INCREMENTAL (one blocking full VACUUM), then exit")
+    args = parser.parse_args(argv)
+    if args.enable_incremental_vacuum:
+        conn = sqlite3.connect(DB_PATH, timeout=60)
+        ensure_incremental_vacuum(conn)
+        conn.close()
+        print(f"auto_vacuum=INCREMENTAL enabled for {DB_PATH}")
+        return
+    run_retention(args.days, args.dry_run)
+
+if __name__ == "__main__":
+    main()
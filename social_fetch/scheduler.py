@@ -6,31 +6,59 @@ import time
 import schedule
 import sys
 import os
+import argparse
 
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from social_fetch import twitter_fetch, instagram_fetch, facebook_fetch, process_social_data
+from social_fetch import twitter_fetch, instagram_fetch, facebook_fetch, process_social_data, retention, metrics, profiling
+
+# With the webhook receiver running, Facebook/Instagram polling only reconciles
+# missed notifications, so it runs every few hours instead of every cycle
+WEBHOOKS_ENABLED = os.getenv("SOCIAL_WEBHOOKS_ENABLED", "").lower() in ("1", "true", "yes")
+RECONCILE_HOURS = float(os.getenv("SOCIAL_RECONCILE_HOURS", "6"))
+_last_graph_poll = 0.0
+
+# Set by --profile: profile every cycle rather than sampling
+PROFILE_ALL = False
+
+def graph_poll_due():
+    """Whether Facebook/Instagram should be polled this cycle"""
+    if not WEBHOOKS_ENABLED:
+        return True
+    return time.time() - _last_graph_poll >= RECONCILE_HOURS * 3600
 
 def fetch_all_social_data():
     """Fetch data from all social media platforms"""
+    global _last_graph_poll
     print(f"\n{'='*50}")
     print(f"Starting social media data fetch - {time.strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"{'='*50}\n")
     
     try:
-        # Fetch from each platform
-        print("Fetching Twitter data...")
-        twitter_fetch.run_once(max_pages=3)
-        
-        print("\nFetching Instagram data...")
-        instagram_fetch.run_once()
-        
-        print("\nFetching Facebook data...")
-        facebook_fetch.run_once()
-        
-        print("\nProcessing and converting data...")
-        process_social_data.run_processing()
+        # Metric deltas for the whole cycle are stored in run_summaries; one cycle in
+        # every SOCIAL_PROFILE_EVERY (or every cycle with --profile) is profiled per stage
+        with metrics.run("fetch_cycle"), profiling.cycle("fetch_cycle", force=PROFILE_ALL):
+            # Fetch from each platform
+            print("Fetching Twitter data...")
+            with metrics.timer(metrics.STEP_SECONDS, step="twitter"), profiling.stage("fetch_twitter"):
+                twitter_fetch.run_once(max_pages=3)
+            
+            if graph_poll_due():
+                print("\nFetching Instagram data...")
+                with metrics.timer(metrics.STEP_SECONDS, step="instagram"), profiling.stage("fetch_instagram"):
+                    instagram_fetch.run_once()
+                
+                print("\nFetching Facebook data...")
+                with metrics.timer(metrics.STEP_SECONDS, step="facebook"), profiling.stage("fetch_facebook"):
+                    facebook_fetch.run_once()
+                _last_graph_poll = time.time()
+            else:
+                print("\nSkipping Instagram/Facebook polling (webhooks enabled, reconciliation not due)")
+            
+            print("\nProcessing and converting data...")
+            with metrics.timer(metrics.STEP_SECONDS, step="processing"):
+                process_social_data.run_processing()
         
         print(f"\n{'='*50}")
         print("Data fetch complete!")
@@ -41,11 +69,27 @@ def fetch_all_social_data():
         import traceback
         traceback.print_exc()
 
+def run_retention():
+    """Archive old processed rows so social.db stays bounded"""
+    try:
+        with metrics.run("retention"):
+            retention.run_retention()
+    except Exception as e:
+        print(f"Error in run_retention: {e}")
+
 def run_scheduler():
     """Run the scheduler"""
+    # Per-stage processing timings feed the social_stage_* metrics
+    if metrics.stage_observer not in process_social_data.STAGE_OBSERVERS:
+        process_social_data.STAGE_OBSERVERS.append(metrics.stage_observer)
+    # /metrics endpoint when SOCIAL_METRICS_PORT is set
+    metrics.serve()
+    
     # Schedule jobs
     # Fetch every hour
     schedule.every().hour.do(fetch_all_social_data)
+    # Archive once a day, off-peak
+    schedule.every().day.at("03:30").do(run_retention)
     
     # Also fetch immediately on start
     fetch_all_social_data()
@@ -59,6 +103,10 @@ def run_scheduler():
         time.sleep(60)  # Check every minute
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch and process social media data every hour")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile every cycle (SOCIAL_PROFILE_EVERY=N samples one cycle in N)")
+    PROFILE_ALL = parser.parse_args().profile
     try:
         run_scheduler()
     except KeyboardInterrupt:
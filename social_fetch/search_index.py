@@ -0,0 +1,135 @@
+"""
+Full-text search over processed feedback using SQLite FTS5
+The index lives in social.db and is updated with each processed batch
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+from typing import Dict, List, Optional
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "social.db")
+OUTPUT_PATH = os.path.join(os.path.dirname(__file__), "..", "api", "entries-all.json")
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+def init_db(conn):
+    """Create the FTS5 table and the feedback ID -> FTS rowid map"""
+    conn.execute("""CREATE TABLE IF NOT EXISTS feedback_docs (
+        rowid INTEGER PRIMARY KEY,
+        id TEXT UNIQUE
+    )""")
+    # state/category/source are indexed too, so filters narrow the match
+    # inside FTS5 instead of post-filtering every hit
+    conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS feedback_fts USING fts5(
+        review,
+        category,
+        state,
+        source,
+        date UNINDEXED,
+        tokenize = 'porter unicode61'
+    )""")
+    conn.commit()
+
+def index_feedbacks(feedbacks: List[Dict], db_path: Optional[str] = None) -> int:
+    """Add feedback entries not yet indexed; returns the number added"""
+    conn = sqlite3.connect(db_path or DB_PATH, timeout=30)
+    init_db(conn)
+    added = 0
+    with conn:
+        for fb in feedbacks:
+            cursor = conn.execute("INSERT OR IGNORE INTO feedback_docs (id) VALUES (?)", (fb["id"],))
+            if not cursor.rowcount:
+                continue
+            conn.execute("""INSERT INTO feedback_fts (rowid, review, category, state, source, date)
+                VALUES (?,?,?,?,?,?)""",
+                (cursor.lastrowid, fb.get("review", ""), fb.get("category"), fb.get("state"),
+                 fb.get("source"), fb.get("date")))
+            added += 1
+    conn.close()
+    return added
+
+def rebuild_from_json(path: Optional[str] = None, db_path: Optional[str] = None) -> int:
+    """Index every entry of a published entries file (e.g. after enabling search)"""
+    with open(path or OUTPUT_PATH) as f:
+        data = json.load(f)
+    entries = data["entries"] if isinstance(data, dict) else data
+    return index_feedbacks(entries, db_path)
+
+def build_match(text: str, mode: str = "words") -> str:
+    """FTS5 MATCH expression for user text.
+
+    words  - every term must appear (default)
+    phrase - the terms must appear consecutively
+    prefix - every term matches as a prefix ("dead zo" finds "dead zone")
+    raw    - text is already FTS5 query syntax
+    """
+    if mode == "raw":
+        return text
+    terms = _TERM_RE.findall(text)
+    if not terms:
+        raise ValueError("Empty search query")
+    if mode == "phrase":
+        return '"' + " ".join(terms) + '"'
+    if mode == "prefix":
+        return " ".join(f'"{t}"*' for t in terms)
+    return " ".join(f'"{t}"' for t in terms)
+
+def search(text: str, mode: str = "words", state: Optional[str] = None, category: Optional[str] = None,
+           source: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+           limit: int = 20, db_path: Optional[str] = None) -> List[Dict]:
+    """Matching feedback, best (BM25) first; dates are inclusive YYYY-MM-DD bounds"""
+    sql = """SELECT d.id, f.review, f.category, f.state, f.source, f.date, bm25(feedback_fts) AS rank
+        FROM feedback_fts f JOIN feedback_docs d ON d.rowid = f.rowid
+        WHERE feedback_fts MATCH ?"""
+    match = f"review : ({build_match(text, mode)})"
+    params = []
+    for column, value in (("state", state), ("category", category), ("source", source)):
+        if value:
+            terms = _TERM_RE.findall(value)
+            if terms:
+                # Anchored phrase ("Virginia" must not match "West Virginia")
+                match += f' AND {column} : ^"{" ".join(terms)}"'
+            # Exact comparison drops longer values that share the prefix
+            sql += f" AND f.{column} = ?"
+            params.append(value)
+    params.insert(0, match)
+    if since:
+        sql += " AND f.date >= ?"
+        params.append(since)
+    if until:
+        sql += " AND f.date <= ?"
+        params.append(until)
+    sql += " ORDER BY rank LIMIT ?"
+    params.append(limit)
+
+    conn = sqlite3.connect(db_path or DB_PATH)
+    conn.row_factory = sqlite3.Row
+    init_db(conn)
+    rows = conn.execute(sql, params).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search processed feedback")
+    parser.add_argument("query", nargs="?", help="Search text")
+    parser.add_argument("--mode", choices=["words", "phrase", "prefix", "raw"], default="words")
+    parser.add_argument("--state")
+    parser.add_argument("--category")
+    parser.add_argument("--source")
+    parser.add_argument("--since", help="YYYY-MM-DD")
+    parser.add_argument("--until", help="YYYY-MM-DD")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--rebuild", action="store_true", help="Index api/entries-all.json first")
+    args = parser.parse_args(argv)
+
+    if args.rebuild:
+        print(f"Indexed {rebuild_from_json()} entries")
+    if args.query:
+        for hit in search(args.query, args.mode, args.state, args.category, args.source,
+                          args.since, args.until, args.limit):
+            print(f"{hit['date']}  {hit['state']:<15} {hit['category']:<17} {hit['id']}: {hit['review'][:80]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+JSON serialization for published outputs (api/entries-all.json)
+Uses orjson when it is installed and the standard library otherwise. Entries are
+encoded in chunks straight into a temp file that atomically replaces the output
+"""
+import argparse
+import json
+import mmap
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from social_fetch.feedback import to_json
+
+# Compact output by default; SOCIAL_OUTPUT_PRETTY=1 restores the 2-space indentation.
+# Either way non-ASCII text is written as UTF-8, where json.dump wrote \uXXXX escapes
+PRETTY_OUTPUT = os.getenv("SOCIAL_OUTPUT_PRETTY", "").lower() in ("1", "true", "yes")
+CHUNK_SIZE = 2000
+# Bytes read from the end of a file to find its trailer when appending
+TAIL_BYTES = 4096
+
+def dumps(obj, pretty: bool = False) -> bytes:
+    """Encode one value (entry dicts and Feedback records included) as UTF-8 JSON"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=to_json, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if pretty:
+        return json.dumps(obj, default=to_json, ensure_ascii=False, indent=2).encode()
+    return json.dumps(obj, default=to_json, ensure_ascii=False, separators=(",", ":")).encode()
+
+def loads(data: bytes):
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def load_entries(path: str) -> List[Dict]:
+    """Entries of a published file (the {"entries": [...]} wrapper or a bare list)"""
+    with open(path, "rb") as f:
+        data = loads(f.read())
+    if isinstance(data, dict) and "entries" in data:
+        return data["entries"]
+    if isinstance(data, list):
+        return data
+    return []
+
+def _encode_chunks(entries: Iterable, pretty: bool, chunk_size: int, first: bool = True):
+    """Yield the encoded entries array body chunk by chunk"""
+    separator = b",\n    " if pretty else b","
+    chunk = []
+    for entry in entries:
+        chunk.append(entry)
+        if len(chunk) >= chunk_size:
+            yield _encode_chunk(chunk, pretty, separator, first)
+            first = False
+            chunk = []
+    if chunk:
+        yield _encode_chunk(chunk, pretty, separator, first)
+
+def _encode_chunk(chunk, pretty, separator, first):
+    if ORJSON_AVAILABLE and not pretty:
+        # One call for the whole chunk, then drop the surrounding brackets
+        body = orjson.dumps(chunk, default=to_json)[1:-1]
+    else:
+        encoded = [dumps(entry, pretty) for entry in chunk]
+        if pretty:
+            encoded = [e.replace(b"\n", b"\n    ") for e in encoded]
+        body = separator.join(encoded)
+    return body if first else separator + body
+
+def _write_trailer(f, pretty: bool, has_entries: bool, total: int, last_updated: str):
+    """Close the entries array, then write the total and lastUpdated"""
+    if pretty:
+        f.write(b"\n  ],\n" if has_entries else b"],\n")
+        f.write(f'  "total": {total},\n  "lastUpdated": {json.dumps(last_updated)}\n}}'.encode())
+    else:
+        f.write(b'],"total":' + str(total).encode() + b',"lastUpdated":' + json.dumps(last_updated).encode() + b"}")
+
+@contextmanager
+def _atomic_output(path: str):
+    """Yield a temp file path next to `path` that replaces it once the block succeeds"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".entries-", suffix=".tmp")
+    os.close(fd)
+    try:
+        yield tmp
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def write_entries(path: str, entries: List, pretty: Optional[bool] = None, chunk_size: int = CHUNK_SIZE,
+                  last_updated: Optional[str] = None) -> int:
+    """Write the API document {"success", "entries", "total", "lastUpdated"} atomically.
+
+    Entries are streamed in chunks to a temp file in the same directory, which
+    then replaces `path`, so readers never see a partially written file.
+    """
+    pretty = PRETTY_OUTPUT if pretty is None else pretty
+    last_updated = last_updated or datetime.now().isoformat()
+
+    with _atomic_output(path) as tmp:
+        with open(tmp, "wb") as f:
+            if pretty:
+                f.write(b'{\n  "success": true,\n  "entries": [')
+                if entries:
+                    f.write(b"\n    ")
+            else:
+                f.write(b'{"success":true,"entries":[')
+            for chunk in _encode_chunks(entries, pretty, chunk_size):
+                f.write(chunk)
+            _write_trailer(f, pretty, bool(entries), len(entries), last_updated)
+            f.flush()
+            os.fsync(f.fileno())
+    return len(entries)
+
+def _read_trailer(path: str):
+    """Locate the end of the entries array in a write_entries file.
+
+    Returns (pretty, end of the last entry, whether the array is empty, total).
+    """
+    with open(path, "rb") as f:
+        pretty = f.read(2) == b"{\n"
+        size = f.seek(0, os.SEEK_END)
+        offset = max(0, size - TAIL_BYTES)
+        f.seek(offset)
+        tail = f.read()
+    close = tail.rfind(b"]")
+    rest = tail[close + 1:].lstrip() if close >= 0 else b""
+    if not rest.startswith(b","):
+        raise ValueError(f"{path} does not end with an entries trailer")
+    trailer = loads(b"{" + rest[1:])
+    if not isinstance(trailer, dict) or not isinstance(trailer.get("total"), int):
+        raise ValueError(f"{path} has no entry total")
+    end = close
+    while end > 0 and tail[end - 1] in b" \t\r\n":
+        end -= 1
+    if end == 0 and offset:
+        raise ValueError(f"{path} has an unexpectedly long trailer")
+    empty = tail[end - 1:end] == b"["
+    return pretty, offset + end, empty, trailer["total"]
+
+def _copy_with_counts(src: str, dst: str, end: int, pretty: bool, counts: Dict[str, int]) -> int:
+    """Copy src[:end] to dst, rewriting the duplicateCount of the entries in `counts`.
+
+    Entries are found by their "id" key with a single regex scan over the raw
+    bytes; nothing else is decoded. Returns the length written.
+    """
+    id_key = b'"id": ' if pretty else b'"id":'
+    count_key = b'"duplicateCount": ' if pretty else b'"duplicateCount":'
+    pattern = re.compile(re.escape(id_key) + b"(" + b"|".join(re.escape(dumps(i)) for i in counts) + b")")
+    with open(src, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf, open(dst, "wb") as out:
+        view = memoryview(buf)
+        pos = 0
+        for match in pattern.finditer(buf, 0, end):
+            count_at = buf.find(count_key, match.end(), end)
+            next_entry = buf.find(id_key, match.end(), end)
+            if count_at < 0 or 0 <= next_entry < count_at:
+                raise ValueError(f"Entry {match.group(1).decode()} has no duplicateCount")
+            value_start = value_end = count_at + len(count_key)
+            while buf[value_end:value_end + 1].isdigit():
+                value_end += 1
+            out.write(view[pos:value_start])
+            out.write(str(counts[loads(match.group(1))]).encode())
+            pos = value_end
+        out.write(view[pos:end])
+        view.release()
+        return out.tell()
+
+def append_entries(path: str, entries: List, chunk_size: int = CHUNK_SIZE, last_updated: Optional[str] = None,
+                   duplicate_counts: Optional[Dict[str, int]] = None) -> int:
+    """Add entries to a file written by write_entries without re-encoding what is there.
+
+    The existing bytes up to the end of the array are copied (no parsing) to a
+    temp file, with `duplicate_counts` spliced into the matching entries, the new
+    entries and an updated trailer follow, and the temp file replaces `path`.
+    The file keeps its own layout (pretty or compact). Raises ValueError when the
+    file does not end the way write_entries writes it. Returns the new total.
+    """
+    pretty, end, empty, total = _read_trailer(path)
+    if not entries and not duplicate_counts:
+        return total
+    last_updated = last_updated or datetime.now().isoformat()
+
+    with _atomic_output(path) as tmp:
+        if duplicate_counts:
+            end = _copy_with_counts(path, tmp, end, pretty, duplicate_counts)
+        else:
+            shutil.copyfile(path, tmp)
+        with open(tmp, "r+b") as f:
+            f.truncate(end)
+            f.seek(end)
+            if pretty and empty and entries:
+                f.write(b"\n    ")
+            for chunk in _encode_chunks(entries, pretty, chunk_size, first=empty):
+                f.write(chunk)
+            total += len(entries)
+            _write_trailer(f, pretty, total > 0, total, last_updated)
+            f.flush()
+            os.fsync(f.fileno())
+    return total
+
+def _synthetic_entries(count: int) -> List[Dict]:
+    rng = random.Random(0)
+    states = ["Ohio", "Texas", "New York", "California", "Florida", "Washington"]
+    categories = ["Coverage", "Price", "Customer Service", "Network Speed", "Reliability", "Other"]
+    words = "signal coverage plan bill home internet slow fast great terrible support store agent".split()
+    entries = []
+    for i in range(count):
+        state = rng.choice(states)
+        rating = round(rng.uniform(1, 5), 1)
+        entries.append({
+            "id": f"twitter-{1700000000000000000 + i}", "customerName": f"user{i % 5000}.",
+            "location": f"{state}, {state[:2].upper()}", "state": state, "county": f"{state} County",
+            "city": state, "rating": rating, "score": round(rating * 20),
+            "review": " ".join(rng.choice(words) for _ in range(rng.randint(8, 40))),
+            "date": f"2024-05-{rng.randint(1, 28):02d}", "category": rng.choice(categories),
+            "verified": False, "source": "Twitter", "duplicateCount": 1,
+        })
+    return entries
+
+def benchmark(counts=(100_000, 1_000_000), directory: Optional[str] = None) -> Dict:
+    """Time legacy json.dump(indent=2) against the streaming writer for each size"""
+    directory = directory or tempfile.mkdtemp(prefix="serializer-bench-")
+    results = {"orjson": ORJSON_AVAILABLE, "runs": []}
+    for count in counts:
+        entries = _synthetic_entries(count)
+        path = os.path.join(directory, f"entries-{count}.json")
+        run = {"entries": count}
+
+        start = time.perf_counter()
+        with open(path, "w") as f:
+            json.dump({"success": True, "entries": entries, "total": count,
+                       "lastUpdated": datetime.now().isoformat()}, f, indent=2)
+        run["legacy_indent2_s"] = round(time.perf_counter() - start, 3)
+        run["legacy_bytes"] = os.path.getsize(path)
+
+        start = time.perf_counter()
+        with open(path) as f:
+            json.load(f)
+        run["legacy_load_s"] = round(time.perf_counter() - start, 3)
+
+        for pretty in (True, False):
+            label = "pretty" if pretty else "compact"
+            start = time.perf_counter()
+            write_entries(path, entries, pretty=pretty)
+            run[f"stream_{label}_s"] = round(time.perf_counter() - start, 3)
+            run[f"stream_{label}_bytes"] = os.path.getsize(path)
+
+        # Compact file from the last write
+        start = time.perf_counter()
+        load_entries(path)
+        run["load_entries_s"] = round(time.perf_counter() - start, 3)
+        os.remove(path)
+        results["runs"].append(run)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Output serializer utilities")
+    parser.add_argument("--bench", type=int, nargs="+", metavar="N", help="Benchmark with N entries")
+    args = parser.parse_args(argv)
+    if args.bench:
+        print(json.dumps(benchmark(args.bench), indent=2))
+    else:
+        print(f"orjson available: {ORJSON_AVAILABLE}, pretty output: {PRETTY_OUTPUT}")
+
+if __name__ == "__main__":
+    main()
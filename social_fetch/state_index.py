@@ -0,0 +1,241 @@
+"""
+Random-access reader for state-entries-data.json and state-data.json
+A sidecar index records the byte span of every state (and of each of its
+top-level fields) once; lookups then memory-map the file and parse only the
+requested slice. The index is rebuilt whenever the data file's mtime changes
+"""
+import argparse
+import json
+import mmap
+import os
+import re
+import time
+from typing import Dict, List, Optional
+
+ENTRIES_PATH = os.path.join(os.path.dirname(__file__), "..", "state-entries-data.json")
+STATE_DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "state-data.json")
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 1
+
+# Fields api-server.js strips from the comprehensive file to get the basic state info
+ENTRY_FIELDS = ("entries", "totalEntries", "lastUpdated")
+
+# Strings (with escapes) and the structural characters; everything else is skipped
+_TOKEN_RE = re.compile(rb'"(?:[^"\\]|\\.)*"|[{}\[\]:,]')
+_WHITESPACE = b" \t\r\n"
+
+def _strip_span(buf, start: int, end: int):
+    while start < end and buf[start] in _WHITESPACE:
+        start += 1
+    while end > start and buf[end - 1] in _WHITESPACE:
+        end -= 1
+    return [start, end]
+
+def build_index(buf) -> Dict:
+    """Byte spans of each top-level key's value, and of that value's own keys.
+
+    Returns {state: {"span": [start, end], "fields": {field: [start, end]}}}.
+    """
+    states = {}
+    depth = 0
+    last_string = None
+    state = field = None
+    state_start = field_start = 0
+    for match in _TOKEN_RE.finditer(buf):
+        token = match.group()
+        char = token[:1]
+        if char == b'"':
+            last_string = token
+        elif char == b":":
+            if depth == 1:
+                state = json.loads(last_string)
+                state_start = match.end()
+                states[state] = {"span": None, "fields": {}}
+            elif depth == 2 and state is not None:
+                field = json.loads(last_string)
+                field_start = match.end()
+        elif char in (b"{", b"["):
+            depth += 1
+        elif char in (b",", b"}", b"]"):
+            if char != b",":
+                depth -= 1
+            # A comma or the closing brace at a key's depth ends that key's value
+            at = match.start()
+            if char == b"," and depth == 2 and field is not None:
+                states[state]["fields"][field] = _strip_span(buf, field_start, at)
+                field = None
+            elif char == b"}" and depth == 1 and field is not None:
+                states[state]["fields"][field] = _strip_span(buf, field_start, at)
+                field = None
+            if (char == b"," and depth == 1 or char == b"}" and depth == 0) and state is not None:
+                states[state]["span"] = _strip_span(buf, state_start, at)
+                state = None
+    if depth != 0:
+        raise ValueError("Unbalanced JSON document")
+    return states
+
+class StateIndex:
+    """Memory-mapped state file plus its sidecar index"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = os.path.abspath(path or ENTRIES_PATH)
+        self.index_path = self.path + INDEX_SUFFIX
+        self._file = None
+        self._map = None
+        self._stat = None
+        self.states = {}
+        self._refresh()
+
+    def _source_stat(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def _load_sidecar(self, stat) -> bool:
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if (index.get("version") != INDEX_VERSION or index.get("mtime_ns") != stat[0]
+                or index.get("size") != stat[1]):
+            return False
+        self.states = index["states"]
+        return True
+
+    def _write_sidecar(self, stat):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": INDEX_VERSION, "mtime_ns": stat[0], "size": stat[1],
+                       "states": self.states}, f)
+        os.replace(tmp, self.index_path)
+
+    def _refresh(self):
+        """(Re)map the file if it changed, rebuilding the sidecar when it is stale"""
+        stat = self._source_stat()
+        if stat == self._stat:
+            return
+        self.close()
+        self._file = open(self.path, "rb")
+        # Use the opened file's own stat; it may have been swapped since os.stat()
+        st = os.fstat(self._file.fileno())
+        stat = (st.st_mtime_ns, st.st_size)
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if stat[1] else b""
+        if not self._load_sidecar(stat):
+            self.states = build_index(self._map)
+            self._write_sidecar(stat)
+        self._stat = stat
+
+    def rebuild(self):
+        """Force a rescan of the data file"""
+        if os.path.exists(self.index_path):
+            os.remove(self.index_path)
+        self._stat = None
+        self._refresh()
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        if self._file:
+            self._file.close()
+        self._map = self._file = None
+
+    def _parse(self, span):
+        start, end = span
+        return json.loads(self._map[start:end])
+
+    def state_names(self) -> List[str]:
+        self._refresh()
+        return list(self.states)
+
+    def __contains__(self, state):
+        self._refresh()
+        return state in self.states
+
+    def get_state(self, state: str) -> Optional[Dict]:
+        """Full object for one state, or None"""
+        self._refresh()
+        if state not in self.states:
+            return None
+        return self._parse(self.states[state]["span"])
+
+    def get_field(self, state: str, field: str, default=None):
+        """One top-level field of a state (e.g. "entries", "districts") without parsing the rest"""
+        self._refresh()
+        span = self.states.get(state, {}).get("fields", {}).get(field)
+        if span is None:
+            return default
+        return self._parse(span)
+
+    def entries(self, state: str) -> List[Dict]:
+        return self.get_field(state, "entries", [])
+
+    def districts(self, state: str) -> List[Dict]:
+        return self.get_field(state, "districts", [])
+
+    def state_info(self, state: str) -> Optional[Dict]:
+        """State summary without its entries (the basic state-data.json shape)"""
+        self._refresh()
+        if state not in self.states:
+            return None
+        return {field: self._parse(span) for field, span in self.states[state]["fields"].items()
+                if field not in ENTRY_FIELDS}
+
+_indexes = {}
+
+def open_index(path: Optional[str] = None) -> StateIndex:
+    """Shared StateIndex per file; the comprehensive file when it exists, else state-data.json"""
+    if path is None:
+        path = ENTRIES_PATH if os.path.exists(ENTRIES_PATH) else STATE_DATA_PATH
+    path = os.path.abspath(path)
+    if path not in _indexes:
+        _indexes[path] = StateIndex(path)
+    return _indexes[path]
+
+def benchmark(state: str, path: Optional[str] = None, repeat: int = 20) -> Dict:
+    """Time a single state's entries: full json.load vs indexed read"""
+    path = path or ENTRIES_PATH
+    start = time.perf_counter()
+    for _ in range(repeat):
+        with open(path) as f:
+            json.load(f)[state].get("entries")
+    full = (time.perf_counter() - start) / repeat
+
+    if os.path.exists(path + INDEX_SUFFIX):
+        os.remove(path + INDEX_SUFFIX)
+    start = time.perf_counter()
+    index = StateIndex(path)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        index.entries(state)
+    indexed = (time.perf_counter() - start) / repeat
+    index.close()
+    return {"state": state, "full_load_ms": round(full * 1000, 2), "index_build_ms": round(build * 1000, 2),
+            "indexed_read_ms": round(indexed * 1000, 3)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Indexed access to state data files")
+    parser.add_argument("state", nargs="?", help="State name, e.g. Ohio")
+    parser.add_argument("--field", help="Only this field, e.g. entries or districts")
+    parser.add_argument("--file", help="Data file (default: state-entries-data.json, else state-data.json)")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the sidecar index")
+    parser.add_argument("--bench", action="store_true", help="Compare with loading the whole file")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        print(json.dumps(benchmark(args.state or "California", args.file), indent=2))
+        return
+    index = open_index(args.file)
+    if args.rebuild:
+        index.rebuild()
+        print(f"Indexed {len(index.states)} states in {index.index_path}")
+    if not args.state:
+        for name in index.state_names():
+            print(name)
+        return
+    value = index.get_field(args.state, args.field) if args.field else index.get_state(args.state)
+    print(json.dumps(value, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -3,23 +3,49 @@ Twitter (X) API v2 - Fetch public tweets mentioning T-Mobile
 Requires: Twitter Developer account + Bearer token with Elevated access
 """
 import requests
-import time
 import os
 import sqlite3
 import json
-from datetime import datetime
+import sys
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from social_fetch import metrics, profiling, raw_store
+from social_fetch.ratelimit import RateLimiter, retry_after
+
 load_dotenv()
 
 BEARER = os.getenv("TWITTER_BEARER_TOKEN")
 HEADERS = {"Authorization": f"Bearer {BEARER}"}
-SEARCH_URL = "https://api.twitter.com/2/tweets/search/recent"
+# Overridable so the fetcher can run against social_fetch.mock_api
+API_BASE = os.getenv("TWITTER_API_BASE", "https://api.twitter.com/2").rstrip("/")
+SEARCH_URL = f"{API_BASE}/tweets/search/recent"
 
 # Query: mentions or brand keywords; exclude retweets to reduce noise
 QUERY = '("T-Mobile" OR TMobile OR @TMobile OR "T Mobile") -is:retweet lang:en'
 DB_PATH = os.path.join(os.path.dirname(__file__), "..", "social.db")
 
+# Query sets: name (stored in twitter.query), search query, priority for the
+# shared rate budget, optional per-query page cap and optional category that
+# processing uses instead of keyword categorization.
+# Override with a JSON list in the file named by TWITTER_QUERIES_FILE.
+DEFAULT_QUERY_SETS = [
+    {"name": "brand", "query": QUERY, "priority": 10},
+]
+QUERIES_FILE = os.getenv("TWITTER_QUERIES_FILE")
+
+# One request budget for every concurrent caller (recent search: 300 requests / 15 min)
+LIMITER = RateLimiter(int(os.getenv("TWITTER_RATE_LIMIT", "300")), 15 * 60, name="twitter")
+# Recent search only covers the last 7 days
+RECENT_SEARCH_DAYS = 7
+# Retries of a page after 429 responses before it is treated as failed
+MAX_RETRIES = int(os.getenv("TWITTER_MAX_RETRIES", "3"))
+
 def init_db():
     """Initialize SQLite database for Twitter data"""
     conn = sqlite3.connect(DB_PATH)
@@ -33,15 +59,83 @@ def init_db():
         public_metrics TEXT,
         raw JSON,
         processed INTEGER DEFAULT 0,
-        created_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        created_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        query TEXT
+    )""")
+    # Databases created before query sets lack the query column
+    columns = [row[1] for row in c.execute("PRAGMA table_info(twitter)")]
+    if "query" not in columns:
+        c.execute("ALTER TABLE twitter ADD COLUMN query TEXT")
+    # Per-query watermark: newest tweet ID already fetched, plus the pagination
+    # chain still being read (next_token) and the newest ID it started from
+    c.execute("""CREATE TABLE IF NOT EXISTS twitter_queries (
+        name TEXT PRIMARY KEY,
+        since_id TEXT,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        next_token TEXT,
+        pending_newest_id TEXT
     )""")
+    columns = [row[1] for row in c.execute("PRAGMA table_info(twitter_queries)")]
+    for column in ("next_token", "pending_newest_id"):
+        if column not in columns:
+            c.execute(f"ALTER TABLE twitter_queries ADD COLUMN {column} TEXT")
+    # Databases from before query sets keyed checkpoints by window only; the key
+    # changes, so copy them into the new layout under the default query set
+    columns = [row[1] for row in c.execute("PRAGMA table_info(twitter_backfill)")]
+    if columns and "query" not in columns:
+        c.execute("ALTER TABLE twitter_backfill RENAME TO twitter_backfill_old")
+    # Backfill checkpoints: one row per query set and time window
+    c.execute("""CREATE TABLE IF NOT EXISTS twitter_backfill (
+        query TEXT,
+        window_start TEXT,
+        window_end TEXT,
+        next_token TEXT,
+        status TEXT DEFAULT 'pending',
+        pages INTEGER DEFAULT 0,
+        saved INTEGER DEFAULT 0,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (query, window_start, window_end)
+    )""")
+    if columns and "query" not in columns:
+        c.execute("""INSERT OR IGNORE INTO twitter_backfill
+            (query, window_start, window_end, next_token, status, pages, saved, updated_at)
+            SELECT ?, window_start, window_end, next_token, status, pages, saved, updated_at
+            FROM twitter_backfill_old""", (DEFAULT_QUERY_SETS[0]["name"],))
+        c.execute("DROP TABLE twitter_backfill_old")
     conn.commit()
     conn.close()
 
-def fetch_tweets(next_token=None, max_results=100):
-    """Fetch tweets from Twitter API v2"""
+def load_query_sets():
+    """Return the configured query sets, highest priority first"""
+    query_sets = DEFAULT_QUERY_SETS
+    if QUERIES_FILE:
+        # A bad file must not stop the fetch cycle: fall back to the brand query
+        try:
+            with open(QUERIES_FILE) as f:
+                loaded = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read {QUERIES_FILE}, using the default query: {e}")
+        else:
+            if (isinstance(loaded, list) and loaded
+                    and all(isinstance(q, dict) and q.get("name") and q.get("query") for q in loaded)):
+                query_sets = loaded
+            else:
+                print(f"{QUERIES_FILE} must be a non-empty list of sets with a name and a query, "
+                      "using the default query")
+    return sorted(query_sets, key=lambda q: q.get("priority", 0), reverse=True)
+
+def get_query_set(name):
+    """Look up a configured query set by name"""
+    for query_set in load_query_sets():
+        if query_set["name"] == name:
+            return query_set
+    return None
+
+def fetch_tweets(next_token=None, max_results=100, start_time=None, end_time=None,
+                 query=None, since_id=None, priority=0):
+    """Fetch tweets from Twitter API v2, optionally limited to a time window or since_id"""
     params = {
-        "query": QUERY,
+        "query": query or QUERY,
         "tweet.fields": "created_at,author_id,lang,public_metrics,context_annotations",
         "expansions": "author_id",
         "user.fields": "username,name",
@@ -50,24 +144,34 @@ def fetch_tweets(next_token=None, max_results=100):
     
     if next_token:
         params["next_token"] = next_token
+    if start_time:
+        params["start_time"] = start_time
+    if end_time:
+        params["end_time"] = end_time
+    if since_id:
+        params["since_id"] = since_id
     
     try:
-        r = requests.get(SEARCH_URL, headers=HEADERS, params=params, timeout=30)
-        
-        if r.status_code == 429:
-            # Rate limit - wait and retry
-            print("Rate limited, sleeping 60s")
-            time.sleep(60)
-            return fetch_tweets(next_token)
-        
-        r.raise_for_status()
-        return r.json()
+        for attempt in range(MAX_RETRIES + 1):
+            LIMITER.acquire(priority)
+            r = metrics.http_get("twitter", "search_recent", SEARCH_URL, headers=HEADERS, params=params, timeout=30)
+            if r.status_code != 429:
+                r.raise_for_status()
+                return r.json()
+            if attempt == MAX_RETRIES:
+                break
+            # Rate limit - pause every worker sharing the budget, then retry
+            wait = retry_after(r)
+            print(f"Rate limited, pausing {wait:.0f}s")
+            LIMITER.pause(wait)
+        print(f"Still rate limited after {MAX_RETRIES} retries, giving up on this page")
+        return None
     except requests.exceptions.RequestException as e:
         print(f"Error fetching tweets: {e}")
         return None
 
-def save_tweets(data):
-    """Save tweets to database"""
+def save_tweets(data, query_name=None):
+    """Save tweets to database, tagged with the query set they came from"""
     if not data or "data" not in data:
         return 0
     
@@ -81,22 +185,27 @@ def save_tweets(data):
             username_map[user["id"]] = user.get("username", "unknown")
     
     saved_count = 0
+    before = conn.total_changes
     for t in data.get("data", []):
         try:
             author_id = t.get("author_id", "")
             username = username_map.get(author_id, "unknown")
-            metrics = json.dumps(t.get("public_metrics", {}))
+            public_metrics = json.dumps(t.get("public_metrics", {}))
+            raw = raw_store.encode_raw("twitter", t, {
+                "id": t["id"], "text": t["text"], "author_id": author_id,
+                "created_at": t.get("created_at")}, db_path=DB_PATH)
             
             c.execute("""INSERT OR IGNORE INTO twitter 
-                (id, text, author_id, author_username, created_at, public_metrics, raw) 
-                VALUES (?,?,?,?,?,?,?)""",
+                (id, text, author_id, author_username, created_at, public_metrics, raw, query) 
+                VALUES (?,?,?,?,?,?,?,?)""",
                 (t["id"], t["text"], author_id, username, 
-                 t.get("created_at"), metrics, json.dumps(t)))
+                 t.get("created_at"), public_metrics, raw, query_name))
             saved_count += 1
         except Exception as e:
             print(f"DB error saving tweet {t.get('id', 'unknown')}: {e}")
     
-    conn.commit()
+    metrics.record_rows("twitter", conn.total_changes - before, saved_count)
+    metrics.commit(conn, "twitter_save")
     conn.close()
     return saved_count
 
@@ -117,37 +226,216 @@ def mark_processed(tweet_id):
     conn.commit()
     conn.close()
 
-def run_once(max_pages=5):
-    """Fetch tweets once (with pagination)"""
-    if not BEARER:
-        print("Warning: TWITTER_BEARER_TOKEN not set in .env")
-        return
-    
-    init_db()
-    next_token = None
+def _get_watermark(name):
+    """(since_id, next_token, pending_newest_id) for a query set"""
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    row = conn.execute("SELECT since_id, next_token, pending_newest_id FROM twitter_queries WHERE name = ?",
+                       (name,)).fetchone()
+    conn.close()
+    return row if row else (None, None, None)
+
+def _set_watermark(name, since_id, next_token=None, pending_newest_id=None):
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.execute("""INSERT INTO twitter_queries (name, since_id, next_token, pending_newest_id) VALUES (?, ?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET since_id = excluded.since_id, next_token = excluded.next_token,
+        pending_newest_id = excluded.pending_newest_id, updated_at = CURRENT_TIMESTAMP""",
+        (name, since_id, next_token, pending_newest_id))
+    conn.commit()
+    conn.close()
+
+def run_query(query_set, max_pages=5):
+    """Fetch new tweets for one query set, newer than its watermark.
+
+    One pagination chain covers everything between the watermark and the newest
+    tweet when the chain started. Its position is saved after every page, so a
+    chain longer than `max_pages` continues on the next run, and the watermark
+    moves up as soon as the chain is finished.
+    """
+    name = query_set["name"]
+    priority = query_set.get("priority", 0)
+    max_pages = query_set.get("max_pages", max_pages)
+    since_id, next_token, newest_id = _get_watermark(name)
     total_saved = 0
     
     for page in range(max_pages):
-        print(f"Fetching page {page + 1}...")
-        data = fetch_tweets(next_token)
+        print(f"[{name}] Fetching page {page + 1}...")
+        data = fetch_tweets(next_token, query=query_set["query"], since_id=since_id, priority=priority)
         
         if not data:
-            break
+            return total_saved
         
-        saved = save_tweets(data)
+        if not next_token:
+            # First page of a new chain
+            newest_id = data.get("meta", {}).get("newest_id")
+        
+        saved = save_tweets(data, name)
         total_saved += saved
-        print(f"Saved {saved} new tweets")
+        print(f"[{name}] Saved {saved} new tweets")
         
-        # Get next page token
-        if "meta" in data and "next_token" in data["meta"]:
-            next_token = data["meta"]["next_token"]
-            time.sleep(2)  # Rate limit protection
-        else:
+        next_token = data.get("meta", {}).get("next_token")
+        if not next_token:
+            # Everything newer than the watermark has been read
+            _set_watermark(name, newest_id or since_id)
             break
+        _set_watermark(name, since_id, next_token, newest_id)
+    return total_saved
+
+def run_once(max_pages=5):
+    """Fetch tweets once for every query set (with pagination), concurrently"""
+    if not BEARER:
+        print("Warning: TWITTER_BEARER_TOKEN not set in .env")
+        return
     
+    init_db()
+    query_sets = load_query_sets()
+    
+    with ThreadPoolExecutor(max_workers=max(1, len(query_sets))) as pool:
+        results = list(pool.map(profiling.threaded(lambda q: run_query(q, max_pages)), query_sets))
+    
+    total_saved = sum(results)
     print(f"Total saved: {total_saved} tweets")
     return total_saved
 
+def _rfc3339(dt):
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def _parse_time(value):
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+def split_windows(start, end, window_minutes=60):
+    """Windows of a fixed UTC grid (multiples of `window_minutes` since the epoch) covering [start, end).
+
+    The grid does not depend on `start`, so the same window keeps the same
+    checkpoint key however the requested range is shifted or clamped.
+    """
+    step = timedelta(minutes=window_minutes)
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    cursor = epoch + ((start - epoch) // step) * step
+    windows = []
+    while cursor < end:
+        windows.append((_rfc3339(cursor), _rfc3339(cursor + step)))
+        cursor += step
+    return windows
+
+def _update_checkpoint(query_name, window, next_token, status, pages, saved):
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.execute("""UPDATE twitter_backfill
+        SET next_token = ?, status = ?, pages = ?, saved = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE query = ? AND window_start = ? AND window_end = ?""",
+        (next_token, status, pages, saved, query_name, window[0], window[1]))
+    conn.commit()
+    conn.close()
+
+def backfill_window(window, next_token=None, pages=0, saved=0, max_pages=None, query_set=None, fetch_range=None):
+    """Walk one window's pagination chain, checkpointing after every page.
+
+    `window` is the checkpoint key; `fetch_range` (default: the window) is the
+    part of it actually requested when the window is cut by the search horizon.
+    """
+    query_set = query_set or DEFAULT_QUERY_SETS[0]
+    start_time, end_time = fetch_range or window
+    while max_pages is None or pages < max_pages:
+        data = fetch_tweets(next_token, start_time=start_time, end_time=end_time,
+                            query=query_set["query"], priority=query_set.get("priority", 0))
+        if data is None:
+            # Keep the token so a later run resumes from the failed page
+            _update_checkpoint(query_set["name"], window, next_token, "error", pages, saved)
+            return saved
+        
+        saved += save_tweets(data, query_set["name"])
+        pages += 1
+        next_token = data.get("meta", {}).get("next_token")
+        if not next_token:
+            # A trimmed window is fetched again (from its first page) by later runs
+            status = "done" if (start_time, end_time) == tuple(window) else "partial"
+            _update_checkpoint(query_set["name"], window, None, status, pages, saved)
+            return saved
+        _update_checkpoint(query_set["name"], window, next_token, "pending", pages, saved)
+    return saved
+
+def backfill(start, end, window_minutes=60, workers=4, max_pages=None, query_name="brand"):
+    """Fetch [start, end) as concurrent time windows; resumable via twitter_backfill"""
+    if not BEARER:
+        print("Warning: TWITTER_BEARER_TOKEN not set in .env")
+        return
+    
+    start, end = _parse_time(start), _parse_time(end)
+    now = datetime.now(timezone.utc)
+    # end_time must be at least 10s in the past; start_time within the search horizon
+    latest = now - timedelta(seconds=30)
+    earliest = start
+    if "recent" in SEARCH_URL and start < now - timedelta(days=RECENT_SEARCH_DAYS):
+        earliest = now - timedelta(days=RECENT_SEARCH_DAYS) + timedelta(minutes=1)
+        print(f"Recent search covers {RECENT_SEARCH_DAYS} days; skipping windows before {_rfc3339(earliest)}")
+    
+    query_set = get_query_set(query_name)
+    if not query_set:
+        print(f"Unknown query set: {query_name}")
+        return 0
+    
+    # Checkpoint keys come from the fixed grid over the requested range; only
+    # windows that reach into the searchable range are fetched, trimmed to it
+    windows, ranges = [], {}
+    for ws, we in split_windows(start, end, window_minutes):
+        fetch_start = max(_parse_time(ws), start, earliest)
+        fetch_end = min(_parse_time(we), end, latest)
+        if fetch_start < fetch_end:
+            windows.append((ws, we))
+            ranges[(ws, we)] = (_rfc3339(fetch_start), _rfc3339(fetch_end))
+    if not windows:
+        print("Nothing to backfill")
+        return 0
+    
+    init_db()
+    conn = sqlite3.connect(DB_PATH)
+    conn.executemany("INSERT OR IGNORE INTO twitter_backfill (query, window_start, window_end) VALUES (?, ?, ?)",
+                     [(query_name, ws, we) for ws, we in windows])
+    conn.commit()
+    placeholders = ",".join("(?, ?)" for _ in windows)
+    pending = conn.execute(f"""SELECT window_start, window_end, next_token, pages, saved
+        FROM twitter_backfill WHERE status != 'done' AND query = ?
+        AND (window_start, window_end) IN (VALUES {placeholders})
+        ORDER BY window_start DESC""", [query_name] + [v for w in windows for v in w]).fetchall()
+    conn.close()
+    
+    def run_window(row):
+        window, next_token = (row[0], row[1]), row[2]
+        fetch_range = ranges[window]
+        # A pagination token belongs to one exact start/end; a trimmed window starts over
+        if fetch_range != window:
+            next_token = None
+        return backfill_window(window, next_token, row[3], row[4], max_pages, query_set, fetch_range)
+    
+    print(f"Backfilling {len(pending)} of {len(windows)} windows with {workers} workers...")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(profiling.threaded(run_window), pending))
+    
+    total_saved = sum(results)
+    print(f"Backfill saved {total_saved} tweets")
+    return total_saved
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch T-Mobile tweets")
+    sub = parser.add_subparsers(dest="command")
+    bf = sub.add_parser("backfill", help="Fetch a past time range in concurrent windows")
+    bf.add_argument("--start", required=True, help="ISO-8601 start time (UTC if no offset)")
+    bf.add_argument("--end", default=_rfc3339(datetime.now(timezone.utc)), help="ISO-8601 end time (default: now)")
+    bf.add_argument("--window-minutes", type=int, default=60)
+    bf.add_argument("--workers", type=int, default=4)
+    bf.add_argument("--max-pages", type=int, default=None, help="Page limit per window")
+    bf.add_argument("--query", default="brand", help="Query set name to backfill")
+    parser.add_argument("--profile", action="store_true", help="Write cProfile/tracemalloc reports")
+    args = parser.parse_args(argv)
+    
+    with profiling.cycle(args.command or "twitter", force=args.profile):
+        if args.command == "backfill":
+            with profiling.stage("backfill"):
+                backfill(args.start, args.end, args.window_minutes, args.workers, args.max_pages, args.query)
+        else:
+            with profiling.stage("fetch_twitter"):
+                run_once()
+
 if __name__ == "__main__":
-    run_once()
+    main()
 
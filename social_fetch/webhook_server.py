@@ -0,0 +1,319 @@
+"""
+Graph API webhook receiver - push ingestion for Facebook and Instagram
+Handles the subscription handshake and change notifications, verifies
+X-Hub-Signature-256 and writes comments/posts into social.db in batches.
+Requires: FB_APP_SECRET and FB_WEBHOOK_VERIFY_TOKEN (set in .env)
+"""
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import requests
+from dotenv import load_dotenv
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from social_fetch import facebook_fetch, instagram_fetch
+
+load_dotenv()
+
+APP_SECRET = os.getenv("FB_APP_SECRET")
+VERIFY_TOKEN = os.getenv("FB_WEBHOOK_VERIFY_TOKEN")
+HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+PORT = int(os.getenv("WEBHOOK_PORT", "8787"))
+BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "100"))
+FLUSH_INTERVAL = float(os.getenv("WEBHOOK_FLUSH_INTERVAL", "5"))
+# Rows that could not be written when the receiver stops are kept here and replayed on start
+SPOOL_PATH = os.getenv("WEBHOOK_SPOOL_PATH", os.path.join(os.path.dirname(__file__), "..", "webhook-spool.json"))
+
+def graph_time(value=None):
+    """Format a unix timestamp the way the Graph API formats created_time"""
+    if value is None:
+        value = time.time()
+    return datetime.fromtimestamp(int(value), tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S+0000")
+
+def sign_payload(body, secret):
+    """Compute the X-Hub-Signature-256 header value for a raw request body"""
+    digest = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+def verify_signature(body, header, secret):
+    """Check an X-Hub-Signature-256 header against the raw request body"""
+    if not header or not secret:
+        return False
+    return hmac.compare_digest(sign_payload(body, secret), header)
+
+class WebhookBuffer:
+    """Collects rows from notifications and writes them to social.db in batches"""
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.fb_posts = []
+        self.fb_comments = []
+        self.ig_comments = []
+        self.saved = 0
+        self.failed_flushes = 0
+
+    def pending(self):
+        return len(self.fb_posts) + len(self.fb_comments) + len(self.ig_comments)
+
+    def add_payload(self, payload):
+        """Queue every supported change in a notification; returns the number queued"""
+        queued = 0
+        with self.lock:
+            for entry in payload.get("entry", []):
+                for change in entry.get("changes", []):
+                    if payload.get("object") == "page":
+                        queued += self._add_page_change(change, entry)
+                    elif payload.get("object") == "instagram":
+                        queued += self._add_instagram_change(change, entry)
+            full = self.pending() >= self.batch_size
+        if full:
+            self.flush()
+        return queued
+
+    def _add_page_change(self, change, entry):
+        value = change.get("value", {})
+        if change.get("field") != "feed" or value.get("verb", "add") not in ("add", "edited"):
+            return 0
+        created = graph_time(value.get("created_time", entry.get("time")))
+        if value.get("item") == "comment" and value.get("comment_id"):
+            self.fb_comments.append(({
+                "id": value["comment_id"],
+                "message": value.get("message", ""),
+                "from": value.get("from", {}),
+                "created_time": created,
+            }, value.get("post_id")))
+            return 1
+        if value.get("item") in ("post", "status") and value.get("post_id"):
+            self.fb_posts.append({
+                "id": value["post_id"],
+                "message": value.get("message", ""),
+                "from": value.get("from", {}),
+                "created_time": created,
+            })
+            return 1
+        return 0
+
+    def _add_instagram_change(self, change, entry):
+        value = change.get("value", {})
+        if change.get("field") not in ("comments", "live_comments") or not value.get("id"):
+            return 0
+        self.ig_comments.append(({
+            "id": value["id"],
+            "text": value.get("text", ""),
+            "username": value.get("from", {}).get("username", "unknown"),
+            "timestamp": graph_time(entry.get("time")),
+        }, value.get("media", {}).get("id"), None))
+        return 1
+
+    def flush(self):
+        """Write everything queued so far; returns the number of rows inserted.
+
+        Graph has already been answered with 200 and will not redeliver, so rows
+        from a failed write (e.g. "database is locked") go back on the queue.
+        """
+        with self.lock:
+            posts, self.fb_posts = self.fb_posts, []
+            comments, self.fb_comments = self.fb_comments, []
+            ig_comments, self.ig_comments = self.ig_comments, []
+        saved = 0
+        failed = False
+        if posts or comments:
+            try:
+                saved += facebook_fetch.save_batch(posts=posts, comments=comments)
+                posts, comments = [], []
+            except sqlite3.Error as e:
+                failed = True
+                print(f"Facebook webhook batch write failed, keeping {len(posts) + len(comments)} rows queued: {e}")
+        if ig_comments:
+            try:
+                saved += instagram_fetch.save_batch(comments=ig_comments)
+                ig_comments = []
+            except sqlite3.Error as e:
+                failed = True
+                print(f"Instagram webhook batch write failed, keeping {len(ig_comments)} rows queued: {e}")
+        if failed:
+            self.failed_flushes += 1
+            self._requeue(posts, comments, ig_comments)
+        self.saved += saved
+        return saved
+
+    def _requeue(self, posts, comments, ig_comments):
+        """Put rows back ahead of anything queued since they were taken"""
+        with self.lock:
+            self.fb_posts[:0] = posts
+            self.fb_comments[:0] = comments
+            self.ig_comments[:0] = ig_comments
+
+    def spill(self, path=SPOOL_PATH):
+        """Write queued rows to a file (atomically); returns the number written"""
+        with self.lock:
+            rows = {"fb_posts": self.fb_posts, "fb_comments": self.fb_comments, "ig_comments": self.ig_comments}
+            count = self.pending()
+            if count:
+                tmp = f"{path}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump(rows, f)
+                os.replace(tmp, path)
+                self.fb_posts, self.fb_comments, self.ig_comments = [], [], []
+        return count
+
+    def load_spool(self, path=SPOOL_PATH):
+        """Queue rows spilled by an earlier run and remove the file; returns the number queued"""
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            rows = json.load(f)
+        self._requeue(rows.get("fb_posts", []), [tuple(r) for r in rows.get("fb_comments", [])],
+                      [tuple(r) for r in rows.get("ig_comments", [])])
+        os.remove(path)
+        return sum(len(v) for v in rows.values())
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """GET answers the subscription handshake, POST receives change notifications"""
+
+    buffer = None
+    verify_token = None
+    app_secret = None
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        mode = query.get("hub.mode", [""])[0]
+        token = query.get("hub.verify_token", [""])[0]
+        challenge = query.get("hub.challenge", [""])[0]
+        if mode == "subscribe" and self.verify_token and hmac.compare_digest(token, self.verify_token):
+            self._respond(200, challenge)
+        else:
+            self._respond(403, "Verification failed")
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not verify_signature(body, self.headers.get("X-Hub-Signature-256"), self.app_secret):
+            self._respond(403, "Invalid signature")
+            return
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            self._respond(400, "Invalid JSON")
+            return
+        # Acknowledge quickly; Graph retries notifications that time out
+        self._respond(200, "EVENT_RECEIVED")
+        self.buffer.add_payload(payload)
+
+    def _respond(self, status, text):
+        data = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def make_server(host=HOST, port=PORT, app_secret=None, verify_token=None, batch_size=BATCH_SIZE):
+    """Create the receiver (not yet serving); the buffer is attached as server.buffer"""
+    facebook_fetch.init_db()
+    instagram_fetch.init_db()
+    buffer = WebhookBuffer(batch_size)
+    handler = type("BoundWebhookHandler", (WebhookHandler,), {
+        "buffer": buffer,
+        "verify_token": verify_token or VERIFY_TOKEN,
+        "app_secret": app_secret or APP_SECRET,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.buffer = buffer
+    return server
+
+def run_server(host=HOST, port=PORT, flush_interval=FLUSH_INTERVAL):
+    """Serve webhooks until interrupted, flushing the buffer periodically"""
+    if not APP_SECRET or not VERIFY_TOKEN:
+        print("Warning: FB_APP_SECRET or FB_WEBHOOK_VERIFY_TOKEN not set in .env")
+        return
+
+    server = make_server(host, port)
+    replayed = server.buffer.load_spool()
+    if replayed:
+        print(f"Replaying {replayed} rows spilled by the last run")
+    stop = threading.Event()
+
+    def flusher():
+        while not stop.wait(flush_interval):
+            saved = server.buffer.flush()
+            if saved:
+                print(f"Saved {saved} rows from webhooks")
+
+    threading.Thread(target=flusher, daemon=True).start()
+    print(f"Webhook receiver listening on http://{host}:{port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        server.buffer.flush()
+        spilled = server.buffer.spill()
+        if spilled:
+            print(f"Could not write {spilled} rows; kept them in {SPOOL_PATH}")
+        print(f"Webhook receiver stopped ({server.buffer.saved} rows saved)")
+
+def sample_payloads(count=10):
+    """Build simulated page and Instagram notifications for local testing"""
+    now = int(time.time())
+    payloads = []
+    for i in range(count):
+        if i % 2 == 0:
+            payloads.append({"object": "page", "entry": [{"id": "sim-page", "time": now, "changes": [{
+                "field": "feed",
+                "value": {
+                    "item": "comment", "verb": "add",
+                    "comment_id": f"sim-post_{now}-{i}", "post_id": "sim-post",
+                    "message": f"Simulated comment {i}: no signal in my area since Monday",
+                    "from": {"id": f"sim-user-{i}", "name": f"Sim User {i}"},
+                    "created_time": now,
+                },
+            }]}]})
+        else:
+            payloads.append({"object": "instagram", "entry": [{"id": "sim-ig", "time": now, "changes": [{
+                "field": "comments",
+                "value": {
+                    "id": f"sim-ig-{now}-{i}",
+                    "text": f"Simulated comment {i}: the 5G speed here is great",
+                    "from": {"id": f"sim-ig-user-{i}", "username": f"sim_user_{i}"},
+                    "media": {"id": "sim-media"},
+                },
+            }]}]})
+    return payloads
+
+def simulate(url, count=10, app_secret=None):
+    """Send signed simulated notifications to a running receiver; returns HTTP statuses"""
+    secret = app_secret or APP_SECRET
+    statuses = []
+    for payload in sample_payloads(count):
+        body = json.dumps(payload).encode()
+        r = requests.post(url, data=body, timeout=10, headers={
+            "Content-Type": "application/json",
+            "X-Hub-Signature-256": sign_payload(body, secret),
+        })
+        statuses.append(r.status_code)
+    return statuses
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "simulate":
+        n = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+        codes = simulate(f"http://{HOST}:{PORT}/", n)
+        print(f"Sent {len(codes)} simulated notifications, {codes.count(200)} accepted")
+    else:
+        run_server()
@@ -0,0 +1,67 @@
+"""
+Shared fixtures: every test gets its own social.db and api/ output directory
+"""
+import os
+import sys
+
+import pytest
+import requests
+
+# Add the repository root to path, as the social_fetch scripts do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from social_fetch import (columnar_export, facebook_fetch, instagram_fetch, metrics, process_social_data,
+                          published_index, ratelimit, raw_store, retention, search_index, twitter_fetch)
+
+DB_MODULES = (twitter_fetch, instagram_fetch, facebook_fetch, process_social_data, search_index,
+              published_index, raw_store, retention, metrics)
+OUTPUT_MODULES = (process_social_data, published_index, search_index, columnar_export)
+
+@pytest.fixture
+def social_db(tmp_path, monkeypatch):
+    """Path of an empty social.db that every module writes to"""
+    db_path = str(tmp_path / "social.db")
+    output_path = str(tmp_path / "api" / "entries-all.json")
+    for module in DB_MODULES:
+        if hasattr(module, "DB_PATH"):
+            monkeypatch.setattr(module, "DB_PATH", db_path)
+    for module in OUTPUT_MODULES:
+        if hasattr(module, "OUTPUT_PATH"):
+            monkeypatch.setattr(module, "OUTPUT_PATH", output_path)
+    return db_path
+
+class NoWait:
+    """Rate limiter stand-in that never blocks and records what it was asked"""
+
+    def __init__(self):
+        self.acquired = 0
+        self.pauses = []
+
+    def acquire(self, priority=0):
+        self.acquired += 1
+        return 0.0
+
+    def pause(self, seconds):
+        self.pauses.append(seconds)
+
+class FakeResponse:
+    """Minimal requests.Response for metrics.http_get fakes"""
+
+    def __init__(self, status_code=200, payload=None, headers=None):
+        self.status_code = status_code
+        self.payload = payload if payload is not None else {}
+        self.headers = headers if headers is not None else {"Retry-After": "1"}
+
+    def raise_for_status(self):
+        if 400 <= self.status_code:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error", response=self)
+
+    def json(self):
+        return self.payload
+
+@pytest.fixture
+def graph_limiter(monkeypatch):
+    """The shared Graph budget, replaced by a NoWait for the test"""
+    limiter = NoWait()
+    monkeypatch.setattr(ratelimit, "GRAPH_LIMITER", limiter)
+    return limiter
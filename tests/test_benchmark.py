@@ -0,0 +1,31 @@
+import json
+import sqlite3
+
+from social_fetch import benchmark
+
+def unprocessed(db_path):
+    conn = sqlite3.connect(db_path)
+    counts = {t: conn.execute(f"SELECT COUNT(*) FROM {t} WHERE processed = 0").fetchone()[0]
+              for t in benchmark.TABLE_MIX}
+    conn.close()
+    return counts
+
+def test_generated_rows_follow_the_table_mix(tmp_path):
+    path = str(tmp_path / "bench.db")
+    counts = benchmark.generate_db(path, 500)
+    assert sum(counts.values()) == 500
+    assert unprocessed(path) == counts
+
+def test_run_reports_every_stage_and_leaves_the_database_alone(social_db, tmp_path, capsys):
+    source = str(tmp_path / "bench.db")
+    counts = benchmark.generate_db(source, 300)
+    capsys.readouterr()
+    output = str(tmp_path / "report.json")
+    benchmark.main(["run", source, "--output", output])
+
+    with open(output) as f:
+        report = json.load(f)
+    assert report["input_rows"] == 300
+    assert {"select", "sentiment", "mark", "save"} <= set(report["stages"])
+    assert report["stages"]["select"]["rows"] == 300
+    assert unprocessed(source) == counts
@@ -0,0 +1,38 @@
+import sqlite3
+
+import pytest
+
+from conftest import FakeResponse
+from social_fetch import facebook_fetch, graph
+
+@pytest.fixture
+def limiter(social_db, graph_limiter, monkeypatch):
+    monkeypatch.setattr(facebook_fetch, "FB_TOKEN", "test")
+    return graph_limiter
+
+def test_throttled_comment_pages_are_retried(limiter, social_db, monkeypatch):
+    throttled = {"comments": 2}
+
+    def http_get(platform, endpoint, url, **kwargs):
+        if endpoint == "feed":
+            return FakeResponse(200, {"data": [{"id": "page_1", "message": "Network upgrade in Austin this week"}]})
+        if endpoint == "comments":
+            if throttled["comments"]:
+                throttled["comments"] -= 1
+                return FakeResponse(429)
+            return FakeResponse(200, {"data": [{"id": "page_1_c1", "message": "Finally, my signal was awful"}]})
+        return FakeResponse(200, {"data": []})
+
+    monkeypatch.setattr(facebook_fetch.metrics, "http_get", http_get)
+    facebook_fetch.run_once()
+    assert limiter.pauses == [1.0, 1.0]
+    assert limiter.acquired == 5  # feed, comments x3, tagged
+    conn = sqlite3.connect(social_db)
+    assert conn.execute("SELECT id FROM facebook_comments").fetchall() == [("page_1_c1",)]
+    conn.close()
+
+def test_requests_give_up_after_bounded_429_retries(limiter, monkeypatch):
+    calls = []
+    monkeypatch.setattr(facebook_fetch.metrics, "http_get", lambda *args, **kwargs: calls.append(1) or FakeResponse(429))
+    assert facebook_fetch.get_post_comments("page_1") is None
+    assert len(calls) == graph.MAX_RETRIES + 1
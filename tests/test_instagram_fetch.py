@@ -0,0 +1,101 @@
+import sqlite3
+import threading
+import time
+
+from conftest import FakeResponse
+from social_fetch import graph, instagram_fetch
+
+class FakeHashtagSearch:
+    """Stands in for search_hashtag: slow, knows only `tmobile`, fails for `broken`"""
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, name):
+        with self.lock:
+            self.calls.append(name)
+        time.sleep(0.02)
+        if name == "broken":
+            return None
+        return {"data": [{"id": "17841562498105353"}]} if name == "tmobile" else {"data": []}
+
+def _search(monkeypatch):
+    search = FakeHashtagSearch()
+    monkeypatch.setattr(instagram_fetch, "search_hashtag", search)
+    instagram_fetch.init_db()
+    return search
+
+def test_concurrent_workers_look_up_each_hashtag_once(social_db, graph_limiter, monkeypatch):
+    search = _search(monkeypatch)
+    names = ["tmobile", "nosuchtag"] * 4
+    threads = [threading.Thread(target=instagram_fetch.get_hashtag_id, args=(n,)) for n in names]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(search.calls) == ["nosuchtag", "tmobile"]
+
+def test_misses_and_errors_are_cached_until_the_ttl(social_db, graph_limiter, monkeypatch):
+    search = _search(monkeypatch)
+    assert instagram_fetch.get_hashtag_id("nosuchtag") is None
+    assert instagram_fetch.get_hashtag_id("broken") is None
+    assert instagram_fetch.get_hashtag_id("nosuchtag") is None
+    assert search.calls == ["nosuchtag", "broken"]
+
+    conn = sqlite3.connect(social_db)
+    assert dict(conn.execute("SELECT name, status FROM instagram_hashtags")) == {
+        "nosuchtag": "missing", "broken": "error"}
+    conn.execute("UPDATE instagram_hashtags SET looked_up_at = datetime('now', '-2 days') WHERE name = 'broken'")
+    conn.commit()
+    conn.close()
+    instagram_fetch.get_hashtag_id("broken")
+    assert search.calls == ["nosuchtag", "broken", "broken"]
+
+def test_misses_count_against_the_weekly_budget(social_db, graph_limiter, monkeypatch):
+    search = _search(monkeypatch)
+    monkeypatch.setattr(instagram_fetch, "HASHTAG_LOOKUP_LIMIT", 2)
+    instagram_fetch.get_hashtag_id("nosuchtag")
+    instagram_fetch.get_hashtag_id("broken")
+    assert instagram_fetch.get_hashtag_id("tmobile") is None
+    assert "tmobile" not in search.calls
+
+def test_media_and_comment_requests_share_the_graph_budget(social_db, graph_limiter, monkeypatch):
+    throttled = {"comments": 1}
+
+    def http_get(platform, endpoint, url, **kwargs):
+        if endpoint == "media":
+            return FakeResponse(200, {"data": [{"id": "m1", "caption": "Network upgrade", "comments_count": 1}]})
+        if throttled[endpoint]:
+            throttled[endpoint] -= 1
+            return FakeResponse(429)
+        return FakeResponse(200, {"data": [{"id": "c1", "text": "Finally!"}]})
+
+    monkeypatch.setattr(graph.metrics, "http_get", http_get)
+    assert instagram_fetch.get_user_media()["data"][0]["id"] == "m1"
+    assert instagram_fetch.get_media_comments("m1")["data"][0]["id"] == "c1"
+    assert graph_limiter.acquired == 3
+    assert graph_limiter.pauses == [1.0]
+
+def test_rate_limited_lookups_are_not_recorded(social_db, graph_limiter, monkeypatch):
+    calls = []
+    monkeypatch.setattr(instagram_fetch, "HASHTAG_LOOKUP_LIMIT", 1)
+    monkeypatch.setattr(graph.metrics, "http_get", lambda *args, **kwargs: calls.append(1) or FakeResponse(429))
+    instagram_fetch.init_db()
+    assert instagram_fetch.get_hashtag_id("tmobile") is None
+    assert len(calls) == graph.MAX_RETRIES + 1
+
+    conn = sqlite3.connect(social_db)
+    assert conn.execute("SELECT COUNT(*) FROM instagram_hashtags").fetchone()[0] == 0
+    conn.close()
+    monkeypatch.setattr(graph.metrics, "http_get",
+                        lambda *args, **kwargs: FakeResponse(200, {"data": [{"id": "17841562498105353"}]}))
+    assert instagram_fetch.get_hashtag_id("tmobile") == "17841562498105353"
+
+def test_rejected_lookups_are_recorded_as_errors(social_db, graph_limiter, monkeypatch):
+    monkeypatch.setattr(graph.metrics, "http_get", lambda *args, **kwargs: FakeResponse(400))
+    instagram_fetch.init_db()
+    assert instagram_fetch.get_hashtag_id("bad tag") is None
+    conn = sqlite3.connect(social_db)
+    assert conn.execute("SELECT status FROM instagram_hashtags WHERE name = 'bad tag'").fetchone() == ("error",)
+    conn.close()
@@ -0,0 +1,43 @@
+import sqlite3
+
+import pytest
+
+from social_fetch import metrics
+
+def test_render_uses_the_prometheus_text_format():
+    registry = metrics.Registry()
+    latency = registry.histogram("test_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value, endpoint="feed")
+    registry.counter("test_total", "Rows").inc(3, table='say "hi"\n')
+    assert registry.counter("test_total") is registry.metrics["test_total"]
+
+    assert registry.render().splitlines() == [
+        "# HELP test_seconds Latency",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{endpoint="feed",le="0.1"} 1',
+        'test_seconds_bucket{endpoint="feed",le="1"} 2',
+        'test_seconds_bucket{endpoint="feed",le="+Inf"} 3',
+        'test_seconds_sum{endpoint="feed"} 5.55',
+        'test_seconds_count{endpoint="feed"} 3',
+        "# HELP test_total Rows",
+        "# TYPE test_total counter",
+        'test_total{table="say \\"hi\\"\\n"} 3',
+    ]
+
+def test_runs_store_the_metric_deltas_they_caused(social_db):
+    metrics.record_rows("test_table", 2, 5)
+    with metrics.run("test_job"):
+        metrics.record_rows("test_table", 1, 4)
+    with pytest.raises(RuntimeError):
+        with metrics.run("test_job"):
+            raise RuntimeError("boom")
+
+    failed, ok = metrics.recent_runs()
+    assert (failed["status"], failed["error"]) == ("error", "RuntimeError: boom")
+    assert ok["status"] == "ok"
+    assert ok["summary"]["social_rows_total"] == {"result=inserted,table=test_table": 1,
+                                                  "result=ignored,table=test_table": 3}
+    conn = sqlite3.connect(social_db)
+    assert conn.execute("SELECT COUNT(*) FROM run_summaries").fetchone()[0] == 2
+    conn.close()
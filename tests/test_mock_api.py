@@ -0,0 +1,30 @@
+from social_fetch import mock_api, ratelimit
+
+def test_injected_bursts_throttle_the_next_requests():
+    state = mock_api.MockState(rate_limit=100, rate_window=60, burst_every=2, burst_length=2)
+    statuses = [state.admit("graph", "graph:feed")[0] for _ in range(8)]
+    assert statuses == [200, 200, 429, 429, 200, 200, 429, 429]
+    assert state.stats["throttled"] == 4
+
+def test_window_limit_is_per_api():
+    state = mock_api.MockState(rate_limit=2, rate_window=60)
+    assert [state.admit("twitter", "twitter:recent")[0] for _ in range(3)] == [200, 200, 429]
+    assert state.admit("graph", "graph:feed")[0] == 200
+
+class CountingLimiter(ratelimit.RateLimiter):
+    acquired = {}
+
+    def acquire(self, priority=0):
+        CountingLimiter.acquired[self.name] = CountingLimiter.acquired.get(self.name, 0) + 1
+        return super().acquire(priority)
+
+def test_load_test_sends_every_graph_call_through_one_budget(tmp_path, monkeypatch):
+    monkeypatch.setattr(ratelimit, "RateLimiter", CountingLimiter)
+    CountingLimiter.acquired = {}
+    graph_limiter = ratelimit.GRAPH_LIMITER
+    report = mock_api.load_test(str(tmp_path / "load.db"), backfill_hours=2, workers=2, pages=1, comments=1)
+
+    assert all(report["rows"].values())
+    graph_calls = sum(n for endpoint, n in report["server"]["endpoints"].items() if endpoint.startswith("graph:"))
+    assert CountingLimiter.acquired["graph"] == graph_calls
+    assert ratelimit.GRAPH_LIMITER is graph_limiter
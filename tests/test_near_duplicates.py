@@ -0,0 +1,53 @@
+import sqlite3
+
+from social_fetch import near_duplicates
+from social_fetch.near_duplicates import NearDuplicateIndex
+
+TEXT = "My T-Mobile 5G home internet keeps dropping every evening around eight"
+
+def test_signatures_within_max_distance_share_a_band():
+    signature = near_duplicates.simhash(TEXT)
+    # Any 3 flipped bits leave at least one 16-bit band untouched
+    for bits in [(0, 1, 2), (0, 16, 32), (15, 31, 47), (5, 40, 63)]:
+        flipped = signature
+        for bit in bits:
+            flipped ^= 1 << bit
+        assert near_duplicates.hamming(signature, flipped) == 3
+        assert set(enumerate(near_duplicates._bands(signature))) & set(enumerate(near_duplicates._bands(flipped)))
+
+def test_near_copies_collapse_onto_the_first(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / "social.db"))
+    assert index.check("twitter-1", TEXT + " https://t.co/abc @TMobile") is None
+    assert index.check("twitter-2", TEXT + " https://t.co/xyz @TMobileHelp") == "twitter-1"
+    assert index.check("twitter-3", "Completely unrelated post about coverage maps in rural Ohio") is None
+    assert index.duplicate_counts == {"twitter-1": 2}
+    index.close()
+
+def test_reprocessing_a_chunk_does_not_inflate_counts(tmp_path):
+    db_path = str(tmp_path / "social.db")
+    index = NearDuplicateIndex(db_path)
+    for feedback_id in ("twitter-1", "twitter-2", "twitter-3"):
+        index.check(feedback_id, TEXT)
+    index.commit()
+    index.close()
+
+    # As if the chunk was checked again after a crash before it was marked processed
+    index = NearDuplicateIndex(db_path)
+    assert index.check("twitter-1", TEXT) is None
+    assert index.check("twitter-2", TEXT) == "twitter-1"
+    assert index.check("twitter-3", TEXT) == "twitter-1"
+    index.close()
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT duplicate_count FROM simhash_index WHERE feedback_id = 'twitter-1'").fetchone() == (3,)
+    conn.close()
+
+def test_uncommitted_checks_are_not_visible_to_other_connections(tmp_path):
+    db_path = str(tmp_path / "social.db")
+    index = NearDuplicateIndex(db_path)
+    index.check("twitter-1", TEXT)
+    other = sqlite3.connect(db_path)
+    assert other.execute("SELECT COUNT(*) FROM simhash_index").fetchone() == (0,)
+    index.commit()
+    assert other.execute("SELECT COUNT(*) FROM simhash_index").fetchone() == (1,)
+    other.close()
+    index.close()
@@ -0,0 +1,86 @@
+import os
+import sqlite3
+
+import pytest
+
+from social_fetch import columnar_export, facebook_fetch, instagram_fetch, process_social_data, serializers, twitter_fetch
+
+TWEETS = {
+    "1": "Dead zone on I-90 near Cleveland again, no bars for twenty miles",
+    "2": "The new unlimited plan price went up five dollars this month",
+}
+
+@pytest.fixture
+def pipeline(social_db, monkeypatch):
+    monkeypatch.setattr(twitter_fetch, "QUERIES_FILE", "")
+    twitter_fetch.init_db()
+    instagram_fetch.init_db()
+    facebook_fetch.init_db()
+    return social_db
+
+def add_tweets(db_path, tweets):
+    conn = sqlite3.connect(db_path)
+    conn.executemany("""INSERT INTO twitter (id, text, author_username, created_at)
+        VALUES (?, ?, 'someone', '2024-05-01T10:00:00.000Z')""", tweets.items())
+    conn.commit()
+    conn.close()
+
+def reprocess_all(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE twitter SET processed = 0")
+    conn.commit()
+    conn.close()
+
+def published_ids():
+    return [e["id"] for e in serializers.load_entries(process_social_data.OUTPUT_PATH)]
+
+def test_search_index_holds_exactly_the_published_entries(pipeline):
+    add_tweets(pipeline, TWEETS)
+    process_social_data.run_processing()
+    reprocess_all(pipeline)
+    process_social_data.run_processing()
+
+    assert sorted(published_ids()) == ["twitter-1", "twitter-2"]
+    conn = sqlite3.connect(pipeline)
+    assert sorted(r[0] for r in conn.execute("SELECT id FROM feedback_docs")) == ["twitter-1", "twitter-2"]
+    conn.close()
+
+def test_snapshot_gets_each_entry_once_with_current_duplicate_counts(pipeline):
+    add_tweets(pipeline, TWEETS)
+    process_social_data.run_processing()
+    reprocess_all(pipeline)
+    add_tweets(pipeline, {"3": TWEETS["1"] + " https://t.co/abc"})
+    process_social_data.run_processing()
+
+    entries = {e["id"]: e for e in serializers.load_entries(process_social_data.OUTPUT_PATH)}
+    assert entries["twitter-1"]["duplicateCount"] == 2
+    snapshot = columnar_export.load_snapshot(os.path.join(os.path.dirname(process_social_data.OUTPUT_PATH), "columnar"))
+    ids = list(snapshot.texts("id"))
+    assert sorted(ids) == ["twitter-1", "twitter-2"]
+    assert snapshot.column("duplicate_count")[ids.index("twitter-1")] == 2
+
+def test_duplicate_count_updates_match_whole_ids_only(tmp_path):
+    directory = str(tmp_path / "columnar")
+    columnar_export.append_entries([{"id": "twitter-12"}, {"id": "twitter-1"}, {"id": "twitter-123"}], directory)
+    assert columnar_export.update_duplicate_counts({"twitter-1": 5, "twitter-9": 2}, directory) == 1
+    assert list(columnar_export.load_snapshot(directory).column("duplicate_count")) == [1, 5, 1]
+
+def _feedback(feedback_id):
+    return {"id": feedback_id, "name": "someone", "review": "Coverage is fine", "rating": 3.0}
+
+def test_select_new_entries_checks_the_index_against_the_output_file(social_db):
+    # Written by something other than the pipeline: the index has never seen it
+    serializers.write_entries(process_social_data.OUTPUT_PATH, [_feedback("twitter-1")])
+    batch = [_feedback("twitter-1"), _feedback("twitter-2"), _feedback("twitter-2")]
+    selected = process_social_data.select_new_entries(batch, {"twitter-2": 3})
+    assert [(fb["id"], fb.get("duplicateCount")) for fb in selected] == [("twitter-2", 3)]
+
+def test_outside_edits_to_the_output_are_picked_up(pipeline):
+    add_tweets(pipeline, TWEETS)
+    process_social_data.run_processing()
+    entries = serializers.load_entries(process_social_data.OUTPUT_PATH)
+    serializers.write_entries(process_social_data.OUTPUT_PATH, entries[:1])
+
+    reprocess_all(pipeline)
+    process_social_data.run_processing()
+    assert sorted(published_ids()) == ["twitter-1", "twitter-2"]
@@ -0,0 +1,25 @@
+import json
+import os
+import pstats
+from concurrent.futures import ThreadPoolExecutor
+
+from social_fetch import profiling
+
+def busy_worker_function(n):
+    return sum(i * i for i in range(n))
+
+def test_pool_workers_are_merged_into_the_stage(tmp_path):
+    with profiling.cycle("test", force=True, directory=str(tmp_path)) as session:
+        with profiling.stage("fetch"):
+            with ThreadPoolExecutor(max_workers=3) as pool:
+                assert len(list(pool.map(profiling.threaded(busy_worker_function), [1000] * 6))) == 6
+
+    with open(os.path.join(session.directory, "summary.json")) as f:
+        record = json.load(f)["stages"][0]
+    assert record["worker_calls"] == 6
+    stats = pstats.Stats(os.path.join(session.directory, record["pstats"]))
+    calls = {func[2]: stat[1] for func, stat in stats.stats.items()}
+    assert calls["busy_worker_function"] == 6
+
+def test_workers_run_unprofiled_outside_a_cycle():
+    assert profiling.threaded(busy_worker_function)(10) == 285
@@ -0,0 +1,37 @@
+from social_fetch import published_index, serializers
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = published_index.BloomFilter(1000, 0.01)
+    keys = [f"tw_{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f"fb_{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+def test_bloom_false_positives_fall_back_to_the_table(social_db, monkeypatch):
+    index = published_index.PublishedIndex(bloom=True)
+    index.add(["tw_1", "tw_2"])
+    assert index.published(["tw_1", "tw_3"]) == {"tw_1"}
+
+    # Every ID now looks published to the filter; the table still has the answer
+    monkeypatch.setattr(published_index.BloomFilter, "__contains__", lambda self, key: True)
+    assert index.published(["tw_1", "tw_2", "tw_3", "fb_9"]) == {"tw_1", "tw_2"}
+    index.close()
+
+def test_in_sync_tracks_the_output_file(social_db):
+    index = published_index.PublishedIndex()
+    assert index.in_sync()
+
+    serializers.write_entries(index.output_path, [{"id": "tw_1"}, {"id": "tw_2"}])
+    assert not index.in_sync()
+    assert index.rebuild() == 2
+    assert index.in_sync()
+    assert index.published(["tw_1", "tw_2", "tw_3"]) == {"tw_1", "tw_2"}
+
+    # Written behind the index's back
+    serializers.write_entries(index.output_path, [{"id": "tw_1"}])
+    assert not index.in_sync()
+    index.rebuild()
+    assert index.published(["tw_1", "tw_2"]) == {"tw_1"}
+    index.close()
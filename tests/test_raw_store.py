@@ -0,0 +1,73 @@
+import os
+import sqlite3
+
+import pytest
+
+from social_fetch import raw_store
+
+TWEET = {"id": "1790000000000000001", "text": "Coverage in Denver is great now — thanks T-Mobile",
+         "author_id": "42", "created_at": "2024-05-01T10:00:00.000Z",
+         "public_metrics": {"retweet_count": 0, "like_count": 3}, "lang": "en"}
+COLUMNS = {"id": TWEET["id"], "text": TWEET["text"], "author_id": "42", "created_at": TWEET["created_at"]}
+
+def _seed_dictionary(db_path):
+    conn = sqlite3.connect(db_path)
+    raw_store.init_db(conn)
+    conn.execute("INSERT INTO raw_dictionaries (tbl, data) VALUES ('twitter', ?)",
+                 (b'"public_metrics":{"retweet_count":"like_count":"lang":"en"',))
+    conn.commit()
+    conn.close()
+
+def test_round_trip_in_every_format(social_db):
+    plain = raw_store.encode_raw("twitter", TWEET, COLUMNS, "json", social_db)
+    compressed = raw_store.encode_raw("twitter", TWEET, COLUMNS, "compressed", social_db)
+    assert compressed[:1] == raw_store.ZLIB
+    _seed_dictionary(social_db)
+    raw_store._newest.clear()
+    with_dictionary = raw_store.encode_raw("twitter", TWEET, COLUMNS, "compressed", social_db)
+    assert with_dictionary[:1] == raw_store.ZLIB_DICT
+    for value in (plain, compressed, with_dictionary):
+        assert raw_store.load_raw("twitter", dict(COLUMNS, raw=value), social_db) == TWEET
+
+def test_archived_rows_resolve_dictionaries_from_the_hot_database(social_db, tmp_path):
+    _seed_dictionary(social_db)
+    value = raw_store.encode_raw("twitter", TWEET, COLUMNS, "compressed", social_db)
+    archive = str(tmp_path / "social-2024-05.db")
+    assert raw_store.load_raw("twitter", dict(COLUMNS, raw=value), archive) == TWEET
+
+def test_missing_dictionaries_are_not_cached(social_db, tmp_path):
+    _seed_dictionary(social_db)
+    value = raw_store.encode_raw("twitter", TWEET, COLUMNS, "compressed", social_db)
+    # Written elsewhere, so neither the archive nor this hot database has the dictionary yet
+    archive = str(tmp_path / "social-2024-05.db")
+    conn = sqlite3.connect(social_db)
+    conn.execute("ALTER TABLE raw_dictionaries RENAME TO moved")
+    conn.commit()
+    conn.close()
+    with pytest.raises(ValueError):
+        raw_store.load_raw("twitter", dict(COLUMNS, raw=value), archive)
+
+    conn = sqlite3.connect(social_db)
+    # The failed lookups only read, so the table was not recreated
+    conn.execute("ALTER TABLE moved RENAME TO raw_dictionaries")
+    conn.commit()
+    conn.close()
+    assert raw_store.load_raw("twitter", dict(COLUMNS, raw=value), archive) == TWEET
+
+def test_reads_never_write_to_the_database_they_read(social_db, tmp_path):
+    _seed_dictionary(social_db)
+    value = raw_store.encode_raw("twitter", TWEET, COLUMNS, "compressed", social_db)
+    missing = str(tmp_path / "social-2024-04.db")
+    archive = str(tmp_path / "social-2024-05.db")
+    conn = sqlite3.connect(archive)
+    conn.execute("CREATE TABLE twitter (id TEXT PRIMARY KEY, raw BLOB)")
+    conn.close()
+    with open(archive, "rb") as f:
+        before = f.read()
+
+    raw_store._dictionaries.clear()
+    for path in (missing, archive):
+        assert raw_store.load_raw("twitter", dict(COLUMNS, raw=value), path) == TWEET
+    assert not os.path.exists(missing)
+    with open(archive, "rb") as f:
+        assert f.read() == before
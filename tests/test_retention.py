@@ -0,0 +1,99 @@
+import sqlite3
+
+import pytest
+
+from social_fetch import facebook_fetch, raw_store, retention, twitter_fetch
+
+TWEET = {"id": "1001", "text": "Dropped calls all week on the T-Mobile network downtown",
+         "author_id": "7", "created_at": "2024-01-15T08:00:00.000Z", "lang": "en"}
+COLUMNS = {"id": "1001", "text": TWEET["text"], "author_id": "7", "created_at": TWEET["created_at"]}
+
+@pytest.fixture
+def archive_dir(social_db, tmp_path, monkeypatch):
+    directory = tmp_path / "archive"
+    monkeypatch.setattr(retention, "ARCHIVE_DIR", str(directory))
+    return directory
+
+def _seed(db_path, age_days=200):
+    twitter_fetch.init_db()
+    conn = sqlite3.connect(db_path)
+    raw_store.init_db(conn)
+    conn.execute("INSERT INTO raw_dictionaries (tbl, data) VALUES ('twitter', ?)", (b'"lang":"en"',))
+    conn.commit()
+    raw = raw_store.encode_raw("twitter", TWEET, COLUMNS, "compressed", db_path)
+    conn.execute(f"""INSERT INTO twitter (id, text, author_id, created_at, raw, processed, created_timestamp)
+        VALUES (?, ?, ?, ?, ?, 1, datetime('now', '-{age_days} days'))""",
+        ("1001", TWEET["text"], "7", TWEET["created_at"], raw))
+    conn.commit()
+    month = conn.execute("SELECT strftime('%Y-%m', created_timestamp) FROM twitter").fetchone()[0]
+    conn.close()
+    return month
+
+def test_archives_can_be_read_without_the_hot_database(social_db, archive_dir):
+    month = _seed(social_db)
+    report = retention.run_retention(days=90, db_path=social_db)
+    assert report["twitter"] == {month: 1}
+
+    # Drop the hot dictionaries: the archive must carry its own copy
+    conn = sqlite3.connect(social_db)
+    conn.execute("DELETE FROM raw_dictionaries")
+    conn.commit()
+    conn.close()
+    archive = retention.archive_path(month)
+    conn = sqlite3.connect(archive)
+    conn.row_factory = sqlite3.Row
+    row = conn.execute("SELECT * FROM twitter").fetchone()
+    conn.close()
+    assert raw_store.load_raw("twitter", row, archive) == TWEET
+
+def test_rows_stay_put_when_their_dictionary_is_missing(social_db, archive_dir):
+    month = _seed(social_db)
+    conn = sqlite3.connect(social_db)
+    conn.execute("DELETE FROM raw_dictionaries")
+    conn.commit()
+    conn.close()
+    assert retention.run_retention(days=90, db_path=social_db)["twitter"] == {}
+    conn = sqlite3.connect(social_db)
+    assert conn.execute("SELECT COUNT(*) FROM twitter").fetchone() == (1,)
+    assert conn.execute("SELECT COUNT(*) FROM archived_ids").fetchone() == (0,)
+    conn.close()
+
+def test_archived_facebook_comments_are_never_ingested_again(social_db, archive_dir):
+    facebook_fetch.init_db()
+    comment = {"id": "page_1_c1", "message": "Still no signal at home", "created_time": "2024-01-10T08:00:00+0000"}
+    facebook_fetch.save_batch(comments=[(comment, "page_1")])
+    conn = sqlite3.connect(social_db)
+    conn.execute("UPDATE facebook_comments SET processed = 1, created_timestamp = datetime('now', '-200 days')")
+    conn.commit()
+    retention.run_retention(days=90, db_path=social_db)
+    # Long after archiving, the post's comment page still returns it
+    conn.execute("UPDATE archived_ids SET archived_at = datetime('now', '-400 days')")
+    conn.commit()
+    retention.run_retention(days=90, db_path=social_db)
+
+    assert facebook_fetch.save_batch(comments=[(comment, "page_1")]) == 0
+    assert conn.execute("SELECT COUNT(*) FROM facebook_comments").fetchone() == (0,)
+    conn.close()
+
+def test_incremental_vacuum_releases_every_free_page(social_db, archive_dir):
+    _seed(social_db)
+    conn = sqlite3.connect(social_db)
+    retention.ensure_incremental_vacuum(conn)
+    conn.execute("CREATE TABLE filler (data BLOB)")
+    conn.executemany("INSERT INTO filler VALUES (zeroblob(4000))", [()] * 200)
+    conn.commit()
+    conn.execute("DROP TABLE filler")
+    conn.commit()
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] > 100
+    retention.run_retention(days=90, db_path=social_db)
+    assert conn.execute("PRAGMA freelist_count").fetchone() == (0,)
+    conn.close()
+
+def test_scheduled_runs_do_not_switch_vacuum_mode(social_db, archive_dir):
+    _seed(social_db)
+    retention.run_retention(days=90, db_path=social_db)
+    conn = sqlite3.connect(social_db)
+    assert conn.execute("PRAGMA auto_vacuum").fetchone() == (0,)
+    retention.ensure_incremental_vacuum(conn)
+    assert conn.execute("PRAGMA auto_vacuum").fetchone() == (2,)
+    conn.close()
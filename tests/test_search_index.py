@@ -0,0 +1,38 @@
+import pytest
+
+from social_fetch import search_index
+
+FEEDBACK = [
+    {"id": "1", "review": "Dead zone on the highway, no bars at all", "category": "Coverage",
+     "state": "Virginia", "source": "Twitter", "date": "2024-05-01"},
+    {"id": "2", "review": "Zone pricing is dead wrong on my bill", "category": "Billing",
+     "state": "West Virginia", "source": "Facebook", "date": "2024-05-03"},
+    {"id": "3", "review": "Dead air on every call from the zoo", "category": "Coverage",
+     "state": "West Virginia", "source": "Twitter", "date": "2024-05-05"},
+]
+
+def test_build_match_modes():
+    assert search_index.build_match("dead zone") == '"dead" "zone"'
+    assert search_index.build_match("dead, zone!", "phrase") == '"dead zone"'
+    assert search_index.build_match("dead zo", "prefix") == '"dead"* "zo"*'
+    assert search_index.build_match('review : "x"', "raw") == 'review : "x"'
+    with pytest.raises(ValueError):
+        search_index.build_match("?!")
+
+def ids(results):
+    return sorted(r["id"] for r in results)
+
+def test_search_modes_and_filters(social_db):
+    assert search_index.index_feedbacks(FEEDBACK) == 3
+    assert search_index.index_feedbacks(FEEDBACK) == 0
+
+    assert ids(search_index.search("dead zone")) == ["1", "2"]
+    assert ids(search_index.search("dead zone", mode="phrase")) == ["1"]
+    assert ids(search_index.search("dead zo", mode="prefix")) == ["1", "2", "3"]
+    # Field filters are exact: Virginia does not match West Virginia
+    assert ids(search_index.search("dead zo", mode="prefix", state="Virginia")) == ["1"]
+    assert ids(search_index.search("dead zo", mode="prefix", state="West Virginia", source="Twitter")) == ["3"]
+    assert ids(search_index.search("dead zo", mode="prefix", category="Billing")) == ["2"]
+    assert ids(search_index.search("dead zo", mode="prefix", since="2024-05-02", until="2024-05-04")) == ["2"]
+    # Filter text is matched as terms only, never as query syntax
+    assert search_index.search("dead", state='Virginia" OR review:*') == []
@@ -0,0 +1,16 @@
+import json
+
+from social_fetch import serializers
+
+ENTRIES = [{"id": "twitter-1", "name": "José", "review": "Señal perfecta 📶 en Querétaro", "rating": 4.5},
+           {"id": "twitter-2", "name": "Ann", "review": "Coverage is fine", "rating": 3.0}]
+
+def test_pretty_output_is_equivalent_to_the_legacy_layout(tmp_path):
+    path = str(tmp_path / "entries-all.json")
+    serializers.write_entries(path, ENTRIES, pretty=True)
+    with open(path, "rb") as f:
+        written = f.read()
+    assert json.loads(written)["entries"] == ENTRIES
+    # Same indentation as json.dump(indent=2), with non-ASCII kept as UTF-8
+    assert '\n    {\n      "id": "twitter-1"' in written.decode("utf-8")
+    assert "Señal perfecta 📶".encode("utf-8") in written
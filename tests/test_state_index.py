@@ -0,0 +1,49 @@
+import json
+import os
+
+from social_fetch import state_index
+
+STATES = {
+    "Ohio": {"name": "Ohio", "satisfaction": 71.5, "districts": [{"name": "Cleveland", "score": 68}],
+             "entries": [{"id": "oh-1", "review": 'Says "no {bars}, [none]" at home'}],
+             "totalEntries": 1, "lastUpdated": "2024-05-01"},
+    "West Virginia": {"name": "West Virginia", "satisfaction": 64, "districts": [],
+                      "entries": [], "totalEntries": 0, "lastUpdated": "2024-05-01"},
+    "Virginia": {"name": "Virginia", "note": "Käse \\ and émigré", "entries": [{"id": "va-1"}],
+                 "totalEntries": 1, "lastUpdated": "2024-05-02"},
+}
+
+def write(path, data, indent=2):
+    with open(path, "w") as f:
+        json.dump(data, f, indent=indent)
+
+def test_lookups_match_a_full_json_load(tmp_path):
+    path = str(tmp_path / "state-entries-data.json")
+    for indent in (2, None):
+        write(path, STATES, indent)
+        index = state_index.StateIndex(path)
+        with open(path) as f:
+            loaded = json.load(f)
+        assert index.state_names() == list(loaded)
+        for state, data in loaded.items():
+            assert index.get_state(state) == data
+            assert index.entries(state) == data["entries"]
+            assert index.districts(state) == data.get("districts", [])
+            assert index.state_info(state) == {k: v for k, v in data.items() if k not in state_index.ENTRY_FIELDS}
+        assert index.get_state("Texas") is None
+        assert index.get_field("Ohio", "missing", "default") == "default"
+        index.close()
+
+def test_the_sidecar_is_rebuilt_when_the_file_changes(tmp_path):
+    path = str(tmp_path / "state-entries-data.json")
+    write(path, STATES)
+    index = state_index.StateIndex(path)
+    assert os.path.exists(path + state_index.INDEX_SUFFIX)
+    assert "Texas" not in index
+
+    changed = dict(STATES, Texas={"name": "Texas", "entries": [{"id": "tx-1"}]})
+    write(path, changed)
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+    assert index.entries("Texas") == [{"id": "tx-1"}]
+    # A fresh reader trusts the rewritten sidecar
+    assert state_index.StateIndex(path).get_state("Virginia") == STATES["Virginia"]
@@ -0,0 +1,153 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from conftest import FakeResponse, NoWait
+from social_fetch import twitter_fetch
+
+class FakeSearch:
+    """Stands in for fetch_tweets: two pages per window, optionally failing some requests"""
+
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = set(fail)
+        self.next_id = 1
+
+    def __call__(self, next_token=None, max_results=100, start_time=None, end_time=None,
+                 query=None, since_id=None, priority=0):
+        self.calls.append((start_time, end_time, next_token))
+        if (start_time, next_token) in self.fail:
+            self.fail.discard((start_time, next_token))
+            return None
+        self.next_id += 1
+        meta = {"newest_id": str(self.next_id)}
+        if next_token is None:
+            meta["next_token"] = "page-2"
+        return {"data": [{"id": str(self.next_id), "text": f"tweet {self.next_id} about T-Mobile"}], "meta": meta}
+
+@pytest.fixture
+def fake_search(social_db, monkeypatch):
+    monkeypatch.setattr(twitter_fetch, "BEARER", "test")
+    search = FakeSearch()
+    monkeypatch.setattr(twitter_fetch, "fetch_tweets", search)
+    return search
+
+def _statuses(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = dict(conn.execute("SELECT window_start, status FROM twitter_backfill"))
+    conn.close()
+    return rows
+
+def test_windows_follow_a_fixed_grid():
+    start = datetime(2024, 5, 1, 10, 17, tzinfo=timezone.utc)
+    shifted = twitter_fetch.split_windows(start + timedelta(minutes=20), start + timedelta(hours=3), 60)
+    windows = twitter_fetch.split_windows(start, start + timedelta(hours=3), 60)
+    assert windows[0] == ("2024-05-01T10:00:00Z", "2024-05-01T11:00:00Z")
+    assert shifted == windows
+
+def test_backfill_resumes_after_the_horizon_moves(fake_search, social_db):
+    now = datetime.now(timezone.utc)
+    start = twitter_fetch._rfc3339(now - timedelta(days=9))
+    end = twitter_fetch._rfc3339(now - timedelta(days=2))
+    windows = twitter_fetch.split_windows(twitter_fetch._parse_time(start), twitter_fetch._parse_time(end), 1440)
+    failing = windows[4][0]
+    fake_search.fail = {(failing, "page-2")}
+
+    twitter_fetch.backfill(start, end, window_minutes=1440, workers=2)
+    statuses = _statuses(social_db)
+    assert statuses[failing] == "error"
+    # Windows entirely before the 7-day horizon are not even checkpointed
+    assert windows[0][0] not in statuses
+
+    # The horizon has moved by the time of the second run; finished windows keep their keys
+    fake_search.calls.clear()
+    twitter_fetch.backfill(start, end, window_minutes=1440, workers=2)
+    resumed = [call for call in fake_search.calls if call[0] == failing]
+    assert resumed == [(failing, windows[4][1], "page-2")]
+    fetched_windows = {call[0] for call in fake_search.calls}
+    done = {w for w, status in _statuses(social_db).items() if status == "done"}
+    assert not fetched_windows & (done - {failing})
+    assert _statuses(social_db)[failing] == "done"
+
+def test_fetch_tweets_gives_up_after_bounded_429_retries(monkeypatch):
+    calls = []
+    monkeypatch.setattr(twitter_fetch, "LIMITER", NoWait())
+    monkeypatch.setattr(twitter_fetch.metrics, "http_get", lambda *args, **kwargs: calls.append(1) or FakeResponse(429))
+    assert twitter_fetch.fetch_tweets() is None
+    assert len(calls) == twitter_fetch.MAX_RETRIES + 1
+
+def test_backfill_checkpoints_from_before_query_sets_are_migrated(social_db):
+    conn = sqlite3.connect(social_db)
+    conn.execute("""CREATE TABLE twitter_backfill (window_start TEXT, window_end TEXT, next_token TEXT,
+        status TEXT DEFAULT 'pending', pages INTEGER DEFAULT 0, saved INTEGER DEFAULT 0,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (window_start, window_end))""")
+    conn.execute("""INSERT INTO twitter_backfill (window_start, window_end, next_token, status, pages)
+        VALUES ('2024-05-01T00:00:00Z', '2024-05-01T01:00:00Z', 'tok', 'pending', 2)""")
+    conn.commit()
+    conn.close()
+
+    twitter_fetch.init_db()
+    conn = sqlite3.connect(social_db)
+    rows = conn.execute("SELECT query, window_start, next_token, pages FROM twitter_backfill").fetchall()
+    conn.close()
+    assert rows == [("brand", "2024-05-01T00:00:00Z", "tok", 2)]
+
+class ChainSearch:
+    """Newest-first pages of a fixed timeline, honoring since_id like recent search"""
+
+    def __init__(self, newest, page_size=2):
+        self.newest = newest
+        self.page_size = page_size
+
+    def __call__(self, next_token=None, query=None, since_id=None, priority=0, **kwargs):
+        # A token names the next tweet, so a chain is unaffected by newer arrivals
+        top = int(next_token or self.newest)
+        ids = [i for i in range(top, top - self.page_size, -1) if i > int(since_id or 0)]
+        meta = {"newest_id": str(ids[0])} if ids else {}
+        if ids and ids[-1] - 1 > int(since_id or 0):
+            meta["next_token"] = str(ids[-1] - 1)
+        return {"data": [{"id": str(i), "text": f"tweet {i}"} for i in ids], "meta": meta}
+
+def test_watermark_advances_when_a_chain_spans_runs(social_db, monkeypatch):
+    twitter_fetch.init_db()
+    twitter_fetch._set_watermark("brand", "100")
+    search = ChainSearch(newest=110)
+    monkeypatch.setattr(twitter_fetch, "fetch_tweets", search)
+    query_set = {"name": "brand", "query": "T-Mobile"}
+
+    # 10 new tweets, 2 per page, 3 pages per run
+    twitter_fetch.run_query(query_set, max_pages=3)
+    assert twitter_fetch._get_watermark("brand") == ("100", "104", "110")
+    search.newest = 115  # more tweets arrive meanwhile
+    twitter_fetch.run_query(query_set, max_pages=3)
+    assert twitter_fetch._get_watermark("brand") == ("110", None, None)
+
+    conn = sqlite3.connect(social_db)
+    ids = {int(r[0]) for r in conn.execute("SELECT id FROM twitter")}
+    conn.close()
+    assert ids == set(range(101, 111))
+
+def test_processing_survives_a_malformed_queries_file(social_db, tmp_path, monkeypatch):
+    from social_fetch import process_social_data
+    bad = tmp_path / "queries.json"
+    bad.write_text("[{not json")
+    monkeypatch.setattr(twitter_fetch, "QUERIES_FILE", str(bad))
+    twitter_fetch.init_db()
+    assert process_social_data.process_twitter_data() == []
+
+@pytest.mark.parametrize("content", [None, "[{not json", "[]", '{"name": "brand"}', '[{"name": "no-query"}]'])
+def test_bad_query_files_fall_back_to_the_default_set(tmp_path, monkeypatch, content):
+    path = tmp_path / "queries.json"
+    if content is not None:
+        path.write_text(content)
+    monkeypatch.setattr(twitter_fetch, "QUERIES_FILE", str(path))
+    assert twitter_fetch.load_query_sets() == twitter_fetch.DEFAULT_QUERY_SETS
+
+@pytest.mark.parametrize("content", ["[]", "[{not json"])
+def test_run_once_survives_bad_query_files(fake_search, tmp_path, monkeypatch, content):
+    path = tmp_path / "queries.json"
+    path.write_text(content)
+    monkeypatch.setattr(twitter_fetch, "QUERIES_FILE", str(path))
+    assert twitter_fetch.run_once(max_pages=1) == 1
+    assert {call[0] for call in fake_search.calls} == {None}
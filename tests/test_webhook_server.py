@@ -0,0 +1,70 @@
+import sqlite3
+import threading
+
+import pytest
+
+from social_fetch import facebook_fetch, webhook_server
+
+SECRET = "test-secret"
+
+@pytest.fixture
+def receiver(social_db):
+    server = webhook_server.make_server("127.0.0.1", 0, app_secret=SECRET, verify_token="token",
+                                        batch_size=1000)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+def _count(db_path):
+    conn = sqlite3.connect(db_path)
+    total = sum(conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                for t in ("facebook_posts", "facebook_comments", "instagram"))
+    conn.close()
+    return total
+
+def test_signature_check():
+    body = b'{"object": "page"}'
+    assert webhook_server.verify_signature(body, webhook_server.sign_payload(body, SECRET), SECRET)
+    assert not webhook_server.verify_signature(body + b" ", webhook_server.sign_payload(body, SECRET), SECRET)
+    assert not webhook_server.verify_signature(body, None, SECRET)
+
+def test_unsigned_notifications_are_rejected(receiver):
+    server, url = receiver
+    statuses = webhook_server.simulate(url, 4, app_secret="wrong-secret")
+    assert statuses == [403] * 4
+    assert server.buffer.pending() == 0
+
+def test_failed_write_keeps_rows_until_a_later_flush(receiver, social_db, monkeypatch):
+    server, url = receiver
+    assert webhook_server.simulate(url, 6, app_secret=SECRET) == [200] * 6
+    assert server.buffer.pending() == 6
+
+    save_batch = facebook_fetch.save_batch
+
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(facebook_fetch, "save_batch", locked)
+    server.buffer.flush()
+    # The Instagram half was written; the Facebook rows are queued again, not dropped
+    assert server.buffer.failed_flushes == 1
+    assert server.buffer.pending() == 3
+    assert _count(social_db) == 3
+
+    monkeypatch.setattr(facebook_fetch, "save_batch", save_batch)
+    assert server.buffer.flush() == 3
+    assert server.buffer.pending() == 0
+    assert _count(social_db) == 6
+
+def test_spilled_rows_are_replayed(receiver, social_db, tmp_path):
+    server, url = receiver
+    webhook_server.simulate(url, 4, app_secret=SECRET)
+    spool = str(tmp_path / "spool.json")
+    assert server.buffer.spill(spool) == 4
+    assert server.buffer.pending() == 0
+
+    buffer = webhook_server.WebhookBuffer()
+    assert buffer.load_spool(spool) == 4
+    assert buffer.flush() == 4
+    assert _count(social_db) == 4